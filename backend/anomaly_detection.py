@@ -5,10 +5,81 @@ Sử dụng Isolation Forest để phát hiện doanh nghiệp có hành vi bấ
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple, Union
+from collections import deque
 from sklearn.ensemble import IsolationForest
+from sklearn.neighbors import KDTree
 from sklearn.preprocessing import StandardScaler
 import os
+import threading
+from model_registry import get_promoted_params
+from feature_vector import FeatureVector, FEATURE_COLS
+from score_cache import memoize_score, bump_model_version
+from quantile_sketch import P2QuantileSketch
+
+# Siêu tham số mặc định của Isolation Forest (có thể bị ghi đè bởi model registry)
+ANOMALY_PARAMS = {
+    'n_estimators': 100,
+    'contamination': 0.05,
+    'max_samples': 'auto',
+    'max_features': 1.0,
+}
+
+# Các chỉ số cao hơn P95 là TỐT (không coi là bất thường); X_5, X_6, X_13 cao là xấu
+GOOD_IF_HIGH = ['X_1', 'X_2', 'X_3', 'X_4', 'X_7', 'X_8', 'X_9', 'X_10', 'X_11', 'X_12', 'X_14']
+BAD_IF_HIGH_MASK = np.array([feature not in GOOD_IF_HIGH for feature in FEATURE_COLS])
+
+# Các phân vị dùng làm ngưỡng (P5, P25, P50, P75, P95)
+THRESHOLD_PERCENTILES = [5, 25, 50, 75, 95]
+
+# Ngưỡng mức rủi ro (Trung bình, Cao) của thang tuyến tính cũ (0.5 - decision_function) * 100,
+# chỉ dùng cho mô hình không có score_reference
+LEGACY_RISK_CUTOFFS = (60.0, 80.0)
+
+# Chế độ online: số quan sát gần nhất giữ trong cửa sổ trượt để fit lại Isolation Forest
+ANOMALY_ONLINE_WINDOW = int(os.getenv("ANOMALY_ONLINE_WINDOW", "2000"))
+# Fit lại Isolation Forest (chạy nền) sau mỗi N quan sát mới (0 = tắt tự động fit lại)
+ANOMALY_REFIT_EVERY = int(os.getenv("ANOMALY_REFIT_EVERY", "500"))
+
+# Số DN khỏe mạnh tương đồng nhất (k láng giềng) dùng cho peer search và Local Outlier Factor
+ANOMALY_PEER_K = int(os.getenv("ANOMALY_PEER_K", "10"))
+
+
+class PeerIndex(NamedTuple):
+    """KD-tree trên quần thể DN khỏe mạnh đã chuẩn hóa + thống kê LOF tính sẵn lúc train"""
+    tree: KDTree
+    reference: np.ndarray  # 14 chỉ số gốc của quần thể tham chiếu (n, 14): DN khỏe mạnh train hoặc cửa sổ đã lọc
+    k_distance: np.ndarray  # Khoảng cách tới láng giềng thứ k của từng điểm tham chiếu (n,)
+    lrd: np.ndarray  # Local reachability density của từng điểm tham chiếu (n,)
+    k: int
+
+
+def build_peer_index(X_scaled: np.ndarray, X: np.ndarray, k: int = ANOMALY_PEER_K) -> Optional[PeerIndex]:
+    """
+    Dựng KD-tree và tính sẵn k-distance, lrd (Local Outlier Factor) cho quần thể tham chiếu
+
+    Args:
+        X_scaled: Quần thể tham chiếu đã chuẩn hóa (n, 14)
+        X: Quần thể tham chiếu gốc (n, 14), dùng để trả về chỉ số của peers
+        k: Số láng giềng
+
+    Returns:
+        PeerIndex, hoặc None nếu quần thể có không quá k điểm
+    """
+    if k < 1 or len(X_scaled) <= k:
+        return None
+
+    tree = KDTree(X_scaled)
+
+    # Láng giềng của từng điểm tham chiếu (bỏ chính nó ở cột 0)
+    dist, ind = tree.query(X_scaled, k=k + 1)
+    dist, ind = dist[:, 1:], ind[:, 1:]
+    k_distance = dist[:, -1]
+
+    reach = np.maximum(k_distance[ind], dist)
+    lrd = 1.0 / np.maximum(reach.mean(axis=1), 1e-10)
+
+    return PeerIndex(tree=tree, reference=np.array(X), k_distance=k_distance, lrd=lrd, k=k)
 
 
 class AnomalyDetectionSystem:
@@ -21,6 +92,7 @@ class AnomalyDetectionSystem:
     3. Phát hiện các features bất thường (so với P5, P95)
     4. Phân loại loại bất thường (Point/Contextual/Collective)
     5. Tạo giải thích bằng Gemini AI
+    6. Tìm k DN khỏe mạnh tương đồng (KD-tree) + Local Outlier Score
     """
 
     def __init__(self):
@@ -28,8 +100,31 @@ class AnomalyDetectionSystem:
         self.model = None
         self.scaler = StandardScaler()
         self.thresholds = {}  # P5, P25, P50, P75, P95 cho 14 features
+        # Cùng ngưỡng dạng ma trận (5, 14): hàng theo THRESHOLD_PERCENTILES, cột theo FEATURE_COLS
+        self.threshold_values = None
         self.feature_names = []
         self.healthy_stats = {}  # Thống kê DN khỏe mạnh
+        self.model_params = dict(ANOMALY_PARAMS)
+        # decision_function của tập train đã sắp xếp (CDF thực nghiệm để quy đổi Anomaly Score)
+        self.score_reference = None
+        # KD-tree trên DN khỏe mạnh đã chuẩn hóa (tìm DN tương đồng + Local Outlier Factor)
+        self.peer_index = None
+        # Phiên bản mô hình (đổi mỗi lần train → vô hiệu cache Anomaly Score)
+        self.model_version = None
+
+        # Chế độ online: P² sketch cho từng phân vị + cửa sổ trượt các quan sát gần nhất
+        self.sketches = {}
+        self.window = deque(maxlen=ANOMALY_ONLINE_WINDOW)
+        self.num_observed = 0  # Tổng số quan sát đã đưa vào sketch/cửa sổ
+        # Quan sát bị loại khỏi sketch/cửa sổ: DN đã biết vỡ nợ / chưa gán nhãn nhưng ở mức Bất thường Cao
+        self.num_skipped_defaulted = 0
+        self.num_skipped_anomalous = 0
+        self.observed_since_refit = 0
+        self.num_refits = 0
+        self.last_refit_error = None
+        self._refit_thread = None
+        # Khóa khi đổi mô hình (scaler + forest + CDF tham chiếu phải được đổi cùng lúc)
+        self._swap_lock = threading.Lock()
 
         # Tên đầy đủ của 14 chỉ số
         self.indicator_names = {
@@ -49,12 +144,13 @@ class AnomalyDetectionSystem:
             'X_14': 'Hiệu suất sử dụng tài sản'
         }
 
-    def train_model(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def train_model(self, df: pd.DataFrame, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Train Isolation Forest model trên DN khỏe mạnh
 
         Args:
             df: DataFrame chứa 14 chỉ số (X_1 → X_14) + cột 'label' (0=khỏe mạnh, 1=vỡ nợ)
+            params: Siêu tham số Isolation Forest (None = mặc định + cấu hình đã promote trong registry)
 
         Returns:
             Dict chứa:
@@ -68,20 +164,13 @@ class AnomalyDetectionSystem:
         print(f"✅ Có {len(healthy_df)} DN khỏe mạnh để train")
 
         # 2. CHUẨN BỊ FEATURES
-        self.feature_names = [f'X_{i}' for i in range(1, 15)]
+        self.feature_names = list(FEATURE_COLS)
         X_healthy = healthy_df[self.feature_names].values
 
-        # 3. CHUẨN HÓA DỮ LIỆU (FIT TRÊN DN KHỎE MẠNH)
-        X_scaled = self.scaler.fit_transform(X_healthy)
+        # 3. TÍNH THRESHOLDS (P5, P25, P50, P75, P95) CHO 14 FEATURES
+        thresholds = self._exact_thresholds(X_healthy)
 
-        # 4. TÍNH THRESHOLDS (P5, P25, P50, P75, P95) CHO 14 FEATURES
-        percentiles = [5, 25, 50, 75, 95]
-        for i, feature in enumerate(self.feature_names):
-            self.thresholds[feature] = {
-                f'P{p}': np.percentile(X_healthy[:, i], p) for p in percentiles
-            }
-
-        # 5. TÍNH THỐNG KÊ DN KHỎE MẠNH (để so sánh)
+        # 4. TÍNH THỐNG KÊ DN KHỎE MẠNH (để so sánh)
         for i, feature in enumerate(self.feature_names):
             self.healthy_stats[feature] = {
                 'mean': np.mean(X_healthy[:, i]),
@@ -90,18 +179,38 @@ class AnomalyDetectionSystem:
                 'max': np.max(X_healthy[:, i])
             }
 
-        # 6. TRAIN ISOLATION FOREST
+        # 5. TRAIN ISOLATION FOREST (CHUẨN HÓA DỮ LIỆU FIT TRÊN DN KHỎE MẠNH)
         print("📊 Training Isolation Forest...")
-        self.model = IsolationForest(
-            n_estimators=100,
-            contamination=0.05,  # 5% DN bất thường
-            random_state=42,
-            n_jobs=-1
-        )
-        self.model.fit(X_scaled)
+        if params is None:
+            params = get_promoted_params('anomaly')
+        self.model_params = {**ANOMALY_PARAMS, **params}
+        scaler, model, score_reference, peer_index = self._fit_forest(X_healthy)
         print("✅ Train Isolation Forest hoàn tất!")
 
-        # 7. CHUẨN BỊ KẾT QUẢ TRẢ VỀ
+        # 6. ĐỔI MÔ HÌNH + KHỞI TẠO CHẾ ĐỘ ONLINE TỪ DN KHỎE MẠNH
+        with self._swap_lock:
+            self.scaler, self.model, self.score_reference = scaler, model, score_reference
+            self.peer_index = peer_index
+            self._set_thresholds(thresholds)
+            self.sketches = self._seed_sketches(X_healthy)
+            self.window = deque(X_healthy, maxlen=ANOMALY_ONLINE_WINDOW)
+            self.num_observed = 0
+            self.num_skipped_defaulted = 0
+            self.num_skipped_anomalous = 0
+            self.observed_since_refit = 0
+            self.model_version = bump_model_version('anomaly')
+
+        # 7. KIỂM TRA HIỆU CHỈNH: TỶ LỆ DN KHỎE MẠNH (TẬP TRAIN) RƠI VÀO MỨC CAO ≈ CONTAMINATION
+        medium_cutoff, high_cutoff = self.risk_cutoffs()
+        train_scores = np.round(self._normalize_scores(score_reference, score_reference), 2)
+        high_band_rate = float(np.mean(train_scores >= high_cutoff))
+        expected_rate = 1.0 - high_cutoff / 100.0
+        if abs(high_band_rate - expected_rate) > max(0.01, 0.5 * expected_rate):
+            print(f"⚠️ {high_band_rate:.1%} DN khỏe mạnh (train) ở mức Bất thường Cao, kỳ vọng ≈ {expected_rate:.1%}")
+        else:
+            print(f"✅ {high_band_rate:.1%} DN khỏe mạnh (train) ở mức Bất thường Cao (kỳ vọng ≈ {expected_rate:.1%})")
+
+        # 8. CHUẨN BỊ KẾT QUẢ TRẢ VỀ
         feature_statistics = []
         for feature in self.feature_names:
             feature_statistics.append({
@@ -117,46 +226,184 @@ class AnomalyDetectionSystem:
 
         return {
             'feature_statistics': feature_statistics,
-            'contamination_rate': 0.05,
+            'contamination_rate': self.model_params['contamination'],
+            'risk_cutoffs': {'medium': medium_cutoff, 'high': high_cutoff},
+            'healthy_high_band_rate': round(high_band_rate, 4),
+            'model_params': self.model_params,
             'num_healthy_samples': len(healthy_df),
             'num_total_samples': len(df)
         }
 
-    def calculate_anomaly_score(self, indicators: Dict[str, float]) -> float:
+    def _fit_forest(self, X: np.ndarray) -> Tuple[StandardScaler, IsolationForest, np.ndarray, Optional[PeerIndex]]:
+        """
+        Fit scaler + Isolation Forest + peer index mới (không đụng vào mô hình đang phục vụ)
+
+        Args:
+            X: Ma trận 14 chỉ số shape (n, 14)
+
+        Returns:
+            (scaler, model, score_reference, peer_index) - score_reference là decision_function đã sắp xếp
+        """
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+        model = IsolationForest(
+            n_estimators=self.model_params['n_estimators'],
+            contamination=self.model_params['contamination'],  # Mặc định 5% DN bất thường
+            max_samples=self.model_params['max_samples'],
+            max_features=self.model_params['max_features'],
+            random_state=42,
+            n_jobs=-1
+        )
+        model.fit(X_scaled)
+        return scaler, model, np.sort(model.decision_function(X_scaled)), build_peer_index(X_scaled, X)
+
+    def _exact_thresholds(self, X: np.ndarray) -> np.ndarray:
+        """Tính chính xác P5, P25, P50, P75, P95 của từng chỉ số, shape (5, 14)"""
+        return np.percentile(X, THRESHOLD_PERCENTILES, axis=0)
+
+    def _set_thresholds(self, values: np.ndarray):
+        """
+        Đặt ngưỡng mới: ma trận (5, 14) dùng khi so ngưỡng + dict theo tên chỉ số dùng cho API/báo cáo
+
+        Args:
+            values: Ma trận phân vị, hàng theo THRESHOLD_PERCENTILES
+        """
+        self.thresholds = {
+            feature: {f'P{p}': float(values[k, i]) for k, p in enumerate(THRESHOLD_PERCENTILES)}
+            for i, feature in enumerate(self.feature_names)
+        }
+        self.threshold_values = values
+
+    def _seed_sketches(self, X: np.ndarray) -> Dict[int, P2QuantileSketch]:
+        """Khởi tạo P² sketch cho từng phân vị ngưỡng (rỗng nếu có ít hơn 5 quan sát)"""
+        if len(X) < 5:
+            return {}
+        return {p: P2QuantileSketch(p / 100, X) for p in THRESHOLD_PERCENTILES}
+
+    def _normalize_scores(self, raw_scores: np.ndarray, score_reference: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Quy đổi decision_function (càng âm càng bất thường) về Anomaly Score [0, 100]
+
+        Dùng CDF thực nghiệm của tập train: score = % DN khỏe mạnh trong tập train
+        có decision_function cao hơn DN đang xét. Mô hình cũ không có score_reference
+        dùng quy tắc tuyến tính (0.5 - raw) * 100.
+
+        Args:
+            raw_scores: Mảng decision_function shape (n,)
+            score_reference: decision_function đã sắp xếp của tập train (None = mô hình cũ)
+
+        Returns:
+            Mảng Anomaly Score shape (n,)
+        """
+        if score_reference is None or len(score_reference) == 0:
+            return np.clip((0.5 - raw_scores) * 100, 0, 100)
+
+        rank = np.searchsorted(score_reference, raw_scores, side='right')
+        return 100.0 * (1.0 - rank / len(score_reference))
+
+    def risk_cutoffs(self) -> Tuple[float, float]:
+        """
+        Ngưỡng Anomaly Score cho mức "Bất thường Trung bình" và "Bất thường Cao"
+
+        Trên thang CDF, score >= 100 * (1 - q) nghĩa là DN nằm trong q% DN khỏe mạnh
+        bất thường nhất của tập train. Mức Cao lấy q = contamination (mặc định 5% → 95),
+        mức Trung bình lấy q = 2 * contamination (→ 90).
+
+        Returns:
+            (ngưỡng Trung bình, ngưỡng Cao)
+        """
+        with self._swap_lock:
+            score_reference = self.score_reference
+        if score_reference is None or len(score_reference) == 0:
+            return LEGACY_RISK_CUTOFFS
+
+        contamination = self.model_params['contamination']
+        if not isinstance(contamination, (int, float)):
+            contamination = ANOMALY_PARAMS['contamination']  # 'auto' → mặc định 5%
+        return 100.0 * (1.0 - min(2 * contamination, 1.0)), 100.0 * (1.0 - contamination)
+
+    @memoize_score('anomaly')
+    def calculate_anomaly_score(self, indicators: Union[FeatureVector, Dict[str, float]]) -> float:
         """
         Tính Anomaly Score (0-100) cho DN mới
 
         Args:
-            indicators: Dict chứa 14 chỉ số (X_1 → X_14)
+            indicators: FeatureVector (hoặc dict) chứa 14 chỉ số (X_1 → X_14)
 
         Returns:
             anomaly_score: Điểm bất thường (0-100), càng cao càng bất thường
         """
-        if self.model is None:
+        return float(self.calculate_anomaly_scores_batch(indicators)[0])
+
+    def calculate_anomaly_scores_batch(self, features: Union[FeatureVector, Dict[str, float]]) -> np.ndarray:
+        """
+        Tính Anomaly Score (0-100) cho nhiều DN trong một lần gọi Isolation Forest
+
+        Args:
+            features: FeatureVector shape (n, 14) (hoặc dict 1 DN)
+
+        Returns:
+            Mảng Anomaly Score shape (n,), làm tròn 2 chữ số
+        """
+        # Lấy bộ mô hình hiện tại một lần (có thể bị đổi bởi lần fit lại chạy nền)
+        with self._swap_lock:
+            scaler, model, score_reference = self.scaler, self.model, self.score_reference
+
+        if model is None:
             raise ValueError("Model chưa được train. Vui lòng train model trước.")
 
-        # Chuẩn bị input
-        X_new = [[indicators[f] for f in self.feature_names]]
-        X_scaled = self.scaler.transform(X_new)
+        X_scaled = scaler.transform(FeatureVector.coerce(features).values)
 
-        # Tính decision_function (raw score)
         # decision_function: càng âm càng bất thường, càng dương càng bình thường
-        raw_score = self.model.decision_function(X_scaled)[0]
+        raw_scores = model.decision_function(X_scaled)
+
+        return np.round(self._normalize_scores(raw_scores, score_reference), 2)
+
+    def detect_feature_breaches(self, features: Union[FeatureVector, Dict[str, float]]) -> Dict[str, np.ndarray]:
+        """
+        So sánh toàn bộ ma trận chỉ số với ngưỡng P5/P95 bằng broadcasting
+
+        Args:
+            features: FeatureVector shape (n, 14) (hoặc dict 1 DN)
+
+        Returns:
+            Dict các mảng shape (n, 14):
+            - low: Thấp hơn P5
+            - high: Cao hơn P95 (chỉ tính các chỉ số cao là xấu)
+            - deviation_percent: Độ lệch % so với ngưỡng bị vượt (0 nếu không vượt)
+            - severe: Độ lệch > 50%
+            và 'thresholds': ma trận ngưỡng (5, 14) đã dùng
+        """
+        thresholds = self.threshold_values  # Chế độ online có thể thay ngưỡng bất kỳ lúc nào
+        if thresholds is None:
+            raise ValueError("Model chưa được train. Vui lòng train model trước.")
+
+        X = FeatureVector.coerce(features).values
+        p5, p95 = thresholds[0], thresholds[-1]
+
+        low = X < p5
+        high = (X > p95) & BAD_IF_HIGH_MASK
 
-        # Normalize về [0, 100]
-        # Dựa trên kinh nghiệm: decision_function thường trong khoảng [-0.5, 0.5]
-        # -0.5 → 100 (rất bất thường)
-        # 0.5 → 0 (rất bình thường)
-        anomaly_score = max(0, min(100, (0.5 - raw_score) * 100))
+        # Độ lệch so với ngưỡng (ngưỡng = 0 → độ lệch 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            low_dev = np.where(p5 != 0, (p5 - X) / np.abs(p5) * 100, 0.0)
+            high_dev = np.where(p95 != 0, (X - p95) / np.abs(p95) * 100, 0.0)
+        deviation = np.abs(np.where(low, low_dev, np.where(high, high_dev, 0.0)))
 
-        return round(anomaly_score, 2)
+        return {
+            'low': low,
+            'high': high,
+            'deviation_percent': deviation,
+            'severe': deviation > 50,
+            'thresholds': thresholds
+        }
 
-    def detect_abnormal_features(self, indicators: Dict[str, float]) -> List[Dict[str, Any]]:
+    def detect_abnormal_features(self, indicators: Union[FeatureVector, Dict[str, float]]) -> List[Dict[str, Any]]:
         """
         Phát hiện các features bất thường (so với P5, P95)
 
         Args:
-            indicators: Dict chứa 14 chỉ số (X_1 → X_14)
+            indicators: FeatureVector (hoặc dict) chứa 14 chỉ số (X_1 → X_14)
 
         Returns:
             List of Dict chứa thông tin các features bất thường:
@@ -170,57 +417,283 @@ class AnomalyDetectionSystem:
                 'severity': str  # 'high' hoặc 'medium'
             }]
         """
-        abnormal_features = []
+        features = FeatureVector.coerce(indicators)
+        breaches = self.detect_feature_breaches(features)
+        values = features.values[0]
+        low = breaches['low'][0]
 
-        for feature in self.feature_names:
-            current_value = indicators[feature]
-            p5 = self.thresholds[feature]['P5']
-            p50 = self.thresholds[feature]['P50']
-            p95 = self.thresholds[feature]['P95']
-
-            # Kiểm tra bất thường
-            is_abnormal = False
-            deviation_percent = 0
-            severity = 'medium'
-
-            if current_value < p5:
-                # Thấp hơn P5 → Bất thường
-                is_abnormal = True
-                deviation_percent = ((p5 - current_value) / abs(p5) * 100) if p5 != 0 else 0
-                severity = 'high' if deviation_percent > 50 else 'medium'
-            elif current_value > p95:
-                # Cao hơn P95 → Bất thường
-                is_abnormal = True
-                deviation_percent = ((current_value - p95) / abs(p95) * 100) if p95 != 0 else 0
-
-                # ĐẶC BIỆT: Đối với một số chỉ số, cao hơn P95 là TỐT (không phải bất thường)
-                good_if_high = ['X_1', 'X_2', 'X_3', 'X_4', 'X_7', 'X_8', 'X_9', 'X_10', 'X_11', 'X_12', 'X_14']
-                if feature in good_if_high:
-                    # Chỉ số này cao là tốt → Không coi là bất thường
-                    is_abnormal = False
-                else:
-                    # Chỉ số này cao là xấu (X_5, X_6, X_13)
-                    severity = 'high' if deviation_percent > 50 else 'medium'
-
-            if is_abnormal:
-                abnormal_features.append({
-                    'feature_code': feature,
-                    'feature_name': self.indicator_names[feature],
-                    'current_value': round(current_value, 4),
-                    'p5': round(p5, 4),
-                    'p50': round(p50, 4),
-                    'p95': round(p95, 4),
-                    'deviation_percent': round(abs(deviation_percent), 2),
-                    'severity': severity,
-                    'direction': 'low' if current_value < p5 else 'high'
-                })
+        abnormal_features = []
+        for j in np.flatnonzero(low | breaches['high'][0]):
+            feature = self.feature_names[j]
+            thresholds = breaches['thresholds'][:, j]
+            abnormal_features.append({
+                'feature_code': feature,
+                'feature_name': self.indicator_names[feature],
+                'current_value': round(float(values[j]), 4),
+                'p5': round(float(thresholds[0]), 4),
+                'p50': round(float(thresholds[2]), 4),
+                'p95': round(float(thresholds[4]), 4),
+                'deviation_percent': round(float(breaches['deviation_percent'][0, j]), 2),
+                'severity': 'high' if breaches['severe'][0, j] else 'medium',
+                'direction': 'low' if low[j] else 'high'
+            })
 
         # Sắp xếp theo độ lệch giảm dần
         abnormal_features.sort(key=lambda x: x['deviation_percent'], reverse=True)
 
         return abnormal_features
 
-    def classify_anomaly_type(self, indicators: Dict[str, float], abnormal_features: List[Dict]) -> str:
+    def _query_peers(self, features: Union[FeatureVector, Dict[str, float]]) -> Optional[Tuple[PeerIndex, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Truy vấn k DN tham chiếu gần nhất (không gian đã chuẩn hóa) và tính Local Outlier Factor
+
+        Args:
+            features: FeatureVector shape (n, 14) (hoặc dict 1 DN)
+
+        Returns:
+            (peer_index, dist (n, k), ind (n, k), lof (n,)), hoặc None nếu chưa có peer index
+        """
+        with self._swap_lock:
+            scaler, peer_index = self.scaler, self.peer_index
+        if peer_index is None:
+            return None
+
+        X_scaled = scaler.transform(FeatureVector.coerce(features).values)
+        dist, ind = peer_index.tree.query(X_scaled, k=peer_index.k)
+
+        # LOF = mật độ trung bình của các peers / mật độ cục bộ của DN (≈1 bình thường, >1 bất thường)
+        reach = np.maximum(peer_index.k_distance[ind], dist)
+        lrd = 1.0 / np.maximum(reach.mean(axis=1), 1e-10)
+        lof = peer_index.lrd[ind].mean(axis=1) / lrd
+
+        return peer_index, dist, ind, lof
+
+    def find_healthy_peers(self, indicators: Union[FeatureVector, Dict[str, float]]) -> Optional[Dict[str, Any]]:
+        """
+        Tìm k DN khỏe mạnh tương đồng nhất và Local Outlier Score của DN
+
+        Args:
+            indicators: FeatureVector (hoặc dict) chứa 14 chỉ số của 1 DN
+
+        Returns:
+            Dict chứa:
+            - local_outlier_score: Local Outlier Factor (≈1 giống quần thể khỏe mạnh, >1.5 tách biệt)
+            - peers: List k DN tương đồng [{distance, indicators}] (gần nhất trước)
+            Hoặc None nếu mô hình chưa có peer index
+
+        Quần thể tham chiếu là DN khỏe mạnh của tập train, sau khi fit lại online là cửa sổ trượt
+        (chỉ gồm quan sát đã qua bộ lọc của observe). Vị trí trong cửa sổ không gắn với DN cụ thể
+        nên peers chỉ trả về chỉ số, không trả về định danh dòng.
+        """
+        query = self._query_peers(indicators)
+        if query is None:
+            return None
+
+        peer_index, dist, ind, lof = query
+        peers = [{
+            'distance': round(float(d), 4),
+            'indicators': dict(zip(self.feature_names, peer_index.reference[j].tolist()))
+        } for d, j in zip(dist[0], ind[0])]
+
+        return {
+            'k': peer_index.k,
+            'local_outlier_score': round(float(lof[0]), 4),
+            'peers': peers
+        }
+
+    def check_batch(self, features: FeatureVector) -> List[Dict[str, Any]]:
+        """
+        Sàng lọc bất thường cho cả danh mục DN (1 lần gọi Isolation Forest + 1 lần so ngưỡng)
+
+        Args:
+            features: FeatureVector shape (n, 14)
+
+        Returns:
+            List (n phần tử) Dict chứa anomaly_score, anomaly_type, local_outlier_score và các chỉ số vượt ngưỡng
+        """
+        scores = self.calculate_anomaly_scores_batch(features)
+        breaches = self.detect_feature_breaches(features)
+        low, high = breaches['low'], breaches['high']
+        deviation = np.round(breaches['deviation_percent'], 2)
+        num_abnormal = (low | high).sum(axis=1)
+        query = self._query_peers(features)
+        lof = np.round(query[3], 4) if query is not None else None
+
+        results = []
+        for i in range(len(features)):
+            flagged = np.flatnonzero(low[i] | high[i])
+            # Sắp xếp theo độ lệch giảm dần
+            flagged = flagged[np.argsort(-deviation[i, flagged], kind='stable')]
+            abnormal_features = [{
+                'feature_code': self.feature_names[j],
+                'deviation_percent': float(deviation[i, j]),
+                'severity': 'high' if breaches['severe'][i, j] else 'medium',
+                'direction': 'low' if low[i, j] else 'high'
+            } for j in flagged]
+
+            results.append({
+                'anomaly_score': float(scores[i]),
+                'num_abnormal_features': int(num_abnormal[i]),
+                'abnormal_features': abnormal_features,
+                'anomaly_type': self.classify_anomaly_type(features.row(i), abnormal_features),
+                'local_outlier_score': float(lof[i]) if lof is not None else None
+            })
+
+        return results
+
+    def observe(self, indicators: Union[FeatureVector, Dict[str, float]], label: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Chế độ online: chấm điểm 1 quan sát mới rồi đưa vào sketch ngưỡng + cửa sổ trượt
+
+        Quan sát được chấm bằng mô hình hiện tại (không đọc lại tập train). Chỉ quan sát
+        qua được bộ lọc mới cập nhật P² sketch của P5-P95 và cửa sổ trượt (tập tham chiếu
+        "khỏe mạnh" cho lần fit lại và peer search):
+        - label = 0 (đã xác nhận khỏe mạnh): luôn nhận
+        - label = 1 (đã biết vỡ nợ): luôn loại
+        - chưa gán nhãn: chỉ nhận nếu Anomaly Score dưới ngưỡng Bất thường Cao
+        Sau mỗi ANOMALY_REFIT_EVERY quan sát được nhận, Isolation Forest được fit lại
+        trên cửa sổ trượt trong thread nền và đổi nóng khi xong.
+
+        Args:
+            indicators: FeatureVector (hoặc dict) chứa 14 chỉ số của 1 DN
+            label: 0 = đã xác nhận khỏe mạnh, 1 = đã biết vỡ nợ, None = chưa gán nhãn
+
+        Returns:
+            Dict chứa anomaly_score, abnormal_features, anomaly_type, absorbed, refit_started
+        """
+        features = FeatureVector.coerce(indicators)
+        if len(features) != 1:
+            raise ValueError("observe chỉ nhận đúng 1 DN mỗi lần")
+        if label not in (None, 0, 1):
+            raise ValueError("label chỉ nhận 0 (khỏe mạnh), 1 (vỡ nợ) hoặc để trống")
+
+        # 1. CHẤM ĐIỂM VỚI MÔ HÌNH + NGƯỠNG HIỆN TẠI
+        anomaly_score = self.calculate_anomaly_score(features)
+        abnormal_features = self.detect_abnormal_features(features)
+
+        # 2. LỌC: CHỈ NHẬN DN ĐÃ XÁC NHẬN KHỎE MẠNH HOẶC CHƯA GÁN NHÃN VÀ DƯỚI MỨC BẤT THƯỜNG CAO
+        if label == 1:
+            absorbed = False
+        elif label == 0:
+            absorbed = True
+        else:
+            absorbed = anomaly_score < self.risk_cutoffs()[1]
+
+        # 3. CẬP NHẬT SKETCH + CỬA SỔ TRƯỢT
+        refit_started = False
+        if not absorbed:
+            with self._swap_lock:
+                if label == 1:
+                    self.num_skipped_defaulted += 1
+                else:
+                    self.num_skipped_anomalous += 1
+        else:
+            x = features.values[0]
+            with self._swap_lock:
+                for sketch in self.sketches.values():
+                    sketch.update(x)
+                if self.sketches:
+                    self._set_thresholds(self._sketch_thresholds(self.sketches))
+                self.window.append(x)
+                self.num_observed += 1
+                self.observed_since_refit += 1
+                refit_due = 0 < ANOMALY_REFIT_EVERY <= self.observed_since_refit
+
+            # 4. FIT LẠI ISOLATION FOREST CHẠY NỀN KHI ĐỦ SỐ QUAN SÁT MỚI
+            if refit_due:
+                refit_started = self.start_background_refit()
+
+        return {
+            'anomaly_score': anomaly_score,
+            'abnormal_features': abnormal_features,
+            'anomaly_type': self.classify_anomaly_type(features, abnormal_features),
+            'absorbed': absorbed,
+            'refit_started': refit_started
+        }
+
+    def _sketch_thresholds(self, sketches: Dict[int, P2QuantileSketch]) -> np.ndarray:
+        """Đọc ngưỡng P5-P95 hiện tại từ các P² sketch, shape (5, 14)"""
+        return np.vstack([sketches[p].value for p in THRESHOLD_PERCENTILES])
+
+    def start_background_refit(self) -> bool:
+        """
+        Fit lại Isolation Forest trên cửa sổ trượt trong thread nền
+
+        Returns:
+            True nếu đã bắt đầu, False nếu đang có lần fit lại khác chạy hoặc chưa train
+        """
+        with self._swap_lock:
+            if self.model is None or (self._refit_thread is not None and self._refit_thread.is_alive()):
+                return False
+            snapshot = np.array(self.window)
+            snapshot_count = self.num_observed
+            version = self.model_version
+            self.observed_since_refit = 0
+            self._refit_thread = threading.Thread(
+                target=self._refit_window, args=(snapshot, snapshot_count, version), daemon=True
+            )
+            self._refit_thread.start()
+        return True
+
+    def _refit_window(self, snapshot: np.ndarray, snapshot_count: int, version: str):
+        """
+        Fit mô hình mới trên snapshot cửa sổ trượt rồi đổi nóng mô hình đang phục vụ
+
+        Args:
+            snapshot: Ma trận các quan sát trong cửa sổ tại thời điểm bắt đầu
+            snapshot_count: num_observed tại thời điểm lấy snapshot
+            version: model_version tại thời điểm lấy snapshot (khác = đã train lại, bỏ kết quả)
+        """
+        try:
+            print(f"🔁 Fit lại Isolation Forest trên cửa sổ {len(snapshot)} quan sát...")
+            scaler, model, score_reference, peer_index = self._fit_forest(snapshot)
+            thresholds = self._exact_thresholds(snapshot)
+            sketches = self._seed_sketches(snapshot)
+
+            with self._swap_lock:
+                if self.model_version != version:
+                    print("⚠️ Mô hình đã được train lại trong lúc fit nền, bỏ kết quả fit lại")
+                    return
+
+                # Bổ sung các quan sát đến sau thời điểm snapshot vào sketch mới
+                num_new = min(self.num_observed - snapshot_count, len(self.window))
+                for x in list(self.window)[len(self.window) - num_new:]:
+                    for sketch in sketches.values():
+                        sketch.update(x)
+
+                self.scaler, self.model, self.score_reference = scaler, model, score_reference
+                self.peer_index = peer_index
+                self.sketches = sketches
+                self._set_thresholds(self._sketch_thresholds(sketches) if num_new and sketches else thresholds)
+                self.num_refits += 1
+                self.last_refit_error = None
+                self.model_version = bump_model_version('anomaly')
+
+            print("✅ Đã đổi sang Isolation Forest mới")
+        except Exception as e:
+            self.last_refit_error = str(e)
+            print(f"❌ Lỗi khi fit lại Isolation Forest: {str(e)}")
+
+    def online_status(self) -> Dict[str, Any]:
+        """Trạng thái chế độ online (cửa sổ trượt, số quan sát bị loại, số lần fit lại, ngưỡng hiện tại)"""
+        with self._swap_lock:
+            return {
+                'trained': self.model is not None,
+                'window_size': len(self.window),
+                'window_capacity': self.window.maxlen,
+                'num_observed': self.num_observed,
+                'num_skipped': self.num_skipped_defaulted + self.num_skipped_anomalous,
+                'num_skipped_defaulted': self.num_skipped_defaulted,
+                'num_skipped_anomalous': self.num_skipped_anomalous,
+                'observed_since_refit': self.observed_since_refit,
+                'refit_every': ANOMALY_REFIT_EVERY,
+                'refit_running': self._refit_thread is not None and self._refit_thread.is_alive(),
+                'num_refits': self.num_refits,
+                'last_refit_error': self.last_refit_error,
+                'thresholds': self.thresholds
+            }
+
+    def classify_anomaly_type(self, indicators: Union[FeatureVector, Dict[str, float]], abnormal_features: List[Dict]) -> str:
         """
         Phân loại loại bất thường
 
@@ -244,7 +717,7 @@ class AnomalyDetectionSystem:
 
     def generate_gemini_explanation(
         self,
-        indicators: Dict[str, float],
+        indicators: Union[FeatureVector, Dict[str, float]],
         anomaly_score: float,
         abnormal_features: List[Dict],
         anomaly_type: str,
@@ -263,6 +736,9 @@ class AnomalyDetectionSystem:
         Returns:
             explanation: Giải thích văn xuôi (tiếng Việt, 200-300 từ)
         """
+        if isinstance(indicators, FeatureVector):
+            indicators = indicators.to_dict()
+
         try:
             import google.generativeai as genai
 
@@ -0,0 +1,296 @@
+"""
+Module Chart Specs - Template cấu hình biểu đồ ECharts dựng sẵn
+
+Mỗi template là JSON bytes (bất biến) của option ECharts, được dựng một lần khi import module.
+Mỗi request chỉ parse lại template (orjson, trong C) và gắn dữ liệu số vào các slot; nhãn tiếng Việt,
+style, trục... chỉ khai báo ở đây, dùng chung cho endpoint và GeminiAnalyzer.
+
+ETag của template = hash nội dung, nên các config cùng cấu trúc có chung ETag
+(client cache qua GET /chart-templates với If-None-Match).
+"""
+
+import hashlib
+from types import MappingProxyType
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from json_response import dumps_json, loads_json
+
+
+class ChartTemplate(NamedTuple):
+    """Template option ECharts: body JSON bất biến + đường dẫn các slot dữ liệu"""
+    name: str
+    body: bytes
+    slots: MappingProxyType  # tên slot → đường dẫn (tuple key/index) trong option
+    etag: str
+
+
+def _make_etag(body: bytes) -> str:
+    """ETag (strong) từ nội dung JSON"""
+    return '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+
+def _build_template(name: str, option: Dict[str, Any], **slots: Tuple) -> ChartTemplate:
+    """
+    Đóng băng option ECharts thành template
+
+    Args:
+        name: Tên template
+        option: Option ECharts (giá trị tại các slot để None)
+        **slots: Tên slot → đường dẫn trong option
+
+    Returns:
+        ChartTemplate
+    """
+    body = dumps_json(option)
+    return ChartTemplate(name, body, MappingProxyType(slots), _make_etag(body))
+
+
+def _series_slot(*path) -> Tuple:
+    """Đường dẫn tới data của series đầu tiên"""
+    return ("series", 0, "data") + path
+
+
+# ================================================================================================
+# TEMPLATES: /analyze-pd-with-industry (14 chỉ số của doanh nghiệp)
+# ================================================================================================
+
+_PD_TEMPLATES = (
+    _build_template("pd_overview_radar", {
+        "title": {"text": "Tổng quan 14 Chỉ số Tài chính", "left": "center"},
+        "tooltip": {},
+        "radar": {
+            "indicator": [
+                {"name": "Sinh lời (X1-X4)", "max": 1},
+                {"name": "Đòn bẩy (X5-X6)", "max": 5},
+                {"name": "Thanh toán (X7-X8)", "max": 5},
+                {"name": "Hiệu quả (X9-X14)", "max": 10}
+            ]
+        },
+        "series": [{
+            "type": "radar",
+            "data": [{
+                "value": None,
+                "name": "Chỉ số doanh nghiệp",
+                "areaStyle": {"color": "rgba(255, 107, 157, 0.3)"}
+            }]
+        }]
+    }, values=_series_slot(0, "value")),
+
+    _build_template("pd_profitability_bar", {
+        "title": {"text": "Chỉ số Sinh lời (X1-X4)", "left": "center"},
+        "tooltip": {"trigger": "axis"},
+        "xAxis": {
+            "type": "category",
+            "data": ["Biên LN gộp (X1)", "Biên LN trước thuế (X2)", "ROA (X3)", "ROE (X4)"]
+        },
+        "yAxis": {"type": "value"},
+        "series": [{
+            "data": None,
+            "type": "bar",
+            "itemStyle": {"color": "#10B981"},
+            "label": {"show": True, "position": "top", "formatter": "{c}"}
+        }]
+    }, values=_series_slot()),
+
+    _build_template("pd_liquidity_leverage_bar", {
+        "title": {"text": "Thanh toán & Đòn bẩy (X5-X8)", "left": "center"},
+        "tooltip": {"trigger": "axis"},
+        "xAxis": {
+            "type": "category",
+            "data": ["Nợ/TS (X5)", "Nợ/VCSH (X6)", "TT hiện hành (X7)", "TT nhanh (X8)"]
+        },
+        "yAxis": {"type": "value"},
+        "series": [{
+            "data": None,
+            "type": "bar",
+            "itemStyle": {"color": "#3B82F6"},
+            "label": {"show": True, "position": "top", "formatter": "{c}"}
+        }]
+    }, values=_series_slot()),
+
+    _build_template("pd_efficiency_bar", {
+        "title": {"text": "Hiệu quả Hoạt động (X9-X14)", "left": "center"},
+        "tooltip": {"trigger": "axis"},
+        "xAxis": {
+            "type": "category",
+            "data": ["Trả lãi (X9)", "Trả nợ gốc (X10)", "Tạo tiền (X11)",
+                     "Vòng quay HTK (X12)", "Kỳ thu tiền (X13)", "Hiệu suất TS (X14)"]
+        },
+        "yAxis": {"type": "value"},
+        "series": [{
+            "data": None,
+            "type": "bar",
+            "itemStyle": {"color": "#9C27B0"},
+            "label": {"show": True, "position": "top", "formatter": "{c}"}
+        }]
+    }, values=_series_slot()),
+)
+
+# ================================================================================================
+# TEMPLATES: /generate-charts (dữ liệu ngành) - tiêu đề có chỗ trống {industry_name}
+# ================================================================================================
+
+_INDUSTRY_TEMPLATES = (
+    _build_template("industry_gdp_growth_bar", {
+        "title": {"text": "Tăng trưởng GDP - {industry_name}", "left": "center"},
+        "tooltip": {"trigger": "axis"},
+        "xAxis": {"type": "category", "data": None},
+        "yAxis": {"type": "value", "name": "Tăng trưởng (%)"},
+        "series": [{
+            "data": None,
+            "type": "bar",
+            "itemStyle": {"color": "#FF6B9D"},
+            "label": {"show": True, "position": "top"}
+        }]
+    }, categories=("xAxis", "data"), values=_series_slot()),
+
+    _build_template("industry_financial_radar", {
+        "title": {"text": "Chỉ số Tài chính - {industry_name}", "left": "center"},
+        "tooltip": {},
+        "radar": {
+            "indicator": [
+                {"name": "ROE", "max": 30},
+                {"name": "ROA", "max": 20},
+                {"name": "Biên LN gộp", "max": 50},
+                {"name": "Tỷ lệ nợ", "max": 100}
+            ]
+        },
+        "series": [{
+            "type": "radar",
+            "data": [{
+                "value": None,
+                "name": "Chỉ số tài chính",
+                "areaStyle": {"color": "rgba(255, 107, 157, 0.3)"}
+            }]
+        }]
+    }, values=_series_slot(0, "value")),
+
+    _build_template("industry_npl_line", {
+        "title": {"text": "Tỷ lệ Nợ xấu (NPL) - {industry_name}", "left": "center"},
+        "tooltip": {"trigger": "axis"},
+        "xAxis": {"type": "category", "data": None},
+        "yAxis": {"type": "value", "name": "NPL (%)"},
+        "series": [{
+            "data": None,
+            "type": "line",
+            "smooth": True,
+            "itemStyle": {"color": "#9C27B0"},
+            "areaStyle": {"color": "rgba(156, 39, 176, 0.2)"},
+            "label": {"show": True, "position": "top"}
+        }]
+    }, categories=("xAxis", "data"), values=_series_slot()),
+)
+
+CHART_TEMPLATES = MappingProxyType({
+    template.name: template for template in _PD_TEMPLATES + _INDUSTRY_TEMPLATES
+})
+
+# ETag chung của toàn bộ bộ template (đổi khi bất kỳ template nào đổi)
+CHART_TEMPLATES_ETAG = _make_etag(b"".join(template.body for template in CHART_TEMPLATES.values()))
+
+
+def render_chart(name: str, title_args: Optional[Dict[str, str]] = None, **values: Any) -> Dict[str, Any]:
+    """
+    Tạo option ECharts từ template + dữ liệu của request
+
+    Args:
+        name: Tên template trong CHART_TEMPLATES
+        title_args: Giá trị cho chỗ trống trong tiêu đề (ví dụ {"industry_name": ...})
+        **values: Tên slot → dữ liệu (list số, nhãn trục...)
+
+    Returns:
+        Dict option ECharts mới (an toàn để sửa đổi)
+    """
+    template = CHART_TEMPLATES[name]
+    option = loads_json(template.body)
+
+    if title_args:
+        option["title"]["text"] = option["title"]["text"].format(**title_args)
+
+    for slot, value in values.items():
+        *parents, leaf = template.slots[slot]
+        node = option
+        for key in parents:
+            node = node[key]
+        node[leaf] = value
+
+    return option
+
+
+def pd_indicator_charts(indicators_dict: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    4 biểu đồ 14 chỉ số tài chính cho /analyze-pd-with-industry
+
+    Args:
+        indicators_dict: Dict X_1 → X_14 (thiếu = 0)
+
+    Returns:
+        List option ECharts (radar tổng quan + 3 bar chart theo nhóm)
+    """
+    x = [indicators_dict.get(f'X_{i}', 0) for i in range(15)]  # x[i] = X_i (x[0] không dùng)
+
+    # Radar: trung bình theo nhóm (nhóm hiệu quả không gồm X13 - kỳ thu tiền, ngược chiều)
+    radar_values = [
+        (x[1] + x[2] + x[3] + x[4]) / 4,
+        (x[5] + x[6]) / 2,
+        (x[7] + x[8]) / 2,
+        (x[9] + x[10] + x[11] + x[12] + x[14]) / 5
+    ]
+
+    return [
+        render_chart("pd_overview_radar", values=radar_values),
+        render_chart("pd_profitability_bar", values=x[1:5]),
+        render_chart("pd_liquidity_leverage_bar", values=x[5:9]),
+        render_chart("pd_efficiency_bar", values=x[9:15]),
+    ]
+
+
+def industry_charts(industry_name: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    3 biểu đồ dữ liệu ngành cho /generate-charts
+
+    Args:
+        industry_name: Tên ngành (đưa vào tiêu đề)
+        data: Dữ liệu ngành từ fetch_industry_data
+
+    Returns:
+        List option ECharts (GDP, radar tài chính, NPL)
+    """
+    growth = data.get("growth", {})
+    financial = data.get("financial", {})
+    credit_risk = data.get("credit_risk", {})
+    title_args = {"industry_name": industry_name}
+    years = growth.get("years", [])
+
+    return [
+        render_chart("industry_gdp_growth_bar", title_args,
+                     categories=years, values=growth.get("gdp_growth", [])),
+        render_chart("industry_financial_radar", title_args, values=[
+            financial.get("roe", 0),
+            financial.get("roa", 0),
+            financial.get("gross_margin", 0),
+            financial.get("debt_ratio", 0)
+        ]),
+        render_chart("industry_npl_line", title_args,
+                     categories=years, values=credit_risk.get("npl_rates", [])),
+    ]
+
+
+def chart_templates_payload() -> Dict[str, Any]:
+    """
+    Toàn bộ template (option + slot + ETag) cho GET /chart-templates
+
+    Returns:
+        Dict {"etag", "templates": {name: {"etag", "option", "slots"}}}
+    """
+    return {
+        "etag": CHART_TEMPLATES_ETAG,
+        "templates": {
+            name: {
+                "etag": template.etag,
+                "option": loads_json(template.body),
+                "slots": {slot: list(path) for slot, path in template.slots.items()}
+            }
+            for name, template in CHART_TEMPLATES.items()
+        }
+    }
@@ -0,0 +1,202 @@
+"""
+Module Compression - Nén response (Brotli/GZip) cho các payload phân tích lớn
+
+Các endpoint như /train-survival, /survival-metrics, /generate-charts, /analyze-pd-with-industry
+trả về JSON lớn và lặp nhiều (đường cong, cấu hình biểu đồ) nên nén giảm mạnh số byte truyền đi.
+
+- Encoding được chọn theo header Accept-Encoding (q-value): br (nếu cài brotli) > gzip > không nén
+- Chỉ nén response một khối (không streaming) có kích thước >= COMPRESSION_MIN_SIZE
+- Bỏ qua media type đã nén sẵn (ảnh, zip...) và response đã có Content-Encoding
+- Tắt nén theo route: decorator @no_compression hoặc biến môi trường COMPRESSION_EXCLUDED_PATHS
+"""
+
+import os
+import zlib
+from typing import Callable, Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# brotli là dependency tùy chọn (chưa cài → chỉ dùng gzip)
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# Bật/tắt nén response (1 = bật)
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "1") == "1"
+# Response nhỏ hơn ngưỡng này (byte) không nén (header gzip/br + CPU không đáng)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Mức nén: gzip 1-9, brotli 0-11 (mức vừa phải, tốn ít CPU cho response động)
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+# Body lớn hơn ngưỡng này được nén trong worker thread để không chặn event loop
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", str(256 * 1024)))
+# Các path không nén, phân cách bằng dấu phẩy (ví dụ: "/export-report,/model-info")
+COMPRESSION_EXCLUDED_PATHS = frozenset(
+    path.strip() for path in os.getenv("COMPRESSION_EXCLUDED_PATHS", "").split(",") if path.strip()
+)
+
+# Media type đã nén sẵn, nén lại chỉ tốn CPU
+EXCLUDED_MEDIA_TYPES = (
+    "image/",
+    "audio/",
+    "video/",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "text/event-stream",
+)
+
+# Thứ tự ưu tiên khi client chấp nhận nhiều encoding với cùng q-value
+SUPPORTED_ENCODINGS = ("br", "gzip") if BROTLI_AVAILABLE else ("gzip",)
+
+
+def no_compression(endpoint: Callable) -> Callable:
+    """
+    Decorator tắt nén response cho 1 endpoint (đặt ngay dưới @app.get/@app.post)
+
+    Args:
+        endpoint: Hàm endpoint
+
+    Returns:
+        Chính hàm endpoint (được đánh dấu)
+    """
+    endpoint.__no_compression__ = True
+    return endpoint
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Chọn encoding theo header Accept-Encoding (ưu tiên q-value cao, cùng q thì br trước gzip)
+
+    Args:
+        accept_encoding: Giá trị header Accept-Encoding
+
+    Returns:
+        "br", "gzip" hoặc None (không nén)
+    """
+    if not accept_encoding:
+        return None
+
+    q_values = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        q_values[coding.lower()] = q
+
+    wildcard = q_values.get("*", 0.0)
+    candidates = [
+        (-q_values.get(encoding, wildcard), order, encoding)
+        for order, encoding in enumerate(SUPPORTED_ENCODINGS)
+    ]
+    for q, _, encoding in sorted(candidates):
+        if -q > 0:
+            return encoding
+    return None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    """
+    Nén body theo encoding đã chọn
+
+    Args:
+        body: Nội dung response
+        encoding: "br" hoặc "gzip"
+
+    Returns:
+        Body đã nén
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # wbits = 16 + MAX_WBITS → định dạng gzip (header + CRC32)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware nén response một khối bằng Brotli/GZip
+
+    Response streaming (nhiều chunk, ví dụ FileResponse) được chuyển tiếp nguyên vẹn.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 excluded_paths: frozenset = COMPRESSION_EXCLUDED_PATHS):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.excluded_paths = excluded_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # initial_message giữ lại http.response.start cho tới khi biết có nén hay không
+        state = {"initial_message": None, "passthrough": False}
+
+        async def send_compressed(message: Message) -> None:
+            message_type = message["type"]
+
+            # 1. GIỮ LẠI HEADER, QUYẾT ĐỊNH CÓ BỎ QUA NÉN HAY KHÔNG
+            if message_type == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").lower()
+                endpoint = scope.get("endpoint")
+                state["passthrough"] = (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                    or media_type.startswith(EXCLUDED_MEDIA_TYPES)
+                    or getattr(endpoint, "__no_compression__", False)
+                )
+                if state["passthrough"]:
+                    await send(message)
+                else:
+                    state["initial_message"] = message
+                return
+
+            if state["passthrough"] or message_type != "http.response.body":
+                await send(message)
+                return
+
+            initial_message = state["initial_message"]
+            state["passthrough"] = True  # các chunk tiếp theo (nếu có) gửi thẳng
+            body = message.get("body", b"")
+
+            # 2. RESPONSE STREAMING HOẶC NHỎ → GỬI NGUYÊN
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(initial_message)
+                await send(message)
+                return
+
+            # 3. NÉN (BODY LỚN NÉN TRONG WORKER THREAD)
+            if len(body) >= COMPRESSION_THREAD_MIN_SIZE:
+                compressed = await anyio.to_thread.run_sync(compress_body, body, encoding)
+            else:
+                compressed = compress_body(body, encoding)
+
+            headers = MutableHeaders(raw=initial_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(compressed) < len(body):
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                message["body"] = compressed
+
+            await send(initial_message)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
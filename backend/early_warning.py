@@ -5,14 +5,44 @@ Sử dụng ML (Stacking + K-Means + Gemini AI) để chẩn đoán sức khỏe
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, NamedTuple, Optional, Union
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import StackingClassifier
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.preprocessing import StandardScaler
 import xgboost as xgb
 import os
+from model_registry import get_promoted_params
+from feature_vector import FeatureVector, FEATURE_COLS
+from score_cache import memoize_score, bump_model_version
+
+# Siêu tham số mặc định của Stacking (có thể bị ghi đè bởi model registry)
+EARLY_WARNING_PARAMS = {
+    'rf_n_estimators': 100,
+    'rf_max_depth': 10,
+    'xgb_n_estimators': 100,
+    'xgb_max_depth': 6,
+    'xgb_learning_rate': 0.1,
+    'gb_n_estimators': 100,
+    'gb_max_depth': 6,
+    'gb_learning_rate': 0.1,
+}
+
+# Số cluster K-Means của nhóm DN khỏe mạnh
+EWS_N_CLUSTERS = 4
+# Từ số DN khỏe mạnh này trở lên dùng MiniBatchKMeans thay cho KMeans full-batch
+EWS_MINIBATCH_MIN_SAMPLES = int(os.getenv("EWS_MINIBATCH_MIN_SAMPLES", "10000"))
+
+
+class CompiledThresholds(NamedTuple):
+    """Ngưỡng an toàn của 14 chỉ số dạng mảng liên tục (theo thứ tự FEATURE_COLS), dựng lúc train"""
+    direction_sign: np.ndarray  # +1 = càng cao càng tốt, -1 = càng thấp càng tốt
+    safe: np.ndarray
+    watch: np.ndarray
+    warning: np.ndarray
+    importance: np.ndarray  # Feature importances từ RandomForest
+    healthy_sorted: Optional[np.ndarray]  # Từng cột 14 chỉ số của DN khỏe mạnh đã sắp xếp (tính percentile)
 
 
 class EarlyWarningSystem:
@@ -35,9 +65,15 @@ class EarlyWarningSystem:
         self.kmeans = None
         self.scaler = StandardScaler()
         self.thresholds = {}  # Ngưỡng an toàn cho 14 chỉ số
+        self.compiled_thresholds = None  # self.thresholds + feature importances dạng mảng
         self.feature_importances = {}
         self.training_data = None
-        self.cluster_info = {}
+        self.cluster_info = {}  # size, center, avg_values, avg_pd, median_indicators của từng cluster
+        self.cluster_labels = None  # Cluster của từng DN khỏe mạnh trong tập train
+        self.healthy_health_scores = None  # Health Score đã sắp xếp của DN khỏe mạnh (tính percentile)
+        self.model_params = dict(EARLY_WARNING_PARAMS)
+        # Phiên bản mô hình (đổi mỗi lần train → vô hiệu cache Health Score)
+        self.model_version = None
 
         # Tên đầy đủ của 14 chỉ số
         self.indicator_names = {
@@ -57,52 +93,41 @@ class EarlyWarningSystem:
             'X_14': 'Hiệu suất sử dụng tài sản'
         }
 
-    def train_models(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def build_stacking_model(self, params: Optional[Dict[str, Any]] = None) -> StackingClassifier:
         """
-        Train Stacking model và K-Means clustering
+        Tạo Stacking Classifier (RF + XGB + GB, meta=LogisticRegression) chưa fit
 
         Args:
-            df: DataFrame chứa 14 chỉ số (X_1 → X_14) + cột 'label' (0=không vỡ nợ, 1=vỡ nợ)
+            params: Siêu tham số base models (None = mặc định + cấu hình đã promote trong registry)
 
         Returns:
-            Dict chứa thông tin về training:
-            - num_samples: Số lượng mẫu
-            - feature_importances: Feature importances từ RandomForest
-            - cluster_distribution: Phân bố các cluster
+            StackingClassifier
         """
-        print("🔄 Bắt đầu train Early Warning System...")
-
-        # Lưu training data
-        self.training_data = df.copy()
-
-        # Tách features và labels
-        feature_cols = [f'X_{i}' for i in range(1, 15)]
-        X = df[feature_cols].values
-        y = df['label'].values
-
-        # 1. TRAIN STACKING MODEL (RF + XGB + GB, meta=LogisticRegression)
-        print("📊 Training Stacking Classifier...")
+        if params is None:
+            params = get_promoted_params('early_warning')
+        self.model_params = {**EARLY_WARNING_PARAMS, **params}
+        p = self.model_params
 
         # Base models
         rf_model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
+            n_estimators=p['rf_n_estimators'],
+            max_depth=p['rf_max_depth'],
             random_state=42,
             n_jobs=-1
         )
 
         xgb_model = xgb.XGBClassifier(
-            n_estimators=100,
-            max_depth=6,
-            learning_rate=0.1,
+            n_estimators=p['xgb_n_estimators'],
+            max_depth=p['xgb_max_depth'],
+            learning_rate=p['xgb_learning_rate'],
             random_state=42,
             n_jobs=-1
         )
 
         gb_model = GradientBoostingClassifier(
-            n_estimators=100,
-            max_depth=6,
-            learning_rate=0.1,
+            n_estimators=p['gb_n_estimators'],
+            max_depth=p['gb_max_depth'],
+            learning_rate=p['gb_learning_rate'],
             random_state=42
         )
 
@@ -110,7 +135,7 @@ class EarlyWarningSystem:
         meta_model = LogisticRegression(max_iter=1000)
 
         # Stacking
-        self.stacking_model = StackingClassifier(
+        return StackingClassifier(
             estimators=[
                 ('rf', rf_model),
                 ('xgb', xgb_model),
@@ -120,6 +145,35 @@ class EarlyWarningSystem:
             cv=5
         )
 
+    def train_models(self, df: pd.DataFrame, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Train Stacking model và K-Means clustering
+
+        Args:
+            df: DataFrame chứa 14 chỉ số (X_1 → X_14) + cột 'label' (0=không vỡ nợ, 1=vỡ nợ)
+            params: Siêu tham số Stacking (None = mặc định + cấu hình đã promote trong registry)
+
+        Returns:
+            Dict chứa thông tin về training:
+            - num_samples: Số lượng mẫu
+            - feature_importances: Feature importances từ RandomForest
+            - cluster_distribution: Phân bố các cluster
+        """
+        print("🔄 Bắt đầu train Early Warning System...")
+
+        # Lưu training data
+        self.training_data = df.copy()
+
+        # Tách features và labels
+        feature_cols = FEATURE_COLS
+        X = df[feature_cols].values
+        y = df['label'].values
+
+        # 1. TRAIN STACKING MODEL (RF + XGB + GB, meta=LogisticRegression)
+        print("📊 Training Stacking Classifier...")
+
+        self.stacking_model = self.build_stacking_model(params)
+
         self.stacking_model.fit(X, y)
         print("✅ Stacking model trained!")
 
@@ -136,30 +190,42 @@ class EarlyWarningSystem:
         for feature, importance in sorted(self.feature_importances.items(), key=lambda x: x[1], reverse=True):
             print(f"   {feature}: {importance:.4f}")
 
-        # 2. TRAIN K-MEANS CLUSTERING (4 clusters)
-        print("🔍 Training K-Means (4 clusters)...")
-
+        # 2. TRAIN K-MEANS CLUSTERING (4 clusters) TRÊN DỮ LIỆU ĐÃ CHUẨN HÓA
         # Chỉ cluster nhóm không vỡ nợ (label=0)
         X_healthy = df[df['label'] == 0][feature_cols].values
+        X_healthy_scaled = self.scaler.fit_transform(X_healthy)
 
-        self.kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
-        self.kmeans.fit(X_healthy)
-
-        cluster_labels = self.kmeans.predict(X_healthy)
-
-        # Tính thông tin cluster
-        for cluster_id in range(4):
-            cluster_mask = cluster_labels == cluster_id
+        if len(X_healthy) >= EWS_MINIBATCH_MIN_SAMPLES:
+            print(f"🔍 Training MiniBatchKMeans ({EWS_N_CLUSTERS} clusters)...")
+            self.kmeans = MiniBatchKMeans(n_clusters=EWS_N_CLUSTERS, random_state=42, n_init=3, batch_size=1024)
+        else:
+            print(f"🔍 Training K-Means ({EWS_N_CLUSTERS} clusters)...")
+            self.kmeans = KMeans(n_clusters=EWS_N_CLUSTERS, random_state=42, n_init=10)
+        self.kmeans.fit(X_healthy_scaled)
+        self.cluster_labels = self.kmeans.labels_.copy()
+
+        # Tính thông tin cluster một lần (request chỉ cần tra cứu)
+        healthy_pds = self.stacking_model.predict_proba(X_healthy)[:, 1] * 100
+        centers = self.scaler.inverse_transform(self.kmeans.cluster_centers_)
+        self.cluster_info = {}
+        for cluster_id in range(EWS_N_CLUSTERS):
+            cluster_mask = self.cluster_labels == cluster_id
             cluster_data = X_healthy[cluster_mask]
+            has_data = len(cluster_data) > 0
 
             self.cluster_info[cluster_id] = {
                 'size': int(np.sum(cluster_mask)),
-                'center': self.kmeans.cluster_centers_[cluster_id].tolist(),
-                'avg_values': np.mean(cluster_data, axis=0).tolist()
+                'center': centers[cluster_id].tolist(),
+                'avg_values': np.mean(cluster_data, axis=0).tolist() if has_data else centers[cluster_id].tolist(),
+                'avg_pd': float(np.mean(healthy_pds[cluster_mask])) if has_data else 0.0,
+                'median_indicators': {
+                    col: float(np.median(cluster_data[:, j])) if has_data else 0.0
+                    for j, col in enumerate(feature_cols)
+                }
             }
 
         print("✅ K-Means trained!")
-        print(f"   Cluster sizes: {[self.cluster_info[i]['size'] for i in range(4)]}")
+        print(f"   Cluster sizes: {[self.cluster_info[i]['size'] for i in range(EWS_N_CLUSTERS)]}")
 
         # 3. TÍNH NGƯỠNG AN TOÀN (percentile P40, P50, P60 của nhóm label=0)
         print("📏 Calculating safety thresholds...")
@@ -190,6 +256,7 @@ class EarlyWarningSystem:
                     'direction': 'higher_is_better'
                 }
 
+        self.compiled_thresholds = self._compile_thresholds(X_healthy)
         print("✅ Thresholds calculated!")
 
         # 4. Trả về thông tin training
@@ -198,21 +265,48 @@ class EarlyWarningSystem:
             'num_healthy': int(np.sum(df['label'] == 0)),
             'num_default': int(np.sum(df['label'] == 1)),
             'feature_importances': self.feature_importances,
+            'model_params': self.model_params,
             'cluster_distribution': {
                 f'cluster_{i}': self.cluster_info[i]['size']
-                for i in range(4)
+                for i in range(EWS_N_CLUSTERS)
             }
         }
 
+        # 5. HEALTH SCORE CỦA DN KHỎE MẠNH (đã sắp xếp, dùng tính percentile khi xác định vị trí)
+        self.healthy_health_scores = np.sort(self.calculate_health_scores_batch(FeatureVector(X_healthy)))
+
+        self.model_version = bump_model_version('early_warning')
+
         print("✅ Early Warning System trained successfully!")
         return result
 
-    def calculate_health_score(self, indicators: Dict[str, float]) -> float:
+    def _compile_thresholds(self, X_healthy: Optional[np.ndarray]) -> CompiledThresholds:
+        """
+        Dựng ngưỡng an toàn + feature importances thành mảng để chấm điểm/phát hiện điểm yếu vector hóa
+
+        Args:
+            X_healthy: Ma trận 14 chỉ số của DN khỏe mạnh (None = không tính được percentile)
+
+        Returns:
+            CompiledThresholds
+        """
+        thresholds = [self.thresholds[col] for col in FEATURE_COLS]
+        return CompiledThresholds(
+            direction_sign=np.array([1.0 if t['direction'] == 'higher_is_better' else -1.0 for t in thresholds]),
+            safe=np.array([t['safe_zone'] for t in thresholds]),
+            watch=np.array([t['watch_zone'] for t in thresholds]),
+            warning=np.array([t['warning_zone'] for t in thresholds]),
+            importance=np.array([self.feature_importances.get(col, 0.0) for col in FEATURE_COLS]),
+            healthy_sorted=np.sort(X_healthy, axis=0) if X_healthy is not None and len(X_healthy) else None
+        )
+
+    @memoize_score('early_warning')
+    def calculate_health_score(self, indicators: Union[FeatureVector, Dict[str, float]]) -> float:
         """
         Tính Health Score (0-100) dựa trên 60% PD + 40% Statistical
 
         Args:
-            indicators: Dict chứa 14 chỉ số (X_1 → X_14)
+            indicators: FeatureVector (hoặc dict) chứa 14 chỉ số (X_1 → X_14)
 
         Returns:
             Health Score (0-100)
@@ -222,70 +316,53 @@ class EarlyWarningSystem:
             2. Tính PD Score từ stacking_model
             3. Health Score = 60% * (100 - PD) + 40% * Statistical Score
         """
-        if not self.feature_importances:
+        return float(self.calculate_health_scores_batch(indicators)[0])
+
+    def calculate_health_scores_batch(self, features: Union[FeatureVector, Dict[str, float]]) -> np.ndarray:
+        """
+        Tính Health Score (0-100) cho nhiều DN cùng lúc (vector hóa, 1 lần gọi stacking model)
+
+        Args:
+            features: FeatureVector shape (n, 14) (hoặc dict 1 DN)
+
+        Returns:
+            Mảng Health Score shape (n,), làm tròn 2 chữ số
+        """
+        if not self.feature_importances or self.compiled_thresholds is None:
             raise ValueError("Model chưa được train. Vui lòng gọi train_models() trước.")
 
         if self.stacking_model is None:
             raise ValueError("Stacking model chưa được train. Vui lòng gọi train_models() trước.")
 
-        # 1. TÍNH STATISTICAL SCORE (40%)
-        total_score = 0.0
-        total_weight = 0.0
-
-        for indicator, value in indicators.items():
-            if indicator not in self.thresholds:
-                continue
-
-            threshold_info = self.thresholds[indicator]
-            importance = self.feature_importances.get(indicator, 0.0)
-
-            # Normalize về [0, 1]
-            if threshold_info['direction'] == 'higher_is_better':
-                # Càng cao càng tốt
-                safe = threshold_info['safe_zone']
-                warning = threshold_info['warning_zone']
-
-                if value >= safe:
-                    normalized = 1.0
-                elif value <= warning:
-                    normalized = 0.0
-                else:
-                    normalized = (value - warning) / (safe - warning) if safe != warning else 0.5
-            else:
-                # Càng thấp càng tốt
-                safe = threshold_info['safe_zone']
-                warning = threshold_info['warning_zone']
-
-                if value <= safe:
-                    normalized = 1.0
-                elif value >= warning:
-                    normalized = 0.0
-                else:
-                    normalized = (warning - value) / (warning - safe) if warning != safe else 0.5
+        X = FeatureVector.coerce(features).values
+        compiled = self.compiled_thresholds
+        sign, safe, warning, importance = (
+            compiled.direction_sign, compiled.safe, compiled.warning, compiled.importance
+        )
 
-            # Weighted sum
-            total_score += normalized * importance
-            total_weight += importance
+        # 1. TÍNH STATISTICAL SCORE (40%)
+        # Normalize về [0, 1]: đạt ngưỡng an toàn → 1, chạm ngưỡng cảnh báo → 0, ở giữa → tuyến tính
+        with np.errstate(divide='ignore', invalid='ignore'):
+            between = np.where(safe != warning, (X - warning) / (safe - warning), 0.5)
+        normalized = np.select(
+            [sign * (X - safe) >= 0, sign * (X - warning) <= 0], [1.0, 0.0], default=between
+        )
 
         # Statistical score (0-100)
-        statistical_score = (total_score / total_weight * 100) if total_weight > 0 else 50.0
-        statistical_score = max(0.0, min(100.0, statistical_score))
-
-        # 2. TÍNH PD SCORE (60%)
-        feature_cols = [f'X_{i}' for i in range(1, 15)]
-        X_input = [[indicators[col] for col in feature_cols]]
-        pd_value = self.stacking_model.predict_proba(X_input)[0, 1] * 100  # PD in %
-
-        # PD Score: 100 - PD (PD càng thấp → score càng cao)
-        pd_score = max(0.0, min(100.0, 100 - pd_value))
+        total_weight = importance.sum()
+        if total_weight > 0:
+            statistical_score = np.clip(normalized @ importance / total_weight * 100, 0.0, 100.0)
+        else:
+            statistical_score = np.full(len(X), 50.0)
 
-        # 3. KẾT HỢP: 60% PD + 40% Statistical
-        health_score = 0.6 * pd_score + 0.4 * statistical_score
+        # 2. TÍNH PD SCORE (60%): 100 - PD (PD càng thấp → score càng cao)
+        pd_value = self.stacking_model.predict_proba(X)[:, 1] * 100  # PD in %
+        pd_score = np.clip(100 - pd_value, 0.0, 100.0)
 
-        # Giới hạn trong [0, 100]
-        health_score = max(0.0, min(100.0, health_score))
+        # 3. KẾT HỢP: 60% PD + 40% Statistical, giới hạn trong [0, 100]
+        health_score = np.clip(0.6 * pd_score + 0.4 * statistical_score, 0.0, 100.0)
 
-        return round(health_score, 2)
+        return np.round(health_score, 2)
 
     def classify_risk_level(self, health_score: float) -> Dict[str, str]:
         """
@@ -326,67 +403,62 @@ class EarlyWarningSystem:
                 'risk_level_text': 'Nguy hiểm'
             }
 
-    def detect_weaknesses(self, indicators: Dict[str, float]) -> List[Dict[str, Any]]:
+    def detect_weaknesses(self, indicators: Union[FeatureVector, Dict[str, float]]) -> List[Dict[str, Any]]:
         """
         Phát hiện điểm yếu (top 3 chỉ số xa ngưỡng an toàn nhất)
 
         Args:
-            indicators: Dict chứa 14 chỉ số
+            indicators: FeatureVector (hoặc dict) chứa 14 chỉ số
 
         Returns:
             List top 3 chỉ số yếu nhất
         """
-        weaknesses = []
-
-        for indicator, value in indicators.items():
-            if indicator not in self.thresholds:
-                continue
-
-            threshold_info = self.thresholds[indicator]
-            safe_threshold = threshold_info['safe_zone']
-            direction = threshold_info['direction']
-
-            # Tính gap (khoảng cách so với ngưỡng an toàn)
-            if direction == 'higher_is_better':
-                gap = value - safe_threshold
-                severity = 'critical' if gap < -safe_threshold * 0.3 else 'moderate' if gap < 0 else 'low'
-            else:
-                gap = safe_threshold - value
-                severity = 'critical' if gap < -safe_threshold * 0.3 else 'moderate' if gap < 0 else 'low'
-
-            # Tính percentile
-            if self.training_data is not None:
-                healthy_data = self.training_data[self.training_data['label'] == 0]
-                if indicator in healthy_data.columns:
-                    percentile = (healthy_data[indicator] < value).sum() / len(healthy_data) * 100
-                else:
-                    percentile = 50.0
-            else:
-                percentile = 50.0
+        if self.compiled_thresholds is None:
+            return []
+
+        values = FeatureVector.coerce(indicators).values[0]
+        compiled = self.compiled_thresholds
+        safe = compiled.safe
+
+        # Gap (khoảng cách so với ngưỡng an toàn, âm = chưa đạt) và mức độ nghiêm trọng
+        gap = compiled.direction_sign * (values - safe)
+        severity = np.where(gap < -safe * 0.3, 'critical', np.where(gap < 0, 'moderate', 'low'))
+
+        # Percentile trong nhóm DN khỏe mạnh (số DN có giá trị nhỏ hơn)
+        if compiled.healthy_sorted is not None:
+            healthy = compiled.healthy_sorted
+            below = [np.searchsorted(healthy[:, j], values[j], side='left') for j in range(len(FEATURE_COLS))]
+            percentile = np.array(below) / len(healthy) * 100
+        else:
+            percentile = np.full(len(FEATURE_COLS), 50.0)
 
+        # Top 3 theo gap (âm nhất = yếu nhất)
+        gap = np.round(gap, 4)
+        weaknesses = []
+        for j in np.argsort(gap, kind='stable')[:3]:
+            indicator = FEATURE_COLS[j]
             weaknesses.append({
                 'indicator': indicator,
                 'name': self.indicator_names.get(indicator, indicator),
-                'current_value': round(value, 4),
-                'safe_threshold': round(safe_threshold, 4),
-                'gap': round(gap, 4),
-                'percentile': round(percentile, 1),
-                'severity': severity,
-                'direction': direction
+                'current_value': round(float(values[j]), 4),
+                'safe_threshold': round(float(safe[j]), 4),
+                'gap': float(gap[j]),
+                'percentile': round(float(percentile[j]), 1),
+                'severity': str(severity[j]),
+                'direction': self.thresholds[indicator]['direction']
             })
 
-        # Sắp xếp theo gap (âm nhất = yếu nhất)
-        weaknesses.sort(key=lambda x: x['gap'])
+        return weaknesses
 
-        # Trả về top 3
-        return weaknesses[:3]
-
-    def get_cluster_position(self, indicators: Dict[str, float]) -> Dict[str, Any]:
+    def get_cluster_position(self, indicators: Union[FeatureVector, Dict[str, float]]) -> Dict[str, Any]:
         """
         Xác định vị trí DN trong cluster
 
+        Mọi thông tin cluster (PD trung bình, median chỉ số) và Health Score của nhóm khỏe mạnh
+        đã được tính lúc train; mỗi request chỉ tính khoảng cách tới 4 centroid.
+
         Args:
-            indicators: Dict chứa 14 chỉ số
+            indicators: FeatureVector (hoặc dict) chứa 14 chỉ số
 
         Returns:
             Dict chứa cluster_id, cluster_name, position_percentile, cluster_avg_pd
@@ -394,32 +466,18 @@ class EarlyWarningSystem:
         if self.kmeans is None:
             raise ValueError("K-Means chưa được train. Vui lòng gọi train_models() trước.")
 
-        # Chuẩn bị input
-        feature_cols = [f'X_{i}' for i in range(1, 15)]
-        X_input = np.array([[indicators[col] for col in feature_cols]])
-
-        # Predict cluster
-        cluster_id = int(self.kmeans.predict(X_input)[0])
+        features = FeatureVector.coerce(indicators)
 
-        # Tính percentile trong toàn dataset
-        if self.training_data is not None:
-            healthy_data = self.training_data[self.training_data['label'] == 0]
+        # Cluster gần nhất (khoảng cách tới 4 centroid trong không gian đã chuẩn hóa)
+        x_scaled = self.scaler.transform(features.values)[0]
+        distances = np.sum((self.kmeans.cluster_centers_ - x_scaled) ** 2, axis=1)
+        cluster_id = int(np.argmin(distances))
 
-            # Tính khoảng cách đến center của cluster
-            center = self.kmeans.cluster_centers_[cluster_id]
-            distances = np.linalg.norm(healthy_data[feature_cols].values - center, axis=1)
-            current_distance = np.linalg.norm(X_input[0] - center)
-
-            # Percentile: vị trí của DN trong toàn bộ healthy dataset
-            # Tính dựa trên health score
-            health_scores = []
-            for _, row in healthy_data.iterrows():
-                row_indicators = {col: row[col] for col in feature_cols}
-                hs = self.calculate_health_score(row_indicators)
-                health_scores.append(hs)
-
-            current_health_score = self.calculate_health_score(indicators)
-            position_percentile = (np.array(health_scores) < current_health_score).sum() / len(health_scores) * 100
+        # Percentile: vị trí của DN trong toàn bộ healthy dataset (dựa trên health score)
+        if self.healthy_health_scores is not None and len(self.healthy_health_scores) > 0:
+            current_health_score = self.calculate_health_score(features)
+            position = np.searchsorted(self.healthy_health_scores, current_health_score, side='left')
+            position_percentile = position / len(self.healthy_health_scores) * 100
         else:
             position_percentile = 50.0
 
@@ -433,45 +491,21 @@ class EarlyWarningSystem:
         else:
             cluster_name = "🔴 Nhóm D - Rất yếu"
 
-        # Tính cluster avg PD (nếu có stacking model)
-        cluster_avg_pd = 0.0
-        if self.stacking_model is not None and self.training_data is not None:
-            # Lấy tất cả DN trong cluster này
-            cluster_mask = self.kmeans.predict(healthy_data[feature_cols].values) == cluster_id
-            cluster_data = healthy_data[cluster_mask]
-
-            if len(cluster_data) > 0:
-                # Dự báo PD cho cluster
-                X_cluster = cluster_data[feature_cols].values
-                cluster_pds = self.stacking_model.predict_proba(X_cluster)[:, 1] * 100
-                cluster_avg_pd = float(np.mean(cluster_pds))
-
-        # Tính median indicators của cluster
-        if self.training_data is not None:
-            healthy_data = self.training_data[self.training_data['label'] == 0]
-            cluster_mask = self.kmeans.predict(healthy_data[feature_cols].values) == cluster_id
-            cluster_data = healthy_data[cluster_mask]
-
-            cluster_median_indicators = {}
-            for col in feature_cols:
-                if col in cluster_data.columns:
-                    cluster_median_indicators[col] = float(cluster_data[col].median())
-                else:
-                    cluster_median_indicators[col] = 0.0
-        else:
-            cluster_median_indicators = {col: 0.0 for col in feature_cols}
+        info = self.cluster_info.get(cluster_id, {})
 
         return {
             'cluster_id': cluster_id,
             'cluster_name': cluster_name,
-            'position_percentile': round(position_percentile, 1),
-            'cluster_avg_pd': round(cluster_avg_pd, 2),
-            'cluster_median_indicators': cluster_median_indicators
+            'position_percentile': round(float(position_percentile), 1),
+            'cluster_avg_pd': round(info.get('avg_pd', 0.0), 2),
+            'cluster_median_indicators': dict(
+                info.get('median_indicators', {col: 0.0 for col in FEATURE_COLS})
+            )
         }
 
     def project_future_pd(
         self,
-        indicators: Dict[str, float],
+        indicators: Union[FeatureVector, Dict[str, float]],
         months: int,
         scenario: str,
         excel_processor,
@@ -481,7 +515,7 @@ class EarlyWarningSystem:
         Dự báo PD trong tương lai theo kịch bản vĩ mô
 
         Args:
-            indicators: Dict 14 chỉ số hiện tại
+            indicators: FeatureVector (hoặc dict) 14 chỉ số hiện tại
             months: Số tháng dự báo (3/6/12)
             scenario: Kịch bản ("recession_mild", "recession_moderate", "crisis")
             excel_processor: Instance của ExcelProcessor
@@ -537,6 +571,9 @@ class EarlyWarningSystem:
         time_multiplier = months / 12  # 3 tháng = 0.25, 6 tháng = 0.5, 12 tháng = 1.0
 
         # Tính 14 chỉ số sau shock
+        if isinstance(indicators, FeatureVector):
+            indicators = indicators.to_dict()
+
         indicators_after = excel_processor.simulate_scenario_full_propagation(
             original_indicators=indicators,
             revenue_change_pct=micro_shocks['revenue_change_pct'] * time_multiplier,
@@ -546,8 +583,7 @@ class EarlyWarningSystem:
         )
 
         # Dự báo PD
-        feature_cols = [f'X_{i}' for i in range(1, 15)]
-        X_future = np.array([[indicators_after[col] for col in feature_cols]])
+        X_future = FeatureVector.from_dict(indicators_after).values
 
         pd_future = self.stacking_model.predict_proba(X_future)[0, 1] * 100
 
@@ -4,58 +4,270 @@ File XLSX phải có 3 sheets: CDKT (Cân đối kế toán), BCTN (Báo cáo th
 """
 
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple, Union
+from bisect import bisect_right
+import io
+import os
 import numpy as np
 import re
 
+from process_pool import new_process_pool
+
+try:
+    from python_calamine import CalamineWorkbook
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+# Engine đọc XLSX: auto (calamine nếu có, ngược lại openpyxl read-only), calamine, openpyxl, pandas
+EXCEL_READER_ENGINE = os.getenv("EXCEL_READER_ENGINE", "auto")
+
+# 3 sheets bắt buộc của file báo cáo tài chính
+REQUIRED_SHEETS = ('CDKT', 'BCTN', 'LCTT')
+
+# Số thứ tự ở đầu tên chỉ tiêu (VD: "1. Tiền" -> "Tiền")
+LEADING_NUMBER_PATTERN = re.compile(r'^\d+\.\s*')
+
+
+def normalize_label(text: Any) -> str:
+    """Chuẩn hóa tên chỉ tiêu: bỏ khoảng trắng, chữ thường, bỏ số thứ tự ở đầu"""
+    return LEADING_NUMBER_PATTERN.sub('', str(text).strip().lower())
+
+
+class SheetLabelIndex:
+    """
+    Chỉ mục tên chỉ tiêu đã chuẩn hóa của một sheet (dựng MỘT LẦN cho mỗi sheet)
+
+    Tra cứu: dict (tên tìm kiếm → dòng) cho các lần tìm lặp lại; lần đầu tìm bằng
+    str.find trên chuỗi ghép các nhãn (giữ đúng ngữ nghĩa "dòng ĐẦU TIÊN chứa chuỗi").
+    """
+
+    __slots__ = ('labels', 'rows', '_text', '_offsets')
+
+    def __init__(self, df: pd.DataFrame):
+        first_column = df.iloc[:, 0].tolist() if len(df.columns) else []
+        self.labels: List[str] = [normalize_label(label) for label in first_column]
+        self.rows: Dict[str, Optional[int]] = {}
+
+        # Ghép các nhãn bằng '\n' và lưu vị trí bắt đầu của từng nhãn
+        self._offsets = []
+        position = 0
+        for label in self.labels:
+            self._offsets.append(position)
+            position += len(label) + 1
+        self._text = '\n'.join(self.labels)
+
+    def find(self, search_name: str) -> Optional[int]:
+        """
+        Vị trí dòng đầu tiên có tên chỉ tiêu chứa search_name (None nếu không có)
+
+        Args:
+            search_name: Tên chỉ tiêu đã chuẩn hóa
+        """
+        if search_name in self.rows:
+            return self.rows[search_name]
+
+        position = self._text.find(search_name)
+        row = bisect_right(self._offsets, position) - 1 if position >= 0 else None
+        # Ghi cùng một giá trị cho cùng một key → an toàn khi nhiều thread dùng chung
+        self.rows[search_name] = row
+        return row
+
+
+class StatementSheet(NamedTuple):
+    """Một sheet báo cáo tài chính kèm chỉ mục tên chỉ tiêu (bất biến)"""
+    df: pd.DataFrame
+    labels: SheetLabelIndex
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'StatementSheet':
+        """Dựng sheet và chỉ mục tên chỉ tiêu từ DataFrame"""
+        return cls(df, SheetLabelIndex(df))
+
+
+class FinancialStatements(NamedTuple):
+    """Bộ 3 báo cáo tài chính của một file XLSX (bất biến, dùng chung an toàn giữa các thread)"""
+    cdkt: StatementSheet  # Cân đối kế toán
+    bctn: StatementSheet  # Báo cáo thu nhập
+    lctt: StatementSheet  # Lưu chuyển tiền tệ
+
+
+def _check_required_sheets(available_sheets: List[str]):
+    """Báo lỗi nếu thiếu sheet CDKT/BCTN/LCTT"""
+    missing_sheets = [sheet for sheet in REQUIRED_SHEETS if sheet not in available_sheets]
+    if missing_sheets:
+        raise ValueError(f"Thiếu các sheet: {', '.join(missing_sheets)}. File phải có 3 sheets: CDKT, BCTN, LCTT")
+
+
+def _row_length(row) -> int:
+    """Số ô của dòng sau khi bỏ các ô trống ở cuối (None hoặc '' của calamine)"""
+    length = len(row)
+    while length and (row[length - 1] is None or row[length - 1] == ''):
+        length -= 1
+    return length
+
+
+def _rows_to_frame(rows) -> pd.DataFrame:
+    """
+    Dựng DataFrame gọn từ các dòng của sheet: dòng đầu là tiêu đề, chỉ giữ cột tên chỉ tiêu
+    (cột đầu) và 2 cột giá trị cuối (đầu kỳ, cuối kỳ) - đúng các cột get_value_from_sheet dùng
+    """
+    # Bỏ dòng trống
+    rows = [(row, length) for row in rows for length in (_row_length(row),) if length]
+    if not rows:
+        return pd.DataFrame()
+
+    n_cols = max(length for _, length in rows)
+    keep = sorted({0, max(n_cols - 2, 0), n_cols - 1})
+
+    def cell(row, length, j):
+        value = row[j] if j < length else None
+        return None if value == '' else value
+
+    header_row, header_length = rows[0]
+    columns = []
+    for j in keep:
+        name = cell(header_row, header_length, j)
+        name = str(name) if name is not None else f"Unnamed: {j}"
+        columns.append(name if name not in columns else f"{name}.{j}")
+
+    data = [[cell(row, length, j) for j in keep] for row, length in rows[1:]]
+    df = pd.DataFrame(data, columns=columns)
+    # Ô trống của cột tên chỉ tiêu → NaN (giống pandas.read_excel)
+    df.iloc[:, 0] = df.iloc[:, 0].where(df.iloc[:, 0].notna(), np.nan)
+    return df
+
+
+def _is_xlsx(file_path: Union[str, io.BytesIO]) -> bool:
+    """File là XLSX (zip) hay không (XLS cũ không đọc được bằng openpyxl)"""
+    if isinstance(file_path, (str, os.PathLike)):
+        with open(file_path, 'rb') as f:
+            return f.read(4) == b'PK\x03\x04'
+
+    position = file_path.tell()
+    signature = file_path.read(4)
+    file_path.seek(position)
+    return signature == b'PK\x03\x04'
+
+
+def _read_sheets_calamine(file_path: Union[str, io.BytesIO]) -> Dict[str, pd.DataFrame]:
+    """Đọc 3 sheets bằng calamine (Rust) - nhanh nhất, hỗ trợ cả XLSX và XLS"""
+    workbook = CalamineWorkbook.from_object(file_path)
+    _check_required_sheets(workbook.sheet_names)
+    return {
+        name: _rows_to_frame(workbook.get_sheet_by_name(name).to_python(skip_empty_area=False))
+        for name in REQUIRED_SHEETS
+    }
+
+
+def _read_sheets_openpyxl(file_path: Union[str, io.BytesIO]) -> Dict[str, pd.DataFrame]:
+    """Đọc 3 sheets bằng openpyxl read_only + data_only (không dựng style/công thức của từng ô)"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        _check_required_sheets(workbook.sheetnames)
+        return {
+            name: _rows_to_frame(workbook[name].iter_rows(values_only=True))
+            for name in REQUIRED_SHEETS
+        }
+    finally:
+        workbook.close()
+
+
+def _read_sheets_pandas(file_path: Union[str, io.BytesIO]) -> Dict[str, pd.DataFrame]:
+    """Đọc đầy đủ 3 sheets bằng pandas (engine mặc định)"""
+    with pd.ExcelFile(file_path) as excel_file:
+        _check_required_sheets(excel_file.sheet_names)
+        return {name: excel_file.parse(name) for name in REQUIRED_SHEETS}
+
+
+def read_statement_sheets(file_path: Union[str, io.BytesIO], engine: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Đọc 3 sheets CDKT, BCTN, LCTT bằng engine nhanh nhất hiện có
+
+    Args:
+        file_path: Đường dẫn hoặc file-like object
+        engine: 'auto', 'calamine', 'openpyxl' hoặc 'pandas' (mặc định EXCEL_READER_ENGINE)
+
+    Returns:
+        Dict {tên sheet: DataFrame}
+    """
+    engine = engine or EXCEL_READER_ENGINE
+    if engine == 'auto':
+        engine = 'calamine' if CALAMINE_AVAILABLE else 'openpyxl'
+
+    if engine == 'calamine':
+        if not CALAMINE_AVAILABLE:
+            raise ValueError("Chưa cài python-calamine. Cài bằng: pip install python-calamine")
+        return _read_sheets_calamine(file_path)
+    if engine == 'openpyxl' and _is_xlsx(file_path):
+        return _read_sheets_openpyxl(file_path)
+    if engine not in ('openpyxl', 'pandas'):
+        raise ValueError(f"Engine đọc XLSX không hợp lệ: {engine}")
+    return _read_sheets_pandas(file_path)
+
+
+# Tên đầy đủ của 14 chỉ số
+INDICATOR_NAMES = {
+    'X_1': 'Hệ số biên lợi nhuận gộp',
+    'X_2': 'Hệ số biên lợi nhuận trước thuế',
+    'X_3': 'Tỷ suất lợi nhuận trước thuế trên tổng tài sản (ROA)',
+    'X_4': 'Tỷ suất lợi nhuận trước thuế trên vốn chủ sở hữu (ROE)',
+    'X_5': 'Hệ số nợ trên tài sản',
+    'X_6': 'Hệ số nợ trên vốn chủ sở hữu',
+    'X_7': 'Khả năng thanh toán hiện hành',
+    'X_8': 'Khả năng thanh toán nhanh',
+    'X_9': 'Hệ số khả năng trả lãi',
+    'X_10': 'Hệ số khả năng trả nợ gốc',
+    'X_11': 'Hệ số khả năng tạo tiền trên vốn chủ sở hữu',
+    'X_12': 'Vòng quay hàng tồn kho',
+    'X_13': 'Kỳ thu tiền bình quân',
+    'X_14': 'Hiệu suất sử dụng tài sản'
+}
+
 
 class ExcelProcessor:
-    """Class xử lý file XLSX và tính toán 14 chỉ số tài chính"""
+    """
+    Class xử lý file XLSX và tính toán 14 chỉ số tài chính
 
-    def __init__(self):
-        self.cdkt_df = None  # Cân đối kế toán
-        self.bctn_df = None  # Báo cáo thu nhập
-        self.lctt_df = None  # Lưu chuyển tiền tệ
-        self.financial_indicators = {}
+    Không lưu trạng thái giữa các lần gọi: read_excel() trả về FinancialStatements,
+    calculate_14_indicators() nhận FinancialStatements → một instance dùng chung được
+    cho nhiều request đồng thời (thread/process).
+    """
 
-    def read_excel(self, file_path: str) -> bool:
+    def read_excel(self, file_path: Union[str, io.BytesIO]) -> FinancialStatements:
         """
         Đọc file XLSX với 3 sheets
 
         Args:
-            file_path: Đường dẫn file XLSX
+            file_path: Đường dẫn file XLSX (hoặc file-like object, VD: BytesIO)
 
         Returns:
-            True nếu đọc thành công, False nếu thất bại
+            FinancialStatements chứa 3 sheets CDKT, BCTN, LCTT (đã dựng chỉ mục tên chỉ tiêu)
         """
         try:
-            # Đọc 3 sheets với context manager để đảm bảo file được đóng
-            with pd.ExcelFile(file_path) as excel_file:
-                # Kiểm tra các sheet cần thiết
-                required_sheets = ['CDKT', 'BCTN', 'LCTT']
-                available_sheets = excel_file.sheet_names
-
-                missing_sheets = [sheet for sheet in required_sheets if sheet not in available_sheets]
-                if missing_sheets:
-                    raise ValueError(f"Thiếu các sheet: {', '.join(missing_sheets)}. File phải có 3 sheets: CDKT, BCTN, LCTT")
-
-                # Đọc dữ liệu từng sheet
-                self.cdkt_df = excel_file.parse('CDKT')
-                self.bctn_df = excel_file.parse('BCTN')
-                self.lctt_df = excel_file.parse('LCTT')
-
-            return True
+            # Đọc 3 sheets (chỉ cột tên chỉ tiêu + 2 cột giá trị cuối nếu dùng calamine/openpyxl)
+            sheets = read_statement_sheets(file_path)
+
+            # Dựng chỉ mục tên chỉ tiêu một lần cho mỗi sheet
+            return FinancialStatements(
+                cdkt=StatementSheet.from_frame(sheets['CDKT']),
+                bctn=StatementSheet.from_frame(sheets['BCTN']),
+                lctt=StatementSheet.from_frame(sheets['LCTT'])
+            )
 
         except Exception as e:
             raise ValueError(f"Lỗi khi đọc file XLSX: {str(e)}")
 
-    def get_value_from_sheet(self, df: pd.DataFrame, indicator_name: str, column_index: int = -1) -> float:
+    def get_value_from_sheet(self, sheet: Union[StatementSheet, pd.DataFrame], indicator_name: str,
+                             column_index: int = -1) -> float:
         """
         Lấy giá trị từ sheet dựa trên tên chỉ tiêu và cột
         Giả định: Cột đầu tiên là tên chỉ tiêu, cột CUỐI CÙNG là giá trị năm gần nhất (cuối kỳ)
 
         Args:
-            df: DataFrame chứa dữ liệu
+            sheet: StatementSheet (hoặc DataFrame - khi đó chỉ mục được dựng tạm)
             indicator_name: Tên chỉ tiêu cần tìm
             column_index: Chỉ số cột cần lấy (-1 = cuối cùng, -2 = trước cuối cùng)
 
@@ -63,34 +275,26 @@ class ExcelProcessor:
             Giá trị của chỉ tiêu
         """
         try:
-            # Tìm trong cột đầu tiên (chỉ tiêu)
-            col_name = df.columns[0]
+            if not isinstance(sheet, StatementSheet):
+                sheet = StatementSheet.from_frame(sheet)
+            df = sheet.df
+
             # Lấy cột theo chỉ số: -1 = cuối cùng (cuối kỳ), -2 = trước cuối cùng (đầu kỳ)
             if len(df.columns) > abs(column_index):
                 value_col = df.columns[column_index]
             else:
                 value_col = df.columns[-1]  # Fallback nếu không đủ cột
 
-            # Chuẩn hóa indicator_name để tìm kiếm tốt hơn
+            # Chuẩn hóa indicator_name giống tên chỉ tiêu trong sheet
             # Loại bỏ số thứ tự ở đầu (VD: "1. Tiền" -> "tiền")
-            search_name = indicator_name.lower().strip()
-            # Loại bỏ các ký tự số và dấu chấm ở đầu
-            search_name = re.sub(r'^\d+\.\s*', '', search_name)
-
-            # Tìm dòng có chứa indicator_name (case-insensitive, loại bỏ khoảng trắng)
-            # Áp dụng cùng chuẩn hóa cho từng dòng trong DataFrame
-            def normalize_text(text):
-                text = str(text).strip().lower()
-                # Loại bỏ số thứ tự ở đầu
-                text = re.sub(r'^\d+\.\s*', '', text)
-                return text
-
-            mask = df[col_name].apply(normalize_text).str.contains(
-                search_name, na=False, regex=False
-            )
+            search_name = normalize_label(indicator_name)
+
+            # Tìm dòng đầu tiên có chứa indicator_name qua chỉ mục của sheet
+            # (không chuẩn hóa lại toàn bộ cột chỉ tiêu ở mỗi lần tra cứu)
+            row = sheet.labels.find(search_name)
 
-            if mask.any():
-                value = df.loc[mask, value_col].iloc[0]
+            if row is not None:
+                value = df[value_col].iat[row]
                 # Xử lý giá trị
                 if pd.isna(value):
                     return 0.0
@@ -166,22 +370,25 @@ class ExcelProcessor:
             print(f"❌ Lỗi khi lấy giá trị {indicator_name}: {str(e)}")
             return 0.0
 
-    def get_average_from_two_periods(self, df: pd.DataFrame, indicator_name: str) -> float:
+    def get_average_from_two_periods(self, sheet: Union[StatementSheet, pd.DataFrame], indicator_name: str) -> float:
         """
         Lấy giá trị bình quân từ 2 kỳ: cuối kỳ (cột cuối) và đầu kỳ (cột trước cuối)
 
         Args:
-            df: DataFrame chứa dữ liệu
+            sheet: StatementSheet (hoặc DataFrame) chứa dữ liệu
             indicator_name: Tên chỉ tiêu cần tìm
 
         Returns:
             Giá trị bình quân của 2 kỳ
         """
+        if not isinstance(sheet, StatementSheet):
+            sheet = StatementSheet.from_frame(sheet)
+
         # Lấy giá trị cuối kỳ (cột cuối cùng)
-        cuoi_ky = self.get_value_from_sheet(df, indicator_name, column_index=-1)
+        cuoi_ky = self.get_value_from_sheet(sheet, indicator_name, column_index=-1)
 
         # Lấy giá trị đầu kỳ (cột trước cuối cùng)
-        dau_ky = self.get_value_from_sheet(df, indicator_name, column_index=-2)
+        dau_ky = self.get_value_from_sheet(sheet, indicator_name, column_index=-2)
 
         # Tính bình quân
         binh_quan = (cuoi_ky + dau_ky) / 2
@@ -190,70 +397,73 @@ class ExcelProcessor:
 
         return binh_quan
 
-    def calculate_14_indicators(self) -> Dict[str, float]:
+    def calculate_14_indicators(self, statements: FinancialStatements) -> Dict[str, float]:
         """
         Tính toán 14 chỉ số tài chính từ 3 sheets
 
+        Args:
+            statements: FinancialStatements trả về từ read_excel()
+
         Returns:
             Dict chứa 14 chỉ số X_1 đến X_14
         """
-        if self.cdkt_df is None or self.bctn_df is None or self.lctt_df is None:
+        if not isinstance(statements, FinancialStatements):
             raise ValueError("Chưa đọc dữ liệu từ file XLSX. Vui lòng gọi read_excel() trước.")
 
         # Lấy các chỉ tiêu từ BCTN (Báo cáo thu nhập)
-        doanh_thu_thuan = self.get_value_from_sheet(self.bctn_df, "doanh thu thuần")
+        doanh_thu_thuan = self.get_value_from_sheet(statements.bctn, "doanh thu thuần")
         if doanh_thu_thuan == 0:
-            doanh_thu_thuan = self.get_value_from_sheet(self.bctn_df, "doanh thu bán")
+            doanh_thu_thuan = self.get_value_from_sheet(statements.bctn, "doanh thu bán")
 
-        loi_nhuan_gop = self.get_value_from_sheet(self.bctn_df, "lợi nhuận gộp")
-        gia_von_hang_ban = self.get_value_from_sheet(self.bctn_df, "giá vốn")
+        loi_nhuan_gop = self.get_value_from_sheet(statements.bctn, "lợi nhuận gộp")
+        gia_von_hang_ban = self.get_value_from_sheet(statements.bctn, "giá vốn")
 
         # ✅ THAY ĐỔI: Lấy "Lợi nhuận trước thuế" từ LCTT thay vì BCTN
-        loi_nhuan_truoc_thue = self.get_value_from_sheet(self.lctt_df, "lợi nhuận trước thuế")
+        loi_nhuan_truoc_thue = self.get_value_from_sheet(statements.lctt, "lợi nhuận trước thuế")
 
         # Lấy các chỉ tiêu từ CDKT (Cân đối kế toán)
         # ✅ THAY ĐỔI: Lấy giá trị bình quân tự động từ 2 cột cuối (đầu kỳ và cuối kỳ)
-        tong_tai_san = self.get_value_from_sheet(self.cdkt_df, "tổng tài sản", column_index=-1)
-        binh_quan_tong_tai_san = self.get_average_from_two_periods(self.cdkt_df, "tổng tài sản")
+        tong_tai_san = self.get_value_from_sheet(statements.cdkt, "tổng tài sản", column_index=-1)
+        binh_quan_tong_tai_san = self.get_average_from_two_periods(statements.cdkt, "tổng tài sản")
 
-        von_chu_so_huu = self.get_value_from_sheet(self.cdkt_df, "vốn chủ sở hữu", column_index=-1)
-        binh_quan_von_chu_so_huu = self.get_average_from_two_periods(self.cdkt_df, "vốn chủ sở hữu")
+        von_chu_so_huu = self.get_value_from_sheet(statements.cdkt, "vốn chủ sở hữu", column_index=-1)
+        binh_quan_von_chu_so_huu = self.get_average_from_two_periods(statements.cdkt, "vốn chủ sở hữu")
 
-        no_phai_tra = self.get_value_from_sheet(self.cdkt_df, "nợ phải trả")
+        no_phai_tra = self.get_value_from_sheet(statements.cdkt, "nợ phải trả")
         if no_phai_tra == 0:
-            no_phai_tra = self.get_value_from_sheet(self.cdkt_df, "tổng nợ")
+            no_phai_tra = self.get_value_from_sheet(statements.cdkt, "tổng nợ")
 
-        tai_san_ngan_han = self.get_value_from_sheet(self.cdkt_df, "tài sản ngắn hạn", column_index=-1)
-        no_ngan_han = self.get_value_from_sheet(self.cdkt_df, "nợ ngắn hạn", column_index=-1)
-        hang_ton_kho = self.get_value_from_sheet(self.cdkt_df, "hàng tồn kho", column_index=-1)
+        tai_san_ngan_han = self.get_value_from_sheet(statements.cdkt, "tài sản ngắn hạn", column_index=-1)
+        no_ngan_han = self.get_value_from_sheet(statements.cdkt, "nợ ngắn hạn", column_index=-1)
+        hang_ton_kho = self.get_value_from_sheet(statements.cdkt, "hàng tồn kho", column_index=-1)
 
         # ✅ THAY ĐỔI: Lấy bình quân hàng tồn kho từ 2 cột cuối
-        binh_quan_hang_ton_kho = self.get_average_from_two_periods(self.cdkt_df, "hàng tồn kho")
+        binh_quan_hang_ton_kho = self.get_average_from_two_periods(statements.cdkt, "hàng tồn kho")
 
         # ✅ THAY ĐỔI: Lấy "chi phí Lãi vay" từ LCTT thay vì BCTN
-        lai_vay = self.get_value_from_sheet(self.lctt_df, "chi phí lãi vay")
+        lai_vay = self.get_value_from_sheet(statements.lctt, "chi phí lãi vay")
         if lai_vay == 0:
-            lai_vay = self.get_value_from_sheet(self.lctt_df, "chi phí lãi")
+            lai_vay = self.get_value_from_sheet(statements.lctt, "chi phí lãi")
         if lai_vay == 0:
-            lai_vay = self.get_value_from_sheet(self.lctt_df, "lãi vay")
+            lai_vay = self.get_value_from_sheet(statements.lctt, "lãi vay")
 
         # ✅ THAY ĐỔI: Lấy "Nợ dài hạn" từ CDKT (thay vì "nợ dài hạn đến hạn")
-        no_dai_han = self.get_value_from_sheet(self.cdkt_df, "nợ dài hạn", column_index=-1)
+        no_dai_han = self.get_value_from_sheet(statements.cdkt, "nợ dài hạn", column_index=-1)
 
         # ✅ THAY ĐỔI: Lấy "Khấu hao TSCĐ và BĐSĐT" từ LCTT thay vì BCTN
-        khau_hao = self.get_value_from_sheet(self.lctt_df, "khấu hao tscđ")
+        khau_hao = self.get_value_from_sheet(statements.lctt, "khấu hao tscđ")
         if khau_hao == 0:
-            khau_hao = self.get_value_from_sheet(self.lctt_df, "khấu hao")
+            khau_hao = self.get_value_from_sheet(statements.lctt, "khấu hao")
         if khau_hao == 0:
-            khau_hao = self.get_value_from_sheet(self.lctt_df, "khấu hao tài sản")
+            khau_hao = self.get_value_from_sheet(statements.lctt, "khấu hao tài sản")
 
-        tien_va_tuong_duong = self.get_value_from_sheet(self.cdkt_df, "tiền", column_index=-1)
+        tien_va_tuong_duong = self.get_value_from_sheet(statements.cdkt, "tiền", column_index=-1)
         if tien_va_tuong_duong == 0:
-            tien_va_tuong_duong = self.get_value_from_sheet(self.cdkt_df, "tiền và tương đương", column_index=-1)
+            tien_va_tuong_duong = self.get_value_from_sheet(statements.cdkt, "tiền và tương đương", column_index=-1)
 
-        khoan_phai_thu = self.get_value_from_sheet(self.cdkt_df, "phải thu", column_index=-1)
+        khoan_phai_thu = self.get_value_from_sheet(statements.cdkt, "phải thu", column_index=-1)
         # ✅ THAY ĐỔI: Lấy bình quân phải thu từ 2 cột cuối
-        binh_quan_phai_thu = self.get_average_from_two_periods(self.cdkt_df, "phải thu")
+        binh_quan_phai_thu = self.get_average_from_two_periods(statements.cdkt, "phải thu")
 
         # Tính 14 chỉ số
         indicators = {}
@@ -312,38 +522,23 @@ class ExcelProcessor:
         for key in indicators:
             indicators[key] = round(indicators[key], 6)
 
-        self.financial_indicators = indicators
         return indicators
 
-    def get_indicators_with_names(self) -> Dict[str, Any]:
+    def get_indicators_with_names(self, indicators: Dict[str, float]) -> List[Dict[str, Any]]:
         """
         Lấy 14 chỉ số kèm tên đầy đủ
 
+        Args:
+            indicators: Dict 14 chỉ số trả về từ calculate_14_indicators()
+
         Returns:
-            Dict chứa thông tin chi tiết về 14 chỉ số
+            List chứa thông tin chi tiết về 14 chỉ số
         """
-        indicator_names = {
-            'X_1': 'Hệ số biên lợi nhuận gộp',
-            'X_2': 'Hệ số biên lợi nhuận trước thuế',
-            'X_3': 'Tỷ suất lợi nhuận trước thuế trên tổng tài sản (ROA)',
-            'X_4': 'Tỷ suất lợi nhuận trước thuế trên vốn chủ sở hữu (ROE)',
-            'X_5': 'Hệ số nợ trên tài sản',
-            'X_6': 'Hệ số nợ trên vốn chủ sở hữu',
-            'X_7': 'Khả năng thanh toán hiện hành',
-            'X_8': 'Khả năng thanh toán nhanh',
-            'X_9': 'Hệ số khả năng trả lãi',
-            'X_10': 'Hệ số khả năng trả nợ gốc',
-            'X_11': 'Hệ số khả năng tạo tiền trên vốn chủ sở hữu',
-            'X_12': 'Vòng quay hàng tồn kho',
-            'X_13': 'Kỳ thu tiền bình quân',
-            'X_14': 'Hiệu suất sử dụng tài sản'
-        }
-
         result = []
-        for key, value in self.financial_indicators.items():
+        for key, value in indicators.items():
             result.append({
                 'code': key,
-                'name': indicator_names[key],
+                'name': INDICATOR_NAMES[key],
                 'value': value
             })
 
@@ -823,5 +1018,65 @@ class ExcelProcessor:
         return result
 
 
+def process_workbook(filename: str, content: bytes) -> Dict[str, Any]:
+    """
+    Đọc một file XLSX (bytes) và tính 14 chỉ số
+    (chạy được trong process con; lỗi của file chỉ ảnh hưởng kết quả của file đó)
+
+    Args:
+        filename: Tên file (để báo cáo)
+        content: Nội dung file XLSX
+
+    Returns:
+        Dict {file, status, indicators} hoặc {file, status='error', error}
+    """
+    try:
+        statements = excel_processor.read_excel(io.BytesIO(content))
+        return {
+            'file': filename,
+            'status': 'success',
+            'indicators': excel_processor.calculate_14_indicators(statements)
+        }
+    except Exception as e:
+        return {'file': filename, 'status': 'error', 'error': str(e)}
+
+
+def process_workbooks_parallel(
+    files: List[Tuple[str, bytes]],
+    max_workers: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Tính 14 chỉ số cho nhiều file XLSX song song bằng process pool
+
+    Args:
+        files: List (tên file, nội dung bytes)
+        max_workers: Số process (mặc định min(4, số CPU))
+
+    Returns:
+        List kết quả theo đúng thứ tự files (xem process_workbook)
+    """
+    if not files:
+        return []
+
+    max_workers = max_workers or min(4, os.cpu_count() or 1, len(files))
+    if max_workers <= 1:
+        return [process_workbook(name, content) for name, content in files]
+
+    try:
+        with new_process_pool(max_workers) as executor:
+            futures = [executor.submit(process_workbook, name, content) for name, content in files]
+            results = []
+            for (name, _), future in zip(files, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # Process con bị dừng bất thường → chỉ đánh dấu lỗi cho file đó
+                    results.append({'file': name, 'status': 'error', 'error': str(e)})
+            return results
+    except OSError as e:
+        print(f"⚠️ Không tạo được process pool ({e}), xử lý tuần tự...")
+        return [process_workbook(name, content) for name, content in files]
+
+
 # Khởi tạo instance global
 excel_processor = ExcelProcessor()
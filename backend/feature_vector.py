@@ -0,0 +1,150 @@
+"""
+Module Feature Vector - Vector 14 chỉ số tài chính dùng chung cho cả 4 hệ thống
+(Credit Risk Model, Early Warning, Anomaly Detection, Survival Analysis)
+
+Vector được kiểm tra hợp lệ và chuyển thành ma trận float64 C-contiguous MỘT LẦN cho mỗi
+request/batch; các phương thức chấm điểm nhận trực tiếp mà không dựng lại DataFrame.
+"""
+
+import math
+from typing import Dict, Any, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# Danh sách 14 chỉ số tài chính (đúng thứ tự cột của mọi mô hình)
+FEATURE_COLS = [f'X_{i}' for i in range(1, 15)]
+N_FEATURES = len(FEATURE_COLS)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_COLS)}
+
+
+class FeatureVector:
+    """
+    Ma trận (n_samples, 14) float64, C-contiguous, read-only của 14 chỉ số X_1 → X_14
+
+    Tạo bằng from_dict / from_records / from_frame hoặc coerce; mỗi dòng là một DN.
+    """
+
+    __slots__ = ('values',)
+
+    def __init__(self, values: np.ndarray):
+        """
+        Args:
+            values: Mảng (14,) hoặc (n, 14) theo đúng thứ tự FEATURE_COLS
+        """
+        arr = np.array(values, dtype=np.float64, order='C', ndmin=2)
+        if arr.ndim != 2 or arr.shape[1] != N_FEATURES:
+            raise ValueError(f"Vector chỉ số phải có {N_FEATURES} cột, nhận được shape {arr.shape}")
+        if np.isinf(arr).any():
+            bad = [FEATURE_COLS[j] for j in np.where(np.isinf(arr).any(axis=0))[0]]
+            raise ValueError(f"Chỉ số có giá trị vô cực: {bad}")
+
+        arr.setflags(write=False)
+        self.values = arr
+
+    @classmethod
+    def from_dict(cls, indicators: Dict[str, Any], fill_missing: Optional[float] = None) -> 'FeatureVector':
+        """
+        Tạo vector 1 DN từ dict {X_1: ..., X_14: ...}
+
+        Args:
+            indicators: Dict chứa 14 chỉ số (có thể có thêm key khác, sẽ bị bỏ qua)
+            fill_missing: Giá trị thay cho chỉ số thiếu/None/NaN (None = báo lỗi)
+
+        Returns:
+            FeatureVector shape (1, 14)
+        """
+        row = np.empty(N_FEATURES, dtype=np.float64)
+        missing = []
+
+        for j, name in enumerate(FEATURE_COLS):
+            value = indicators.get(name)
+            try:
+                value = float(value) if value is not None else math.nan
+            except (TypeError, ValueError):
+                raise ValueError(f"Chỉ số {name} không phải số: {value!r}")
+
+            if math.isnan(value):
+                if fill_missing is None:
+                    missing.append(name)
+                value = fill_missing if fill_missing is not None else math.nan
+            row[j] = value
+
+        if missing:
+            raise ValueError(f"Thiếu hoặc không hợp lệ các chỉ số: {missing}")
+
+        return cls(row)
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]], fill_missing: Optional[float] = None) -> 'FeatureVector':
+        """Tạo vector nhiều DN từ list dict"""
+        if not records:
+            raise ValueError("Danh sách chỉ số rỗng")
+        return cls(np.vstack([cls.from_dict(r, fill_missing).values for r in records]))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, fill_missing: Optional[float] = None) -> 'FeatureVector':
+        """Tạo vector nhiều DN từ DataFrame có đủ cột X_1 → X_14"""
+        missing = [c for c in FEATURE_COLS if c not in df.columns]
+        if missing:
+            raise ValueError(f"Thiếu cột: {missing}")
+
+        arr = df[FEATURE_COLS].to_numpy(dtype=np.float64)
+        if fill_missing is not None:
+            arr = np.where(np.isnan(arr), fill_missing, arr)
+        elif np.isnan(arr).any():
+            bad = [FEATURE_COLS[j] for j in np.where(np.isnan(arr).any(axis=0))[0]]
+            raise ValueError(f"Thiếu hoặc không hợp lệ các chỉ số: {bad}")
+        return cls(arr)
+
+    @classmethod
+    def coerce(
+        cls,
+        data: Union['FeatureVector', Dict[str, Any], pd.DataFrame, np.ndarray],
+        fill_missing: Optional[float] = None
+    ) -> 'FeatureVector':
+        """
+        Chuyển dữ liệu đầu vào về FeatureVector (không copy nếu đã là FeatureVector)
+
+        Args:
+            data: FeatureVector, dict 14 chỉ số, DataFrame hoặc ndarray (n, 14)
+            fill_missing: Giá trị thay cho chỉ số thiếu/NaN (None = báo lỗi)
+        """
+        if isinstance(data, FeatureVector):
+            if fill_missing is not None and np.isnan(data.values).any():
+                return cls(np.where(np.isnan(data.values), fill_missing, data.values))
+            return data
+        if isinstance(data, dict):
+            return cls.from_dict(data, fill_missing)
+        if isinstance(data, pd.DataFrame):
+            return cls.from_frame(data, fill_missing)
+        return cls(data)
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def __repr__(self) -> str:
+        return f"FeatureVector(n_samples={len(self)})"
+
+    def row(self, i: int) -> 'FeatureVector':
+        """Vector của DN thứ i (view, không copy)"""
+        return FeatureVector._from_trusted(self.values[i:i + 1])
+
+    def column(self, name: str) -> np.ndarray:
+        """Cột của một chỉ số (view, không copy)"""
+        return self.values[:, FEATURE_INDEX[name]]
+
+    def to_dict(self, i: int = 0) -> Dict[str, float]:
+        """Dict {X_1: ..., X_14: ...} của DN thứ i (cho báo cáo/prompt)"""
+        return dict(zip(FEATURE_COLS, self.values[i].tolist()))
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame có tên cột (chỉ dùng cho mô hình cũ được train bằng DataFrame)"""
+        return pd.DataFrame(self.values, columns=FEATURE_COLS)
+
+    @classmethod
+    def _from_trusted(cls, arr: np.ndarray) -> 'FeatureVector':
+        """Bọc mảng đã hợp lệ (read-only, đúng shape) mà không kiểm tra lại"""
+        fv = cls.__new__(cls)
+        fv.values = arr
+        return fv
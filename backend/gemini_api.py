@@ -6,6 +6,7 @@ import os
 from typing import Dict, Any
 import google.generativeai as genai
 from dotenv import load_dotenv
+from chart_specs import industry_charts
 
 load_dotenv()  # Tải biến môi trường từ file .env
 
@@ -301,68 +302,8 @@ Ví dụ format JSON:
         Returns:
             Dict chứa charts_data (ECharts config) và brief_analysis
         """
-        # Tạo nhiều loại biểu đồ ECharts
-        charts_data = []
-
-        # 1. Biểu đồ cột - Tăng trưởng GDP
-        growth = data.get("growth", {})
-        charts_data.append({
-            "title": {"text": f"Tăng trưởng GDP - {industry_name}", "left": "center"},
-            "tooltip": {"trigger": "axis"},
-            "xAxis": {"type": "category", "data": growth.get("years", [])},
-            "yAxis": {"type": "value", "name": "Tăng trưởng (%)"},
-            "series": [{
-                "data": growth.get("gdp_growth", []),
-                "type": "bar",
-                "itemStyle": {"color": "#FF6B9D"},
-                "label": {"show": True, "position": "top"}
-            }]
-        })
-
-        # 2. Biểu đồ Radar - Chỉ số tài chính
-        financial = data.get("financial", {})
-        charts_data.append({
-            "title": {"text": f"Chỉ số Tài chính - {industry_name}", "left": "center"},
-            "tooltip": {},
-            "radar": {
-                "indicator": [
-                    {"name": "ROE", "max": 30},
-                    {"name": "ROA", "max": 20},
-                    {"name": "Biên LN gộp", "max": 50},
-                    {"name": "Tỷ lệ nợ", "max": 100}
-                ]
-            },
-            "series": [{
-                "type": "radar",
-                "data": [{
-                    "value": [
-                        financial.get("roe", 0),
-                        financial.get("roa", 0),
-                        financial.get("gross_margin", 0),
-                        financial.get("debt_ratio", 0)
-                    ],
-                    "name": "Chỉ số tài chính",
-                    "areaStyle": {"color": "rgba(255, 107, 157, 0.3)"}
-                }]
-            }]
-        })
-
-        # 3. Biểu đồ đường - Tỷ lệ nợ xấu
-        credit_risk = data.get("credit_risk", {})
-        charts_data.append({
-            "title": {"text": f"Tỷ lệ Nợ xấu (NPL) - {industry_name}", "left": "center"},
-            "tooltip": {"trigger": "axis"},
-            "xAxis": {"type": "category", "data": growth.get("years", [])},
-            "yAxis": {"type": "value", "name": "NPL (%)"},
-            "series": [{
-                "data": credit_risk.get("npl_rates", []),
-                "type": "line",
-                "smooth": True,
-                "itemStyle": {"color": "#9C27B0"},
-                "areaStyle": {"color": "rgba(156, 39, 176, 0.2)"},
-                "label": {"show": True, "position": "top"}
-            }]
-        })
+        # Tạo biểu đồ ECharts từ template dựng sẵn (GDP, radar tài chính, NPL)
+        charts_data = industry_charts(industry_name, data)
 
         # Phân tích sơ bộ bằng AI
         prompt = f"""
@@ -0,0 +1,479 @@
+"""
+Module Hyperparameter Tuning - Tìm kiếm siêu tham số song song (Successive Halving)
+cho 3 nhóm mô hình: CreditRiskModel, EarlyWarningSystem, AnomalyDetectionSystem
+
+Mỗi vòng (rung) đánh giá các cấu hình trên một phần dữ liệu huấn luyện trong process pool,
+giữ lại 1/eta cấu hình tốt nhất (theo AUC validation) và tăng gấp eta lượng dữ liệu cho vòng sau.
+Số cây XGBoost của các ứng viên được xác định bằng early stopping; cấu hình mặc định được chấm
+đúng như lúc huấn luyện thật (không early stopping) để so sánh với cấu hình đang chạy. Mọi trial được ghi vào trial log (JSON lines);
+cấu hình tốt nhất được promote vào model registry nếu AUC không thấp hơn và chi phí suy luận
+không cao hơn cấu hình mặc định.
+"""
+
+import itertools
+import json
+import math
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+from xgboost import XGBClassifier
+
+from model import CreditRiskModel, CREDIT_MODEL_PARAMS, MODEL_COLS
+from early_warning import EarlyWarningSystem, EARLY_WARNING_PARAMS
+from anomaly_detection import AnomalyDetectionSystem, ANOMALY_PARAMS
+from model_registry import promote_config
+from process_pool import new_process_pool
+
+# File trial log (mỗi dòng là một trial dạng JSON)
+TUNING_TRIAL_LOG = os.getenv("TUNING_TRIAL_LOG", "tuning_trials.jsonl")
+
+# Số vòng không cải thiện logloss trước khi dừng boosting XGBoost
+XGB_EARLY_STOPPING_ROUNDS = 10
+# Số cấu hình tối đa ở rung đầu tiên của một lần tìm kiếm (/tune-hyperparameters)
+TUNING_MAX_CANDIDATES = int(os.getenv("TUNING_MAX_CANDIDATES", "64"))
+
+# Cột nhãn của từng nhóm mô hình
+TARGET_COLS = {
+    'credit_risk': 'default',
+    'early_warning': 'label',
+    'anomaly': 'label',
+}
+
+# Cấu hình mặc định (baseline) của từng nhóm mô hình
+DEFAULT_PARAMS = {
+    'credit_risk': CREDIT_MODEL_PARAMS,
+    'early_warning': EARLY_WARNING_PARAMS,
+    'anomaly': ANOMALY_PARAMS,
+}
+
+# Không gian tìm kiếm: giới hạn trên bằng cấu hình mặc định để chi phí suy luận không tăng.
+# xgb_n_estimators là giới hạn trên, số cây thực tế do early stopping quyết định.
+# contamination của Isolation Forest chỉ dịch ngưỡng quyết định, không đổi thứ hạng điểm
+# (AUC) nên giữ nguyên mặc định.
+SEARCH_SPACES = {
+    'credit_risk': {
+        'rf_n_estimators': [25, 50, 75, 100],
+        'rf_max_depth': [4, 6, 8, 10],
+        'xgb_n_estimators': [100],
+        'xgb_max_depth': [2, 3, 4, 6],
+        'xgb_learning_rate': [0.03, 0.05, 0.1, 0.2],
+    },
+    'early_warning': {
+        'rf_n_estimators': [25, 50, 75, 100],
+        'rf_max_depth': [4, 6, 8, 10],
+        'xgb_n_estimators': [100],
+        'xgb_max_depth': [2, 3, 4, 6],
+        'xgb_learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'gb_n_estimators': [25, 50, 75, 100],
+        'gb_max_depth': [2, 3, 4, 6],
+        'gb_learning_rate': [0.05, 0.1, 0.2],
+    },
+    'anomaly': {
+        'n_estimators': [50, 75, 100],
+        'max_samples': [64, 128, 256, 'auto'],
+        'max_features': [0.5, 0.75, 1.0],
+    },
+}
+
+
+def _stratify_or_none(y: pd.Series):
+    """Chỉ stratify khi mỗi lớp có ít nhất 2 mẫu"""
+    counts = y.value_counts()
+    return y if len(counts) == 2 and counts.min() >= 2 else None
+
+
+def _early_stopped_rounds(
+    params: Dict[str, Any],
+    X: pd.DataFrame,
+    y: pd.Series
+) -> int:
+    """
+    Xác định số vòng boosting XGBoost bằng early stopping trên 20% dữ liệu fit
+
+    Args:
+        params: Cấu hình chứa xgb_n_estimators (giới hạn trên), xgb_max_depth, xgb_learning_rate
+        X, y: Dữ liệu fit của trial
+
+    Returns:
+        Số cây tốt nhất (best_iteration + 1)
+    """
+    X_tr, X_es, y_tr, y_es = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=_stratify_or_none(y)
+    )
+    clf = XGBClassifier(
+        n_estimators=params['xgb_n_estimators'],
+        max_depth=params['xgb_max_depth'],
+        learning_rate=params['xgb_learning_rate'],
+        random_state=42,
+        eval_metric='logloss',
+        early_stopping_rounds=XGB_EARLY_STOPPING_ROUNDS
+    )
+    clf.fit(X_tr, y_tr, eval_set=[(X_es, y_es)], verbose=False)
+    return int(clf.best_iteration) + 1
+
+
+def inference_cost(family: str, params: Dict[str, Any]) -> float:
+    """
+    Ước lượng chi phí suy luận tương đối (tổng số node duyệt qua trên mỗi dự báo)
+
+    Args:
+        family: Nhóm mô hình
+        params: Cấu hình đầy đủ
+
+    Returns:
+        Chi phí tương đối (càng nhỏ càng nhanh)
+    """
+    if family == 'anomaly':
+        max_samples = params['max_samples']
+        depth = math.ceil(math.log2(256 if max_samples == 'auto' else max_samples))
+        return float(params['n_estimators'] * depth)
+
+    cost = (params['rf_n_estimators'] * params['rf_max_depth']
+            + params['xgb_n_estimators'] * params['xgb_max_depth'])
+    if family == 'early_warning':
+        cost += params['gb_n_estimators'] * params['gb_max_depth']
+    return float(cost)
+
+
+def _evaluate_trial(
+    family: str,
+    params: Dict[str, Any],
+    X_fit: pd.DataFrame,
+    y_fit: pd.Series,
+    X_val: pd.DataFrame,
+    y_val: pd.Series,
+    early_stopping: bool = True
+) -> Dict[str, Any]:
+    """
+    Worker (chạy trong process riêng): huấn luyện một cấu hình và tính AUC validation
+
+    Args:
+        early_stopping: Xác định số cây XGBoost bằng early stopping (False = giữ nguyên
+                        xgb_n_estimators, như fit_stacking khi huấn luyện thật)
+
+    Returns:
+        Dict {params, auc, inference_cost, fit_seconds, error}
+    """
+    start_time = time.time()
+    params = dict(params)
+
+    try:
+        # Early stopping cho XGBoost → số cây thực tế của cấu hình
+        if early_stopping and 'xgb_n_estimators' in params:
+            params['xgb_n_estimators'] = _early_stopped_rounds(params, X_fit, y_fit)
+
+        if family == 'credit_risk':
+            model = CreditRiskModel()
+            model.build_model(params)
+            model.fit_stacking(X_fit, y_fit, use_oof_cache=False)
+            proba = model.predict_pd(X_val)
+        elif family == 'early_warning':
+            ews = EarlyWarningSystem()
+            stacking = ews.build_stacking_model(params)
+            stacking.fit(X_fit.values, y_fit.values)
+            proba = stacking.predict_proba(X_val.values)[:, 1]
+        else:
+            ads = AnomalyDetectionSystem()
+            ads.train_model(X_fit.assign(label=y_fit.values), params)
+            # Điểm bất thường càng cao → càng có khả năng vỡ nợ
+            proba = -ads.model.score_samples(ads.scaler.transform(X_val.values))
+
+        auc = float(roc_auc_score(y_val, proba))
+        error = None
+    except Exception as e:
+        auc = None
+        error = str(e)
+
+    return {
+        'params': params,
+        'auc': auc,
+        'inference_cost': inference_cost(family, params) if error is None else None,
+        'fit_seconds': round(time.time() - start_time, 3),
+        'error': error
+    }
+
+
+class HyperparameterTuner:
+    """
+    Dịch vụ tìm kiếm siêu tham số song song (Successive Halving) cho 3 nhóm mô hình
+    """
+
+    def __init__(self, trial_log_path: str = None):
+        """Khởi tạo tuner"""
+        self.trial_log_path = trial_log_path or TUNING_TRIAL_LOG
+
+    def _sample_candidates(self, family: str, n_candidates: int, rng: np.random.RandomState) -> List[Dict]:
+        """
+        Lấy ngẫu nhiên (không lặp) tối đa n_candidates cấu hình; cấu hình mặc định luôn là ứng viên đầu tiên
+
+        Liệt kê toàn bộ lưới rồi lấy mẫu không hoàn lại, nên n_candidates lớn hơn số cấu hình
+        khác nhau chỉ trả về toàn bộ lưới (cấu hình mặc định có thể nằm sẵn trong lưới).
+        """
+        space = SEARCH_SPACES[family]
+        baseline = dict(DEFAULT_PARAMS[family])
+        baseline_key = json.dumps(baseline, sort_keys=True, default=str)
+
+        grid = []
+        for values in itertools.product(*space.values()):
+            config = {**baseline, **dict(zip(space.keys(), values))}
+            if json.dumps(config, sort_keys=True, default=str) != baseline_key:
+                grid.append(config)
+
+        n_sampled = min(n_candidates - 1, len(grid))
+        return [baseline] + [grid[i] for i in rng.permutation(len(grid))[:n_sampled]]
+
+    def _append_trials(self, trials: List[Dict[str, Any]]):
+        """Ghi thêm trials vào trial log"""
+        with open(self.trial_log_path, 'a', encoding='utf-8') as f:
+            for trial in trials:
+                f.write(json.dumps(trial, ensure_ascii=False, default=str) + "\n")
+
+    def _run_rung(
+        self,
+        family: str,
+        configs: List[Dict[str, Any]],
+        X_fit: pd.DataFrame,
+        y_fit: pd.Series,
+        X_val: pd.DataFrame,
+        y_val: pd.Series,
+        max_workers: int,
+        baseline: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Đánh giá song song các cấu hình của một rung (fallback tuần tự nếu không tạo được process)"""
+        # Cấu hình mặc định chấm đúng như lúc huấn luyện thật (không early stopping)
+        args = [(family, config, X_fit, y_fit, X_val, y_val, config != baseline) for config in configs]
+
+        try:
+            with new_process_pool(max_workers) as executor:
+                futures = [executor.submit(_evaluate_trial, *a) for a in args]
+                return [future.result() for future in futures]
+        except OSError as e:
+            print(f"⚠️ Không tạo được process pool ({e}), đánh giá tuần tự...")
+            return [_evaluate_trial(*a) for a in args]
+
+    def run_search(
+        self,
+        family: str,
+        df: pd.DataFrame,
+        n_candidates: int = 8,
+        eta: int = 2,
+        min_fraction: float = 0.25,
+        max_workers: Optional[int] = None,
+        promote: bool = True,
+        random_state: int = 42
+    ) -> Dict[str, Any]:
+        """
+        Chạy Successive Halving cho một nhóm mô hình
+
+        Args:
+            family: 'credit_risk', 'early_warning' hoặc 'anomaly'
+            df: DataFrame chứa X_1 → X_14 + cột nhãn ('default' cho credit_risk, 'label' cho 2 nhóm còn lại)
+            n_candidates: Số cấu hình ở rung đầu tiên (gồm cả cấu hình mặc định, tối đa bằng số
+                          cấu hình khác nhau trong không gian tìm kiếm)
+            eta: Hệ số loại bỏ (giữ 1/eta cấu hình mỗi rung, tăng eta lần dữ liệu)
+            min_fraction: Tỷ lệ dữ liệu fit ở rung đầu tiên
+            max_workers: Số process song song (mặc định min(4, số CPU))
+            promote: Promote cấu hình tốt nhất vào model registry
+            random_state: Seed lấy mẫu cấu hình
+
+        Returns:
+            Dict chứa cấu hình tốt nhất, AUC, baseline và thông tin các rung
+        """
+        if family not in SEARCH_SPACES:
+            raise ValueError(f"family phải là một trong {list(SEARCH_SPACES)}")
+        if n_candidates < 2:
+            raise ValueError("n_candidates phải >= 2")
+        if eta < 2:
+            raise ValueError("eta phải >= 2")
+        if not 0 < min_fraction <= 1:
+            raise ValueError("min_fraction phải nằm trong khoảng (0, 1]")
+
+        target_col = TARGET_COLS[family]
+        required_cols = MODEL_COLS + [target_col]
+        missing = [c for c in required_cols if c not in df.columns]
+        if missing:
+            raise ValueError(f"Thiếu cột: {missing}")
+
+        start_time = time.time()
+        search_id = f"{family}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        max_workers = max_workers or min(4, os.cpu_count() or 1)
+        rng = np.random.RandomState(random_state)
+
+        # 1. Chia dữ liệu: 80% train (như lúc huấn luyện thật) → 75% fit / 25% validation
+        X = df[MODEL_COLS]
+        y = df[target_col].astype(int)
+        X_train, _, y_train, _ = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=_stratify_or_none(y)
+        )
+        X_fit_all, X_val, y_fit_all, y_val = train_test_split(
+            X_train, y_train, test_size=0.25, random_state=42, stratify=_stratify_or_none(y_train)
+        )
+
+        # 2. Successive Halving
+        candidates = self._sample_candidates(family, n_candidates, rng)
+        baseline = candidates[0]
+        survivors = candidates
+        fraction = min_fraction
+        rungs = []
+        results = []
+        trial_counter = 0
+
+        print(f"🔎 Bắt đầu tìm kiếm siêu tham số {family}: {len(candidates)} cấu hình, eta={eta}")
+
+        while True:
+            if fraction < 1:
+                X_fit, _, y_fit, _ = train_test_split(
+                    X_fit_all, y_fit_all, train_size=fraction, random_state=42,
+                    stratify=_stratify_or_none(y_fit_all)
+                )
+            else:
+                X_fit, y_fit = X_fit_all, y_fit_all
+
+            results = self._run_rung(family, survivors, X_fit, y_fit, X_val, y_val, max_workers, baseline)
+
+            trials = []
+            for config, result in zip(survivors, results):
+                trial_counter += 1
+                trials.append({
+                    'search_id': search_id,
+                    'family': family,
+                    'trial_id': trial_counter,
+                    'rung': len(rungs),
+                    'fraction': round(fraction, 4),
+                    'n_fit_samples': len(X_fit),
+                    'candidate_params': config,
+                    'is_baseline': config == baseline,
+                    'timestamp': datetime.now().isoformat(),
+                    **result
+                })
+            self._append_trials(trials)
+
+            rungs.append({
+                'rung': len(rungs),
+                'fraction': round(fraction, 4),
+                'n_configs': len(survivors),
+                'best_auc': max((t['auc'] for t in trials if t['auc'] is not None), default=None)
+            })
+            print(f"   Rung {rungs[-1]['rung']}: {len(survivors)} cấu hình, "
+                  f"{len(X_fit)} mẫu, best AUC={rungs[-1]['best_auc']}")
+
+            if fraction >= 1:
+                break
+
+            # Giữ lại 1/eta cấu hình tốt nhất (AUC cao, chi phí suy luận thấp)
+            ranked = sorted(
+                [t for t in trials if t['auc'] is not None],
+                key=lambda t: (-t['auc'], t['inference_cost'])
+            )
+            n_keep = max(1, math.ceil(len(survivors) / eta))
+            survivors = [t['candidate_params'] for t in ranked[:n_keep]]
+            if not survivors:
+                raise ValueError("Tất cả các trial đều lỗi. Xem trial log để biết chi tiết.")
+            fraction = min(1.0, fraction * eta)
+
+        final_trials = trials
+        valid = [t for t in final_trials if t['auc'] is not None]
+        if not valid:
+            raise ValueError("Tất cả các trial đều lỗi. Xem trial log để biết chi tiết.")
+        best = min(valid, key=lambda t: (-t['auc'], t['inference_cost']))
+
+        # 3. Baseline trên toàn bộ dữ liệu fit (để so sánh trước khi promote), không early stopping
+        baseline_trial = next((t for t in final_trials if t['is_baseline']), None)
+        if baseline_trial is None:
+            baseline_trial = {
+                'search_id': search_id,
+                'family': family,
+                'trial_id': trial_counter + 1,
+                'rung': 'baseline',
+                'fraction': 1.0,
+                'n_fit_samples': len(X_fit_all),
+                'candidate_params': baseline,
+                'is_baseline': True,
+                'timestamp': datetime.now().isoformat(),
+                **_evaluate_trial(family, baseline, X_fit_all, y_fit_all, X_val, y_val, early_stopping=False)
+            }
+            self._append_trials([baseline_trial])
+
+        baseline_auc = baseline_trial['auc']
+        baseline_cost = baseline_trial['inference_cost']
+
+        # 4. Promote nếu AUC không thấp hơn và chi phí suy luận không cao hơn baseline
+        promoted = False
+        registry_record = None
+        if promote and (baseline_auc is None or (
+                best['auc'] >= baseline_auc and best['inference_cost'] <= baseline_cost)):
+            registry_record = promote_config(
+                family, best['params'], best['auc'], baseline_auc, search_id
+            )
+            promoted = True
+
+        print(f"✅ Tìm kiếm hoàn tất: best AUC={best['auc']:.4f} (baseline={baseline_auc})")
+
+        return {
+            'status': 'success',
+            'search_id': search_id,
+            'family': family,
+            'method': 'successive_halving',
+            'n_candidates': len(candidates),
+            'eta': eta,
+            'rungs': rungs,
+            'best_params': best['params'],
+            'best_validation_auc': best['auc'],
+            'best_inference_cost': best['inference_cost'],
+            'baseline_params': baseline_trial['params'],
+            'baseline_validation_auc': baseline_auc,
+            'baseline_inference_cost': baseline_cost,
+            'promoted': promoted,
+            'registry_record': registry_record,
+            'trial_log': self.trial_log_path,
+            'wall_time_seconds': round(time.time() - start_time, 2)
+        }
+
+    def load_trials(
+        self,
+        family: Optional[str] = None,
+        search_id: Optional[str] = None,
+        limit: int = 200
+    ) -> List[Dict[str, Any]]:
+        """
+        Đọc trial log
+
+        Args:
+            family: Lọc theo nhóm mô hình
+            search_id: Lọc theo lần tìm kiếm
+            limit: Số trial gần nhất tối đa
+
+        Returns:
+            List các trial (mới nhất ở cuối)
+        """
+        if not os.path.exists(self.trial_log_path):
+            return []
+
+        trials = []
+        with open(self.trial_log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    trial = json.loads(line)
+                except ValueError:
+                    continue
+                if family and trial.get('family') != family:
+                    continue
+                if search_id and trial.get('search_id') != search_id:
+                    continue
+                trials.append(trial)
+
+        return trials[-limit:]
+
+
+# Khởi tạo instance global
+hyperparameter_tuner = HyperparameterTuner()
@@ -0,0 +1,130 @@
+"""
+Module JSON Response - Serialize response của API bằng orjson
+
+orjson serialize trực tiếp numpy array/scalar và ghi NaN/inf thành null, nên không cần
+duyệt đệ quy toàn bộ response bằng Python trước khi trả về.
+Khi chưa cài orjson, dùng lại JSONResponse chuẩn + convert_to_json_serializable.
+"""
+
+import json
+import math
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import ORJSONResponse
+
+# orjson là dependency tùy chọn (nhanh hơn json chuẩn nhiều lần với response lớn)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def convert_to_json_serializable(obj):
+    """
+    Chuyển đổi numpy/pandas types sang Python native types để JSON serialization
+    Xử lý các giá trị float đặc biệt (inf, -inf, nan) không hợp lệ trong JSON
+    """
+    if isinstance(obj, dict):
+        return {key: convert_to_json_serializable(value) for key, value in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [convert_to_json_serializable(item) for item in obj]
+    elif isinstance(obj, (np.integer, np.int64, np.int32, np.int16, np.int8)):
+        return int(obj)
+    elif isinstance(obj, (np.floating, np.float64, np.float32, np.float16)):
+        # Convert numpy float to Python float
+        val = float(obj)
+        # Kiểm tra và xử lý các giá trị đặc biệt không hợp lệ trong JSON
+        if math.isnan(val) or math.isinf(val):
+            return None  # Hoặc có thể return 0, tùy vào yêu cầu
+        return val
+    elif isinstance(obj, float):
+        # Xử lý Python float (không phải numpy)
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+        return obj
+    elif isinstance(obj, np.ndarray):
+        return convert_to_json_serializable(obj.tolist())
+    elif isinstance(obj, (np.bool_, bool)):
+        return bool(obj)
+    elif pd.isna(obj):
+        return None
+    else:
+        return obj
+
+
+def json_default(obj: Any) -> Any:
+    """
+    Hook cho các kiểu orjson không tự serialize được
+
+    orjson đã xử lý dict/list/float (NaN/inf → null) và numpy array C-contiguous;
+    hook chỉ được gọi với phần còn lại (array không liên tục, float16, pd.NA/NaT, pd.Timestamp, set...).
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if pd.api.types.is_scalar(obj) and pd.isna(obj):
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    raise TypeError(f"Kiểu dữ liệu không serialize được sang JSON: {type(obj).__name__}")
+
+
+def dumps_json(content: Any) -> bytes:
+    """
+    Serialize sang JSON bytes (orjson nếu có, ngược lại json chuẩn + convert_to_json_serializable)
+
+    Args:
+        content: Dữ liệu cần serialize (có thể chứa numpy types, NaN/inf)
+
+    Returns:
+        JSON bytes (UTF-8), NaN/inf → null
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            content,
+            default=json_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(
+        convert_to_json_serializable(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+def loads_json(data: bytes) -> Any:
+    """
+    Parse JSON bytes (orjson nếu có, ngược lại json chuẩn)
+
+    Args:
+        data: JSON bytes
+
+    Returns:
+        Dữ liệu Python (dict/list mới, an toàn để sửa đổi)
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    Response JSON mặc định của API: orjson + numpy, NaN/inf → null
+
+    Endpoint trả về trực tiếp FastJSONResponse(dict) để bỏ qua cả jsonable_encoder của FastAPI
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
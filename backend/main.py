@@ -3,7 +3,7 @@ FastAPI Backend - Hệ thống Đánh giá Rủi ro Tín dụng
 Endpoints: /train, /predict, /predict-from-xlsx, /analyze, /export-report
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Header
 from dotenv import load_dotenv
 import os
 
@@ -11,26 +11,40 @@ load_dotenv()  # Tải các biến môi trường từ file .env
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, List
 import pandas as pd
 import os
-import tempfile
+import asyncio
+import time
+import zipfile
 from datetime import datetime
 from model import credit_model
 from gemini_api import get_gemini_analyzer
-from excel_processor import excel_processor
-from report_generator import ReportGenerator
+from excel_processor import excel_processor, process_workbooks_parallel
+from report_service import (
+    DOCX_MEDIA_TYPE, render_report, build_survival_report, submit_batch_job, job_status, job_zip_path,
+    shutdown_report_executor
+)
 from early_warning import early_warning_system
 from anomaly_detection import anomaly_system
-from survival_analysis import survival_system
+from survival_analysis import survival_system, simplify_survival_curve
+from hyperparameter_tuning import hyperparameter_tuner, TUNING_MAX_CANDIDATES
+from model_registry import load_registry
+from feature_vector import FeatureVector
+from json_response import FastJSONResponse
+from response_formats import negotiated_response
+from compression import CompressionMiddleware, RESPONSE_COMPRESSION, no_compression
+from chart_specs import pd_indicator_charts, chart_templates_payload, CHART_TEMPLATES_ETAG
 
 # Khởi tạo FastAPI app
 app = FastAPI(
     title="Credit Risk Assessment API",
     description="API đánh giá rủi ro tín dụng sử dụng Stacking Classifier",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson + numpy (NaN/inf → null); endpoint trả về FastJSONResponse(dict) để bỏ qua jsonable_encoder
+    default_response_class=FastJSONResponse
 )
 
 # Cấu hình CORS để frontend Vue có thể gọi API
@@ -55,57 +69,51 @@ app.add_middleware(
 )
 
 
+@app.on_event("shutdown")
+def _shutdown_report_workers():
+    """Dừng worker pool xuất báo cáo khi tắt ứng dụng"""
+    shutdown_report_executor()
+
+
+# Nén response lớn (Brotli nếu cài brotli, ngược lại GZip) - cấu hình trong compression.py
+if RESPONSE_COMPRESSION:
+    app.add_middleware(CompressionMiddleware)
+
+
+# Sai số xác suất tối đa khi rút gọn survival curve (có thể cấu hình qua biến môi trường)
+SURVIVAL_CURVE_TOLERANCE = float(os.getenv("SURVIVAL_CURVE_TOLERANCE", "0.002"))
+
+# RSF tiết kiệm bộ nhớ + artifact survival_models.pkl gọn (không lưu training DataFrame)
+SURVIVAL_LOW_MEMORY = os.getenv("SURVIVAL_LOW_MEMORY", "0") == "1"
+
+# Dung lượng tối đa của một file upload (MB)
+MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "200"))
+
+# Giới hạn cho /predict-from-xlsx-batch (số file XLSX và tổng dung lượng giải nén của file ZIP)
+XLSX_BATCH_MAX_FILES = int(os.getenv("XLSX_BATCH_MAX_FILES", "500"))
+XLSX_BATCH_MAX_UNCOMPRESSED_MB = int(os.getenv("XLSX_BATCH_MAX_UNCOMPRESSED_MB", "500"))
+# Số process đọc XLSX song song (0 = tự động theo số CPU)
+XLSX_BATCH_WORKERS = int(os.getenv("XLSX_BATCH_WORKERS", "0"))
+
+
 # ================================================================================================
 # HELPER FUNCTIONS
 # ================================================================================================
 
-def convert_to_json_serializable(obj):
-    """
-    Chuyển đổi numpy/pandas types sang Python native types để JSON serialization
-    Xử lý các giá trị float đặc biệt (inf, -inf, nan) không hợp lệ trong JSON
-    """
-    import numpy as np
-    import math
-
-    if isinstance(obj, dict):
-        return {key: convert_to_json_serializable(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_to_json_serializable(item) for item in obj]
-    elif isinstance(obj, (np.integer, np.int64, np.int32, np.int16, np.int8)):
-        return int(obj)
-    elif isinstance(obj, (np.floating, np.float64, np.float32, np.float16)):
-        # Convert numpy float to Python float
-        val = float(obj)
-        # Kiểm tra và xử lý các giá trị đặc biệt không hợp lệ trong JSON
-        if math.isnan(val) or math.isinf(val):
-            return None  # Hoặc có thể return 0, tùy vào yêu cầu
-        return val
-    elif isinstance(obj, float):
-        # Xử lý Python float (không phải numpy)
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    elif isinstance(obj, np.ndarray):
-        return convert_to_json_serializable(obj.tolist())
-    elif isinstance(obj, (np.bool_, bool)):
-        return bool(obj)
-    elif pd.isna(obj):
-        return None
-    else:
-        return obj
-
-
-def downsample_kaplan_meier(km_data: Dict[str, Any], max_points: int = 100) -> Dict[str, Any]:
+def downsample_kaplan_meier(km_data: Dict[str, Any], max_points: int = 100,
+                            tolerance: float = SURVIVAL_CURVE_TOLERANCE) -> Dict[str, Any]:
     """
-    Downsample Kaplan-Meier data để giảm kích thước response
-    Giữ lại max_points điểm quan trọng nhất
+    Downsample survival curve (Kaplan-Meier baseline hoặc curve của từng DN) để giảm kích thước response
+    Giữ hình dạng đường cong: bỏ các điểm lệch không quá `tolerance`, luôn giữ các bước giảm mạnh,
+    sau đó dùng LTTB nếu vẫn còn nhiều hơn max_points
 
     Args:
         km_data: Dict chứa timeline và survival_probabilities
         max_points: Số điểm tối đa muốn giữ lại
+        tolerance: Sai số xác suất tối đa cho phép tại các điểm bị bỏ
 
     Returns:
-        Dict với downsampled data
+        Dict với downsampled data (giữ nguyên các key khác của km_data)
     """
     if not km_data or 'timeline' not in km_data or 'survival_probabilities' not in km_data:
         return km_data
@@ -117,32 +125,179 @@ def downsample_kaplan_meier(km_data: Dict[str, Any], max_points: int = 100) -> D
     if len(timeline) <= max_points:
         return km_data
 
-    # Downsample: lấy mỗi n điểm
-    step = len(timeline) // max_points
-    if step < 1:
-        step = 1
-
-    # Luôn giữ điểm đầu và điểm cuối
-    indices = list(range(0, len(timeline), step))
-    if len(timeline) - 1 not in indices:
-        indices.append(len(timeline) - 1)
+    downsampled_timeline, downsampled_probs = simplify_survival_curve(
+        timeline, survival_probs, tolerance=tolerance, max_points=max_points
+    )
 
-    downsampled_timeline = [timeline[i] for i in indices]
-    downsampled_probs = [survival_probs[i] for i in indices]
-
-    print(f"🔽 [DOWNSAMPLE] Kaplan-Meier: {len(timeline)} điểm → {len(downsampled_timeline)} điểm")
+    print(f"🔽 [DOWNSAMPLE] Survival curve: {len(timeline)} điểm → {len(downsampled_timeline)} điểm")
 
     return {
+        **km_data,
         'timeline': downsampled_timeline,
         'survival_probabilities': downsampled_probs,
-        'median_survival_time': km_data.get('median_survival_time'),
-        'event_count': km_data.get('event_count'),
-        'censored_count': km_data.get('censored_count'),
         'original_points': len(timeline),  # Thông tin về số điểm gốc
         'downsampled': True
     }
 
 
+def classify_anomaly_risk(anomaly_score: float) -> Dict[str, str]:
+    """
+    Phân loại mức rủi ro theo Anomaly Score
+
+    Ngưỡng được suy ra từ contamination của mô hình (xem anomaly_system.risk_cutoffs),
+    mặc định 90/95 trên thang CDF; mô hình cũ (thang tuyến tính) giữ 60/80.
+
+    Args:
+        anomaly_score: Điểm bất thường (0-100)
+
+    Returns:
+        Dict chứa risk_level, risk_level_color, risk_level_icon
+    """
+    medium_cutoff, high_cutoff = anomaly_system.risk_cutoffs()
+    if anomaly_score < medium_cutoff:
+        return {"risk_level": "Bình thường", "risk_level_color": "#10B981", "risk_level_icon": "⚠️"}
+    elif anomaly_score < high_cutoff:
+        return {"risk_level": "Bất thường Trung bình", "risk_level_color": "#F59E0B", "risk_level_icon": "🔶"}
+    else:
+        return {"risk_level": "Bất thường Cao", "risk_level_color": "#EF4444", "risk_level_icon": "🔴"}
+
+
+def anomaly_risk_cutoffs() -> Dict[str, float]:
+    """
+    Ngưỡng mức rủi ro đang dùng trong classify_anomaly_risk (frontend tô màu gauge theo ngưỡng này)
+
+    Returns:
+        Dict {'medium': ngưỡng Trung bình, 'high': ngưỡng Cao} (thang 0-100)
+    """
+    medium_cutoff, high_cutoff = anomaly_system.risk_cutoffs()
+    return {"medium": medium_cutoff, "high": high_cutoff}
+
+
+def project_pd_scenarios(indicators: Dict[str, float], current_pd: float,
+                         industry_code: str = "manufacturing") -> Dict[str, Any]:
+    """
+    Dự báo PD tương lai (3/6/12 tháng x 3 kịch bản vĩ mô) bằng Early Warning System
+
+    Args:
+        indicators: Dict 14 chỉ số hiện tại
+        current_pd: PD hiện tại (%)
+        industry_code: Mã ngành
+
+    Returns:
+        Dict {'current': PD, kịch bản: {'3_months': PD, ...}}
+    """
+    pd_projection = {
+        'current': current_pd
+    }
+
+    for scenario in ['recession_mild', 'recession_moderate', 'crisis']:
+        pd_projection[scenario] = {}
+        for months in [3, 6, 12]:
+            pd_projection[scenario][f'{months}_months'] = early_warning_system.project_future_pd(
+                indicators=indicators,
+                months=months,
+                scenario=scenario,
+                excel_processor=excel_processor,
+                industry_code=industry_code
+            )
+
+    return pd_projection
+
+
+def upload_stream(file: UploadFile):
+    """
+    Stream của file upload, đã về đầu file, để truyền thẳng cho pandas/ExcelProcessor
+
+    Starlette giữ upload trong SpooledTemporaryFile (RAM nếu nhỏ, tự spill ra đĩa MỘT lần
+    nếu lớn) → không cần đọc hết vào bộ nhớ rồi ghi lại ra NamedTemporaryFile.
+
+    Args:
+        file: File upload
+
+    Returns:
+        File-like object (binary)
+
+    Raises:
+        ValueError: File vượt quá MAX_UPLOAD_SIZE_MB
+    """
+    stream = file.file
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+
+    if size > MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+        raise ValueError(f"File vượt quá dung lượng tối đa {MAX_UPLOAD_SIZE_MB} MB")
+
+    return stream
+
+
+def read_upload_dataframe(file: UploadFile) -> pd.DataFrame:
+    """
+    Đọc file upload CSV hoặc XLSX/XLS thành DataFrame trực tiếp từ stream
+
+    Args:
+        file: File upload (.csv, .xlsx, .xls)
+
+    Returns:
+        DataFrame dữ liệu
+    """
+    stream = upload_stream(file)
+    if file.filename.endswith(('.xlsx', '.xls')):
+        return pd.read_excel(stream)
+    return pd.read_csv(stream)
+
+
+def read_xlsx_indicators(file_path) -> Dict[str, float]:
+    """
+    Đọc file XLSX (3 sheets) và tính 14 chỉ số - không dùng trạng thái chung,
+    gọi qua asyncio.to_thread để nhiều upload được xử lý đồng thời
+
+    Args:
+        file_path: Đường dẫn hoặc stream file XLSX (xem upload_stream)
+
+    Returns:
+        Dict 14 chỉ số X_1 → X_14
+    """
+    statements = excel_processor.read_excel(file_path)
+    return excel_processor.calculate_14_indicators(statements)
+
+
+def extract_xlsx_from_zip(stream) -> List[tuple]:
+    """
+    Lấy các file XLSX/XLS từ file ZIP (bỏ qua thư mục, file ẩn, file tạm của Excel)
+
+    Args:
+        stream: Stream file ZIP (xem upload_stream)
+
+    Returns:
+        List (tên file, nội dung bytes) theo thứ tự trong ZIP
+    """
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise ValueError("File ZIP không hợp lệ")
+
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(('.xlsx', '.xls'))
+            and not os.path.basename(info.filename).startswith(('~$', '.'))
+            and not info.filename.startswith('__MACOSX/')
+        ]
+
+        if not members:
+            raise ValueError("File ZIP không chứa file XLSX/XLS nào")
+        if len(members) > XLSX_BATCH_MAX_FILES:
+            raise ValueError(f"File ZIP chứa {len(members)} file, tối đa {XLSX_BATCH_MAX_FILES} file")
+
+        total_size = sum(info.file_size for info in members)
+        if total_size > XLSX_BATCH_MAX_UNCOMPRESSED_MB * 1024 * 1024:
+            raise ValueError(f"Tổng dung lượng giải nén vượt quá {XLSX_BATCH_MAX_UNCOMPRESSED_MB} MB")
+
+        return [(info.filename, archive.read(info)) for info in members]
+
+
 # ================================================================================================
 # PYDANTIC MODELS
 # ================================================================================================
@@ -165,6 +320,20 @@ class PredictionInput(BaseModel):
     X_14: float
 
 
+class MetaModelTrainingInput(BaseModel):
+    """Model cho request huấn luyện lại meta-model"""
+    C: float = 1.0
+    class_weight: Optional[str] = None
+    threshold: Optional[float] = None
+
+
+class DistillationInput(BaseModel):
+    """Model cho request chưng cất mô hình student"""
+    n_estimators: int = 100
+    max_depth: int = 3
+    learning_rate: float = 0.1
+
+
 class GeminiAPIKeyRequest(BaseModel):
     """Model cho request set Gemini API key"""
     api_key: str
@@ -185,12 +354,19 @@ async def root():
 
 
 @app.post("/train")
-async def train_model(file: UploadFile = File(...)):
+async def train_model(
+    file: UploadFile = File(...),
+    mode: str = Form("full"),
+    n_new_trees: int = Form(50)
+):
     """
     Endpoint huấn luyện mô hình từ file CSV
 
     Args:
         file: File CSV chứa dữ liệu huấn luyện (phải có cột X_1 đến X_14 và cột 'default')
+        mode: "full" - huấn luyện lại từ đầu; "incremental" - nối cửa sổ dữ liệu mới và
+              warm-start (XGBoost boosting tiếp, RF thêm cây, chỉ fit lại meta-model)
+        n_new_trees: Số cây/vòng boosting thêm khi mode="incremental"
 
     Returns:
         Dict chứa thông tin huấn luyện và metrics
@@ -200,36 +376,81 @@ async def train_model(file: UploadFile = File(...)):
         if not file.filename.endswith('.csv'):
             raise HTTPException(status_code=400, detail="File phải có định dạng CSV")
 
-        # Lưu file tạm
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        if mode not in ("full", "incremental"):
+            raise HTTPException(status_code=400, detail="mode phải là 'full' hoặc 'incremental'")
+
+        # Huấn luyện tăng dần cần mô hình đã lưu
+        if mode == "incremental" and credit_model.model is None and os.path.exists("model_stacking.pkl"):
+            credit_model.load_model("model_stacking.pkl")
 
-        # Huấn luyện mô hình
-        result = credit_model.train(tmp_file_path)
+        # Huấn luyện mô hình (đọc CSV thẳng từ stream upload, không ghi file tạm)
+        stream = upload_stream(file)
+        if mode == "incremental":
+            result = credit_model.train_incremental(stream, n_new_trees=n_new_trees)
+        else:
+            result = credit_model.train(stream)
 
         # Lưu mô hình
         credit_model.save_model("model_stacking.pkl")
 
-        # Xóa file tạm
-        os.unlink(tmp_file_path)
-
-        return convert_to_json_serializable(result)
+        return FastJSONResponse(result)
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi khi huấn luyện mô hình: {str(e)}")
 
 
+@app.post("/train-meta")
+async def train_meta_model(input_data: MetaModelTrainingInput):
+    """
+    Endpoint huấn luyện lại chỉ meta-model trên OOF predictions đã lưu
+
+    Base models không được fit lại nên việc thử final_estimator/ngưỡng phân loại
+    chỉ mất vài giây thay vì toàn bộ thời gian huấn luyện.
+
+    Args:
+        input_data: Tham số meta LogisticRegression (C, class_weight) và ngưỡng phân loại
+
+    Returns:
+        Dict chứa metrics sau khi huấn luyện lại meta-model
+    """
+    try:
+        if credit_model.model is None and os.path.exists("model_stacking.pkl"):
+            credit_model.load_model("model_stacking.pkl")
+
+        result = credit_model.retrain_meta_model(
+            C=input_data.C,
+            class_weight=input_data.class_weight,
+            threshold=input_data.threshold
+        )
+
+        credit_model.save_model("model_stacking.pkl")
+
+        return FastJSONResponse(result)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi huấn luyện meta-model: {str(e)}")
+
+
 @app.post("/predict")
-async def predict(input_data: PredictionInput):
+async def predict(
+    input_data: PredictionInput,
+    fast: bool = False,
+    latency_budget_ms: Optional[float] = None
+):
     """
     Endpoint dự báo PD từ 14 chỉ số tài chính
 
     Args:
         input_data: Dict chứa 14 chỉ số X_1 đến X_14
+        fast: Query param - dùng mô hình student (chưng cất) thay cho Stacking
+        latency_budget_ms: Query param - ngân sách độ trễ; dùng student nếu độ trễ đo được
+                           của Stacking vượt ngân sách
 
     Returns:
         Dict chứa PD từ 4 models và kết quả dự đoán
@@ -246,14 +467,19 @@ async def predict(input_data: PredictionInput):
                     detail="Mô hình chưa được huấn luyện. Vui lòng upload file CSV để huấn luyện trước."
                 )
 
-        # Chuyển input thành DataFrame
-        input_dict = input_data.dict()
-        X_new = pd.DataFrame([input_dict])
+        # Chuyển input thành vector 14 chỉ số
+        X_new = FeatureVector.from_dict(input_data.dict())
+
+        # Chọn mô hình: student khi fast=true hoặc Stacking vượt ngân sách độ trễ
+        use_student = fast
+        if latency_budget_ms is not None and credit_model.student_model is not None:
+            teacher_latency = credit_model.distillation_report.get("teacher_latency_ms")
+            use_student = use_student or (teacher_latency is not None and teacher_latency > latency_budget_ms)
 
         # Dự báo
-        result = credit_model.predict(X_new)
+        result = credit_model.predict(X_new, fast=use_student)
 
-        return convert_to_json_serializable(result)
+        return FastJSONResponse(result)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -261,6 +487,37 @@ async def predict(input_data: PredictionInput):
         raise HTTPException(status_code=500, detail=f"Lỗi khi dự báo: {str(e)}")
 
 
+@app.post("/distill")
+async def distill_model(input_data: DistillationInput):
+    """
+    Endpoint chưng cất Stacking thành mô hình student gọn nhẹ cho /predict?fast=true
+
+    Args:
+        input_data: Siêu tham số của student (n_estimators, max_depth, learning_rate)
+
+    Returns:
+        Dict báo cáo chênh lệch AUC/calibration và độ trễ giữa Stacking và student
+    """
+    try:
+        if credit_model.model is None and os.path.exists("model_stacking.pkl"):
+            credit_model.load_model("model_stacking.pkl")
+
+        result = credit_model.distill_student(
+            n_estimators=input_data.n_estimators,
+            max_depth=input_data.max_depth,
+            learning_rate=input_data.learning_rate
+        )
+
+        credit_model.save_model("model_stacking.pkl")
+
+        return FastJSONResponse(result)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi chưng cất mô hình: {str(e)}")
+
+
 @app.post("/predict-from-xlsx")
 async def predict_from_xlsx(file: UploadFile = File(...)):
     """
@@ -288,46 +545,108 @@ async def predict_from_xlsx(file: UploadFile = File(...)):
                     detail="Mô hình chưa được huấn luyện. Vui lòng upload file CSV để huấn luyện trước."
                 )
 
-        # Lưu file tạm
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        # Đọc file XLSX và tính 14 chỉ số (trong thread riêng, đọc thẳng từ stream upload)
+        indicators = await asyncio.to_thread(read_xlsx_indicators, upload_stream(file))
+        indicators_with_names = excel_processor.get_indicators_with_names(indicators)
 
-        try:
-            # Đọc file XLSX
-            excel_processor.read_excel(tmp_file_path)
+        # Chuyển thành vector 14 chỉ số để dự báo
+        X_new = FeatureVector.from_dict(indicators)
+
+        # Dự báo PD
+        prediction_result = credit_model.predict(X_new)
+
+        # Trả về kết quả
+        response_data = {
+            "status": "success",
+            "indicators": indicators_with_names,
+            "indicators_dict": indicators,
+            "prediction": prediction_result
+        }
 
-            # Tính 14 chỉ số
-            indicators = excel_processor.calculate_14_indicators()
-            indicators_with_names = excel_processor.get_indicators_with_names()
+        return FastJSONResponse(response_data)
 
-            # Chuyển thành DataFrame để dự báo
-            X_new = pd.DataFrame([indicators])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi xử lý file XLSX: {str(e)}")
 
-            # Dự báo PD
-            prediction_result = credit_model.predict(X_new)
 
-            # Trả về kết quả
-            response_data = {
-                "status": "success",
-                "indicators": indicators_with_names,
-                "indicators_dict": indicators,
-                "prediction": prediction_result
-            }
+@app.post("/predict-from-xlsx-batch")
+async def predict_from_xlsx_batch(file: UploadFile = File(...), accept: Optional[str] = Header(None)):
+    """
+    Endpoint dự báo PD hàng loạt từ file ZIP chứa nhiều file XLSX (mỗi file 3 sheets: CDKT, BCTN, LCTT)
+    Các file được đọc song song trong process pool (mỗi process đọc và tính chỉ số độc lập),
+    sau đó dự báo PD cho tất cả DN trong một lần gọi mô hình
+
+    Args:
+        file: File ZIP chứa các file XLSX
+        accept: Header Accept - JSON (mặc định), application/x-ndjson, Arrow IPC hoặc MessagePack
+
+    Returns:
+        Dict chứa bảng 14 chỉ số + PD theo từng file (file lỗi được báo riêng, không làm hỏng cả lô)
+    """
+    try:
+        if not file.filename.lower().endswith('.zip'):
+            raise HTTPException(status_code=400, detail="File phải có định dạng ZIP")
+
+        # Kiểm tra mô hình đã được train chưa
+        if credit_model.model is None:
+            if os.path.exists("model_stacking.pkl"):
+                credit_model.load_model("model_stacking.pkl")
+            else:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Mô hình chưa được huấn luyện. Vui lòng upload file CSV để huấn luyện trước."
+                )
+
+        start_time = time.time()
+
+        # 1. Giải nén danh sách file XLSX
+        workbooks = extract_xlsx_from_zip(upload_stream(file))
+
+        # 2. Tính 14 chỉ số song song (không chặn event loop)
+        results = await asyncio.to_thread(
+            process_workbooks_parallel, workbooks, XLSX_BATCH_WORKERS or None
+        )
 
-            return convert_to_json_serializable(response_data)
-        finally:
-            # Xóa file tạm trong finally block để đảm bảo file luôn được xóa
+        # 3. Kiểm tra vector chỉ số từng file (lỗi của file nào chỉ đánh dấu file đó)
+        valid_results = []
+        for result in results:
+            if result['status'] != 'success':
+                continue
             try:
-                os.unlink(tmp_file_path)
-            except Exception:
-                pass  # Bỏ qua lỗi khi xóa file
+                FeatureVector.from_dict(result['indicators'])
+                valid_results.append(result)
+            except ValueError as e:
+                result['status'] = 'error'
+                result['error'] = str(e)
+
+        # 4. Dự báo PD cho tất cả file hợp lệ trong một lần gọi
+        if valid_results:
+            features = FeatureVector.from_records([result['indicators'] for result in valid_results])
+            predictions = credit_model.predict_batch(features)
+            for result, prediction in zip(valid_results, predictions):
+                result['prediction'] = prediction
+
+        num_success = sum(1 for result in results if result['status'] == 'success')
+
+        response_data = {
+            "status": "success",
+            "total_files": len(results),
+            "num_success": num_success,
+            "num_failed": len(results) - num_success,
+            "results": results,
+            "processing_time_seconds": round(time.time() - start_time, 2)
+        }
+
+        return negotiated_response(response_data, accept, table_key='results')
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Lỗi khi xử lý file XLSX: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi khi xử lý file ZIP: {str(e)}")
 
 
 @app.post("/analyze")
@@ -433,10 +752,13 @@ async def set_gemini_key(request: GeminiAPIKeyRequest):
 
 
 @app.post("/export-report")
+@no_compression  # File Word (docx) đã là ZIP
 async def export_report(report_data: Dict[str, Any]):
     """
     Endpoint xuất báo cáo Word
 
+    Biểu đồ render song song trên worker pool, ảnh và file docx chỉ nằm trong bộ nhớ.
+
     Args:
         report_data: Dict chứa prediction, indicators, và analysis
 
@@ -445,22 +767,81 @@ async def export_report(report_data: Dict[str, Any]):
     """
     try:
         # Tạo báo cáo
-        report_gen = ReportGenerator()
         output_path = f"bao_cao_tin_dung_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
-
-        report_path = report_gen.generate_report(report_data, output_path)
+        content = await render_report(report_data)
 
         # Trả về file
-        return FileResponse(
-            path=report_path,
-            media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            filename=output_path
+        return Response(
+            content=content,
+            media_type=DOCX_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{output_path}"'}
         )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi khi xuất báo cáo: {str(e)}")
 
 
+@app.post("/export-report-batch", status_code=202)
+async def export_report_batch(request_data: Dict[str, Any]):
+    """
+    Endpoint tạo job xuất báo cáo Word hàng loạt (chạy nền)
+
+    Args:
+        request_data: Dict chứa reports - list body như /export-report, thêm company_name
+            (tên file .docx trong ZIP)
+
+    Returns:
+        Dict trạng thái job (job_id để theo dõi qua /export-report-jobs/{job_id})
+    """
+    try:
+        reports = request_data.get('reports')
+        if not isinstance(reports, list):
+            raise ValueError("Thiếu danh sách reports")
+
+        return {"status": "success", "job": submit_batch_job(reports)}
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi tạo job xuất báo cáo: {str(e)}")
+
+
+@app.get("/export-report-jobs/{job_id}")
+async def get_export_report_job(job_id: str):
+    """
+    Endpoint xem tiến độ job xuất báo cáo hàng loạt
+
+    Returns:
+        Dict trạng thái job (pending/running/done/error, số báo cáo đã xong, lỗi từng báo cáo)
+    """
+    try:
+        return {"status": "success", "job": job_status(job_id)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job (hoặc job đã hết hạn)")
+
+
+@app.get("/export-report-jobs/{job_id}/download")
+async def download_export_report_job(job_id: str):
+    """
+    Endpoint tải file ZIP (mỗi doanh nghiệp 1 file .docx) của job đã xong
+
+    Returns:
+        File ZIP
+    """
+    try:
+        zip_path = job_zip_path(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job (hoặc job đã hết hạn)")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return FileResponse(
+        path=zip_path,
+        media_type="application/zip",
+        filename=f"bao_cao_tin_dung_{job_id[:8]}.zip"
+    )
+
+
 @app.post("/fetch-industry-data")
 async def fetch_industry_data(request_data: Dict[str, Any]):
     """
@@ -533,7 +914,8 @@ async def generate_charts(request_data: Dict[str, Any]):
         return {
             "status": "success",
             "charts_data": result.get("charts_data", []),
-            "brief_analysis": result.get("brief_analysis", "")
+            "brief_analysis": result.get("brief_analysis", ""),
+            "chart_templates_etag": CHART_TEMPLATES_ETAG
         }
 
     except ValueError as e:
@@ -616,112 +998,14 @@ async def analyze_pd_with_industry(request_data: Dict[str, Any]):
         # Phân tích PD kết hợp
         analysis = analyzer.analyze_pd_with_industry(indicators_dict, industry, industry_name)
 
-        # Tạo biểu đồ từ 14 chỉ số
-        charts_data = []
-
-        # Biểu đồ 1: Radar chart cho 4 nhóm chỉ số chính
-        charts_data.append({
-            "title": {"text": "Tổng quan 14 Chỉ số Tài chính", "left": "center"},
-            "tooltip": {},
-            "radar": {
-                "indicator": [
-                    {"name": "Sinh lời (X1-X4)", "max": 1},
-                    {"name": "Đòn bẩy (X5-X6)", "max": 5},
-                    {"name": "Thanh toán (X7-X8)", "max": 5},
-                    {"name": "Hiệu quả (X9-X14)", "max": 10}
-                ]
-            },
-            "series": [{
-                "type": "radar",
-                "data": [{
-                    "value": [
-                        (indicators_dict.get('X_1', 0) + indicators_dict.get('X_2', 0) +
-                         indicators_dict.get('X_3', 0) + indicators_dict.get('X_4', 0)) / 4,
-                        (indicators_dict.get('X_5', 0) + indicators_dict.get('X_6', 0)) / 2,
-                        (indicators_dict.get('X_7', 0) + indicators_dict.get('X_8', 0)) / 2,
-                        (indicators_dict.get('X_9', 0) + indicators_dict.get('X_10', 0) +
-                         indicators_dict.get('X_11', 0) + indicators_dict.get('X_12', 0) +
-                         indicators_dict.get('X_14', 0)) / 5
-                    ],
-                    "name": "Chỉ số doanh nghiệp",
-                    "areaStyle": {"color": "rgba(255, 107, 157, 0.3)"}
-                }]
-            }]
-        })
-
-        # Biểu đồ 2: Bar chart so sánh chỉ số sinh lời
-        charts_data.append({
-            "title": {"text": "Chỉ số Sinh lời (X1-X4)", "left": "center"},
-            "tooltip": {"trigger": "axis"},
-            "xAxis": {
-                "type": "category",
-                "data": ["Biên LN gộp (X1)", "Biên LN trước thuế (X2)", "ROA (X3)", "ROE (X4)"]
-            },
-            "yAxis": {"type": "value"},
-            "series": [{
-                "data": [
-                    indicators_dict.get('X_1', 0),
-                    indicators_dict.get('X_2', 0),
-                    indicators_dict.get('X_3', 0),
-                    indicators_dict.get('X_4', 0)
-                ],
-                "type": "bar",
-                "itemStyle": {"color": "#10B981"},
-                "label": {"show": True, "position": "top", "formatter": "{c}"}
-            }]
-        })
-
-        # Biểu đồ 3: Bar chart chỉ số thanh toán & đòn bẩy
-        charts_data.append({
-            "title": {"text": "Thanh toán & Đòn bẩy (X5-X8)", "left": "center"},
-            "tooltip": {"trigger": "axis"},
-            "xAxis": {
-                "type": "category",
-                "data": ["Nợ/TS (X5)", "Nợ/VCSH (X6)", "TT hiện hành (X7)", "TT nhanh (X8)"]
-            },
-            "yAxis": {"type": "value"},
-            "series": [{
-                "data": [
-                    indicators_dict.get('X_5', 0),
-                    indicators_dict.get('X_6', 0),
-                    indicators_dict.get('X_7', 0),
-                    indicators_dict.get('X_8', 0)
-                ],
-                "type": "bar",
-                "itemStyle": {"color": "#3B82F6"},
-                "label": {"show": True, "position": "top", "formatter": "{c}"}
-            }]
-        })
-
-        # Biểu đồ 4: Bar chart hiệu quả hoạt động
-        charts_data.append({
-            "title": {"text": "Hiệu quả Hoạt động (X9-X14)", "left": "center"},
-            "tooltip": {"trigger": "axis"},
-            "xAxis": {
-                "type": "category",
-                "data": ["Trả lãi (X9)", "Trả nợ gốc (X10)", "Tạo tiền (X11)",
-                         "Vòng quay HTK (X12)", "Kỳ thu tiền (X13)", "Hiệu suất TS (X14)"]
-            },
-            "yAxis": {"type": "value"},
-            "series": [{
-                "data": [
-                    indicators_dict.get('X_9', 0),
-                    indicators_dict.get('X_10', 0),
-                    indicators_dict.get('X_11', 0),
-                    indicators_dict.get('X_12', 0),
-                    indicators_dict.get('X_13', 0),
-                    indicators_dict.get('X_14', 0)
-                ],
-                "type": "bar",
-                "itemStyle": {"color": "#9C27B0"},
-                "label": {"show": True, "position": "top", "formatter": "{c}"}
-            }]
-        })
+        # Tạo biểu đồ từ 14 chỉ số (template dựng sẵn, chỉ gắn dữ liệu số)
+        charts_data = pd_indicator_charts(indicators_dict)
 
         return {
             "status": "success",
             "analysis": analysis,
-            "charts_data": charts_data
+            "charts_data": charts_data,
+            "chart_templates_etag": CHART_TEMPLATES_ETAG
         }
 
     except ValueError as e:
@@ -733,6 +1017,24 @@ async def analyze_pd_with_industry(request_data: Dict[str, Any]):
         raise HTTPException(status_code=500, detail=f"Lỗi khi phân tích PD kết hợp: {str(e)}")
 
 
+@app.get("/chart-templates")
+async def get_chart_templates(if_none_match: Optional[str] = Header(None)):
+    """
+    Endpoint lấy các template biểu đồ ECharts (cấu trúc tĩnh, cache được theo ETag)
+
+    Client lưu template và gửi lại ETag trong If-None-Match; template không đổi → 304 Not Modified.
+    /generate-charts và /analyze-pd-with-industry trả về chart_templates_etag để client so sánh.
+
+    Returns:
+        Dict chứa etag và templates (option + đường dẫn slot dữ liệu của từng biểu đồ)
+    """
+    headers = {"ETag": CHART_TEMPLATES_ETAG, "Cache-Control": "no-cache"}
+    if if_none_match and CHART_TEMPLATES_ETAG in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    return FastJSONResponse({"status": "success", **chart_templates_payload()}, headers=headers)
+
+
 @app.get("/model-info")
 async def get_model_info():
     """
@@ -763,46 +1065,128 @@ async def get_model_info():
         raise HTTPException(status_code=500, detail=f"Lỗi khi lấy thông tin mô hình: {str(e)}")
 
 
-@app.post("/chat-assistant")
-async def chat_assistant(data: Dict[str, Any]):
+@app.post("/tune-hyperparameters")
+async def tune_hyperparameters(
+    file: UploadFile = File(...),
+    family: str = Form(...),
+    n_candidates: int = Form(8),
+    eta: int = Form(2),
+    promote: bool = Form(True)
+):
     """
-    Endpoint chatbot - Trợ lý ảo trả lời câu hỏi về phân tích
+    Endpoint tìm kiếm siêu tham số song song (Successive Halving) cho một nhóm mô hình
 
     Args:
-        data: Dict chứa question, context, indicators, prediction
+        file: File CSV/XLSX chứa X_1 → X_14 + cột nhãn ('default' cho credit_risk, 'label' cho
+              early_warning/anomaly)
+        family: 'credit_risk', 'early_warning' hoặc 'anomaly'
+        n_candidates: Số cấu hình ở rung đầu tiên (2 → TUNING_MAX_CANDIDATES)
+        eta: Hệ số loại bỏ của Successive Halving
+        promote: Promote cấu hình tốt nhất vào model registry (áp dụng ở lần train tiếp theo)
 
     Returns:
-        Dict chứa answer từ Gemini
+        Dict chứa cấu hình tốt nhất, AUC validation so với baseline và thông tin các rung
     """
     try:
-        question = data.get('question', '')
-        context = data.get('context', '')
-        indicators = data.get('indicators', {})
-        prediction = data.get('prediction', {})
+        if not file.filename.endswith(('.xlsx', '.xls', '.csv')):
+            raise HTTPException(status_code=400, detail="File phải có định dạng XLSX, XLS hoặc CSV")
+        if not 2 <= n_candidates <= TUNING_MAX_CANDIDATES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"n_candidates phải nằm trong khoảng 2 → {TUNING_MAX_CANDIDATES}"
+            )
 
-        if not question:
-            raise HTTPException(status_code=400, detail="Thiếu câu hỏi (question)")
+        # Đọc file trực tiếp từ stream upload (không ghi file tạm)
+        df = read_upload_dataframe(file)
 
-        # Lấy Gemini analyzer
-        analyzer = get_gemini_analyzer()
+        result = hyperparameter_tuner.run_search(
+            family, df, n_candidates=n_candidates, eta=eta, promote=promote
+        )
 
-        # Tạo prompt cho chatbot
-        prompt = f"""
-Bạn là Trợ lý ảo chuyên nghiệp của Agribank, chuyên trả lời các câu hỏi về phân tích rủi ro tín dụng.
+        return FastJSONResponse(result)
 
-**BỐI CẢNH PHÂN TÍCH TRƯỚC ĐÓ:**
-{context}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi tìm kiếm siêu tham số: {str(e)}")
 
-**14 CHỈ SỐ TÀI CHÍNH:**
-{str(indicators)}
 
-**KẾT QUẢ DỰ BÁO PD:**
-{str(prediction)}
+@app.get("/tuning-trials")
+async def get_tuning_trials(family: Optional[str] = None, search_id: Optional[str] = None, limit: int = 200):
+    """
+    Endpoint đọc trial log của các lần tìm kiếm siêu tham số
 
-**CÂU HỎI CỦA NGƯỜI DÙNG:**
-{question}
+    Args:
+        family: Lọc theo nhóm mô hình
+        search_id: Lọc theo lần tìm kiếm
+        limit: Số trial gần nhất tối đa
 
-**YÊU CẦU TRẢ LỜI:**
+    Returns:
+        Dict chứa danh sách trials
+    """
+    try:
+        trials = hyperparameter_tuner.load_trials(family=family, search_id=search_id, limit=limit)
+        return FastJSONResponse({"status": "success", "count": len(trials), "trials": trials})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi đọc trial log: {str(e)}")
+
+
+@app.get("/model-registry")
+async def get_model_registry():
+    """
+    Endpoint xem cấu hình siêu tham số đã promote của từng nhóm mô hình
+
+    Returns:
+        Dict {family: record}
+    """
+    try:
+        return FastJSONResponse({"status": "success", "registry": load_registry()})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi đọc model registry: {str(e)}")
+
+
+@app.post("/chat-assistant")
+async def chat_assistant(data: Dict[str, Any]):
+    """
+    Endpoint chatbot - Trợ lý ảo trả lời câu hỏi về phân tích
+
+    Args:
+        data: Dict chứa question, context, indicators, prediction
+
+    Returns:
+        Dict chứa answer từ Gemini
+    """
+    try:
+        question = data.get('question', '')
+        context = data.get('context', '')
+        indicators = data.get('indicators', {})
+        prediction = data.get('prediction', {})
+
+        if not question:
+            raise HTTPException(status_code=400, detail="Thiếu câu hỏi (question)")
+
+        # Lấy Gemini analyzer
+        analyzer = get_gemini_analyzer()
+
+        # Tạo prompt cho chatbot
+        prompt = f"""
+Bạn là Trợ lý ảo chuyên nghiệp của Agribank, chuyên trả lời các câu hỏi về phân tích rủi ro tín dụng.
+
+**BỐI CẢNH PHÂN TÍCH TRƯỚC ĐÓ:**
+{context}
+
+**14 CHỈ SỐ TÀI CHÍNH:**
+{str(indicators)}
+
+**KẾT QUẢ DỰ BÁO PD:**
+{str(prediction)}
+
+**CÂU HỎI CỦA NGƯỜI DÙNG:**
+{question}
+
+**YÊU CẦU TRẢ LỜI:**
 - Trả lời ngắn gọn, chính xác, dễ hiểu (100-200 từ)
 - Dựa trên bối cảnh phân tích và dữ liệu đã có
 - Nếu câu hỏi liên quan đến chỉ số tài chính, giải thích rõ ràng
@@ -882,21 +1266,8 @@ async def simulate_scenario(
             if not file.filename.endswith(('.xlsx', '.xls')):
                 raise HTTPException(status_code=400, detail="File phải có định dạng XLSX hoặc XLS")
 
-            # Lưu file tạm
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-                content = await file.read()
-                tmp_file.write(content)
-                tmp_file_path = tmp_file.name
-
-            try:
-                # Đọc file XLSX và tính 14 chỉ số
-                excel_processor.read_excel(tmp_file_path)
-                indicators_before = excel_processor.calculate_14_indicators()
-            finally:
-                try:
-                    os.unlink(tmp_file_path)
-                except Exception:
-                    pass
+            # Đọc file XLSX và tính 14 chỉ số
+            indicators_before = await asyncio.to_thread(read_xlsx_indicators, upload_stream(file))
 
         elif indicators_json:
             # Trường hợp 2: Sử dụng dữ liệu từ Tab Dự báo PD
@@ -959,11 +1330,11 @@ async def simulate_scenario(
 
         # 4. DỰ BÁO PD TRƯỚC VÀ SAU
         # Dự báo PD trước khi áp kịch bản
-        X_before = pd.DataFrame([indicators_before])
+        X_before = FeatureVector.from_dict(indicators_before)
         prediction_before = credit_model.predict(X_before)
 
         # Dự báo PD sau khi áp kịch bản
-        X_after = pd.DataFrame([indicators_after])
+        X_after = FeatureVector.from_dict(indicators_after)
         prediction_after = credit_model.predict(X_after)
 
         # 5. TÍNH % THAY ĐỔI PD
@@ -1121,21 +1492,8 @@ async def simulate_scenario_macro(
             if not file.filename.endswith(('.xlsx', '.xls')):
                 raise HTTPException(status_code=400, detail="File phải có định dạng XLSX hoặc XLS")
 
-            # Lưu file tạm
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-                content = await file.read()
-                tmp_file.write(content)
-                tmp_file_path = tmp_file.name
-
-            try:
-                # Đọc file XLSX và tính 14 chỉ số
-                excel_processor.read_excel(tmp_file_path)
-                indicators_before = excel_processor.calculate_14_indicators()
-            finally:
-                try:
-                    os.unlink(tmp_file_path)
-                except Exception:
-                    pass
+            # Đọc file XLSX và tính 14 chỉ số
+            indicators_before = await asyncio.to_thread(read_xlsx_indicators, upload_stream(file))
 
         elif indicators_json:
             # Trường hợp 2: Sử dụng dữ liệu từ Tab Dự báo PD
@@ -1213,11 +1571,11 @@ async def simulate_scenario_macro(
 
         # 5. DỰ BÁO PD TRƯỚC VÀ SAU
         # Dự báo PD trước khi áp kịch bản
-        X_before = pd.DataFrame([indicators_before])
+        X_before = FeatureVector.from_dict(indicators_before)
         prediction_before = credit_model.predict(X_before)
 
         # Dự báo PD sau khi áp kịch bản
-        X_after = pd.DataFrame([indicators_after])
+        X_after = FeatureVector.from_dict(indicators_after)
         prediction_after = credit_model.predict(X_after)
 
         # 6. TÍNH % THAY ĐỔI PD
@@ -1428,47 +1786,29 @@ async def train_early_warning_model(file: UploadFile = File(...)):
                 detail="File phải có định dạng XLSX, XLS hoặc CSV"
             )
 
-        # Lưu file tạm
-        suffix = '.xlsx' if file.filename.endswith(('.xlsx', '.xls')) else '.csv'
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
-
-        try:
-            # Đọc file
-            if suffix == '.csv':
-                df = pd.read_csv(tmp_file_path)
-            else:
-                df = pd.read_excel(tmp_file_path)
+        # Đọc file trực tiếp từ stream upload (không ghi file tạm)
+        df = read_upload_dataframe(file)
 
-            # Kiểm tra các cột cần thiết
-            required_cols = [f'X_{i}' for i in range(1, 15)] + ['label']
-            missing_cols = [col for col in required_cols if col not in df.columns]
+        # Kiểm tra các cột cần thiết
+        required_cols = [f'X_{i}' for i in range(1, 15)] + ['label']
+        missing_cols = [col for col in required_cols if col not in df.columns]
 
-            if missing_cols:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File thiếu các cột: {', '.join(missing_cols)}"
-                )
-
-            # Train Early Warning System
-            result = early_warning_system.train_models(df)
+        if missing_cols:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File thiếu các cột: {', '.join(missing_cols)}"
+            )
 
-            response_data = {
-                "status": "success",
-                "message": "Early Warning System trained successfully!",
-                **result
-            }
+        # Train Early Warning System
+        result = early_warning_system.train_models(df)
 
-            return convert_to_json_serializable(response_data)
+        response_data = {
+            "status": "success",
+            "message": "Early Warning System trained successfully!",
+            **result
+        }
 
-        finally:
-            # Xóa file tạm
-            try:
-                os.unlink(tmp_file_path)
-            except Exception:
-                pass
+        return FastJSONResponse(response_data)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1532,21 +1872,8 @@ async def early_warning_check(
             if not file.filename.endswith(('.xlsx', '.xls')):
                 raise HTTPException(status_code=400, detail="File phải có định dạng XLSX hoặc XLS")
 
-            # Lưu file tạm
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-                content = await file.read()
-                tmp_file.write(content)
-                tmp_file_path = tmp_file.name
-
-            try:
-                # Đọc file XLSX và tính 14 chỉ số
-                excel_processor.read_excel(tmp_file_path)
-                indicators = excel_processor.calculate_14_indicators()
-            finally:
-                try:
-                    os.unlink(tmp_file_path)
-                except Exception:
-                    pass
+            # Đọc file XLSX và tính 14 chỉ số
+            indicators = await asyncio.to_thread(read_xlsx_indicators, upload_stream(file))
 
         elif indicators_json:
             # Trường hợp 2: Sử dụng dữ liệu từ Tab Dự báo PD
@@ -1557,42 +1884,26 @@ async def early_warning_check(
                 detail="Vui lòng cung cấp file XLSX hoặc dữ liệu từ Tab Dự báo PD"
             )
 
+        # Vector 14 chỉ số dùng chung cho mọi bước bên dưới
+        features = FeatureVector.from_dict(indicators)
+
         # 2. TÍNH HEALTH SCORE
-        health_score = early_warning_system.calculate_health_score(indicators)
+        health_score = early_warning_system.calculate_health_score(features)
 
         # 3. PHÂN LOẠI MỨC RỦI RO
         risk_info = early_warning_system.classify_risk_level(health_score)
 
         # 4. TÍNH PD HIỆN TẠI (sử dụng early_warning_system.stacking_model)
-        feature_cols = [f'X_{i}' for i in range(1, 15)]
-        X_current = [[indicators[col] for col in feature_cols]]
-        current_pd = early_warning_system.stacking_model.predict_proba(X_current)[0, 1] * 100
+        current_pd = early_warning_system.stacking_model.predict_proba(features.values)[0, 1] * 100
 
         # 5. PHÁT HIỆN ĐIỂM YẾU
-        weaknesses = early_warning_system.detect_weaknesses(indicators)
+        weaknesses = early_warning_system.detect_weaknesses(features)
 
         # 6. XÁC ĐỊNH VỊ TRÍ CLUSTER
-        cluster_info = early_warning_system.get_cluster_position(indicators)
+        cluster_info = early_warning_system.get_cluster_position(features)
 
         # 7. DỰ BÁO PD TƯƠNG LAI (3/6/12 tháng x 3 kịch bản)
-        scenarios = ['recession_mild', 'recession_moderate', 'crisis']
-        time_periods = [3, 6, 12]
-
-        pd_projection = {
-            'current': current_pd
-        }
-
-        for scenario in scenarios:
-            pd_projection[scenario] = {}
-            for months in time_periods:
-                pd_future = early_warning_system.project_future_pd(
-                    indicators=indicators,
-                    months=months,
-                    scenario=scenario,
-                    excel_processor=excel_processor,
-                    industry_code=industry_code
-                )
-                pd_projection[scenario][f'{months}_months'] = pd_future
+        pd_projection = project_pd_scenarios(indicators, current_pd, industry_code)
 
         # 8. TẠO BÁO CÁO CHẨN ĐOÁN BẰNG GEMINI AI
         gemini_diagnosis = early_warning_system.generate_gemini_diagnosis(
@@ -1623,7 +1934,7 @@ async def early_warning_check(
             "indicators": indicators  # Thêm 14 chỉ số để frontend có thể vẽ biểu đồ radar
         }
 
-        return convert_to_json_serializable(response_data)
+        return FastJSONResponse(response_data)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1653,47 +1964,29 @@ async def train_anomaly_model(file: UploadFile = File(...)):
                 detail="File phải có định dạng XLSX, XLS hoặc CSV"
             )
 
-        # Lưu file tạm
-        suffix = '.xlsx' if file.filename.endswith(('.xlsx', '.xls')) else '.csv'
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        # Đọc file trực tiếp từ stream upload (không ghi file tạm)
+        df = read_upload_dataframe(file)
 
-        try:
-            # Đọc file
-            if suffix == '.csv':
-                df = pd.read_csv(tmp_file_path)
-            else:
-                df = pd.read_excel(tmp_file_path)
+        # Kiểm tra các cột cần thiết
+        required_cols = [f'X_{i}' for i in range(1, 15)] + ['label']
+        missing_cols = [col for col in required_cols if col not in df.columns]
 
-            # Kiểm tra các cột cần thiết
-            required_cols = [f'X_{i}' for i in range(1, 15)] + ['label']
-            missing_cols = [col for col in required_cols if col not in df.columns]
-
-            if missing_cols:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File thiếu các cột: {', '.join(missing_cols)}"
-                )
-
-            # Train Anomaly Detection System
-            result = anomaly_system.train_model(df)
+        if missing_cols:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File thiếu các cột: {', '.join(missing_cols)}"
+            )
 
-            response_data = {
-                "status": "success",
-                "message": "Anomaly Detection System trained successfully!",
-                **result
-            }
+        # Train Anomaly Detection System
+        result = anomaly_system.train_model(df)
 
-            return convert_to_json_serializable(response_data)
+        response_data = {
+            "status": "success",
+            "message": "Anomaly Detection System trained successfully!",
+            **result
+        }
 
-        finally:
-            # Xóa file tạm
-            try:
-                os.unlink(tmp_file_path)
-            except Exception:
-                pass
+        return FastJSONResponse(response_data)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1721,6 +2014,7 @@ async def check_anomaly(
         - anomaly_type: Loại bất thường
         - gemini_explanation: Giải thích từ Gemini AI
         - comparison_with_healthy: So sánh với DN khỏe mạnh
+        - healthy_peers: k DN khỏe mạnh tương đồng nhất + Local Outlier Score
     """
     try:
         import json
@@ -1740,21 +2034,8 @@ async def check_anomaly(
             if not file.filename.endswith(('.xlsx', '.xls')):
                 raise HTTPException(status_code=400, detail="File phải có định dạng XLSX hoặc XLS")
 
-            # Lưu file tạm
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-                content = await file.read()
-                tmp_file.write(content)
-                tmp_file_path = tmp_file.name
-
-            try:
-                # Đọc file XLSX và tính 14 chỉ số
-                excel_processor.read_excel(tmp_file_path)
-                indicators = excel_processor.calculate_14_indicators()
-            finally:
-                try:
-                    os.unlink(tmp_file_path)
-                except Exception:
-                    pass
+            # Đọc file XLSX và tính 14 chỉ số
+            indicators = await asyncio.to_thread(read_xlsx_indicators, upload_stream(file))
 
         elif indicators_json:
             # Trường hợp 2: Sử dụng dữ liệu từ Tab Dự báo PD
@@ -1765,28 +2046,20 @@ async def check_anomaly(
                 detail="Vui lòng cung cấp file XLSX hoặc dữ liệu từ Tab Dự báo PD"
             )
 
+        # Vector 14 chỉ số dùng chung cho mọi bước bên dưới
+        features = FeatureVector.from_dict(indicators)
+
         # 2. TÍNH ANOMALY SCORE
-        anomaly_score = anomaly_system.calculate_anomaly_score(indicators)
+        anomaly_score = anomaly_system.calculate_anomaly_score(features)
 
         # 3. PHÁT HIỆN CÁC FEATURES BẤT THƯỜNG
-        abnormal_features = anomaly_system.detect_abnormal_features(indicators)
+        abnormal_features = anomaly_system.detect_abnormal_features(features)
 
         # 4. PHÂN LOẠI LOẠI BẤT THƯỜNG
-        anomaly_type = anomaly_system.classify_anomaly_type(indicators, abnormal_features)
+        anomaly_type = anomaly_system.classify_anomaly_type(features, abnormal_features)
 
         # 5. XÁC ĐỊNH MỨC RỦI RO
-        if anomaly_score < 60:
-            risk_level = "Bình thường"
-            risk_level_color = "#10B981"
-            risk_level_icon = "⚠️"
-        elif anomaly_score < 80:
-            risk_level = "Bất thường Trung bình"
-            risk_level_color = "#F59E0B"
-            risk_level_icon = "🔶"
-        else:
-            risk_level = "Bất thường Cao"
-            risk_level_color = "#EF4444"
-            risk_level_icon = "🔴"
+        risk = classify_anomaly_risk(anomaly_score)
 
         # 6. TẠO GIẢI THÍCH BẰNG GEMINI AI
         gemini_explanation = anomaly_system.generate_gemini_explanation(
@@ -1806,21 +2079,24 @@ async def check_anomaly(
                 'healthy_mean': anomaly_system.healthy_stats[feature]['mean']
             })
 
-        # 8. TRẢ VỀ KẾT QUẢ
+        # 8. TÌM K DN KHỎE MẠNH TƯƠNG ĐỒNG NHẤT (KD-TREE) + LOCAL OUTLIER SCORE
+        healthy_peers = anomaly_system.find_healthy_peers(features)
+
+        # 9. TRẢ VỀ KẾT QUẢ
         response_data = {
             "status": "success",
             "anomaly_score": anomaly_score,
-            "risk_level": risk_level,
-            "risk_level_color": risk_level_color,
-            "risk_level_icon": risk_level_icon,
+            **risk,
+            "risk_cutoffs": anomaly_risk_cutoffs(),
             "abnormal_features": abnormal_features,
             "anomaly_type": anomaly_type,
             "gemini_explanation": gemini_explanation,
             "comparison_with_healthy": comparison_with_healthy,
+            "healthy_peers": healthy_peers,
             "indicators": indicators
         }
 
-        return convert_to_json_serializable(response_data)
+        return FastJSONResponse(response_data)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1828,15 +2104,156 @@ async def check_anomaly(
         raise HTTPException(status_code=500, detail=f"Lỗi khi kiểm tra bất thường: {str(e)}")
 
 
+@app.post("/check-anomaly-batch")
+async def check_anomaly_batch(
+    file: Optional[UploadFile] = File(None),
+    indicators_json: Optional[str] = Form(None),
+    accept: Optional[str] = Header(None)
+):
+    """
+    Endpoint sàng lọc bất thường cho cả danh mục DN (không gọi Gemini)
+    Toàn bộ danh mục được chấm điểm trong một lần gọi Isolation Forest
+
+    Args:
+        file: File CSV/XLSX mỗi dòng 1 DN với 14 cột X_1 → X_14 - Optional
+        indicators_json: JSON string list các dict 14 chỉ số - Optional
+        accept: Header Accept - JSON (mặc định), application/x-ndjson, Arrow IPC hoặc MessagePack
+
+    Returns:
+        Dict chứa:
+        - results: Anomaly Score, mức rủi ro, loại bất thường, chỉ số vượt ngưỡng của từng DN
+        - summary: Số DN theo mức rủi ro
+    """
+    try:
+        import json
+
+        # Kiểm tra Anomaly Detection System đã được train chưa
+        if anomaly_system.model is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Anomaly Detection System chưa được train. Vui lòng upload file training data trước."
+            )
+
+        start_time = time.time()
+
+        # 1. LẤY MA TRẬN 14 CHỈ SỐ
+        if file:
+            if not file.filename.endswith(('.xlsx', '.xls', '.csv')):
+                raise HTTPException(status_code=400, detail="File phải có định dạng XLSX, XLS hoặc CSV")
+            features = FeatureVector.from_frame(read_upload_dataframe(file))
+        elif indicators_json:
+            records = json.loads(indicators_json)
+            if not isinstance(records, list):
+                raise HTTPException(status_code=400, detail="indicators_json phải là list các dict 14 chỉ số")
+            features = FeatureVector.from_records(records)
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail="Vui lòng cung cấp file danh mục DN hoặc indicators_json"
+            )
+
+        if len(features) == 0:
+            raise HTTPException(status_code=400, detail="Danh mục không có DN nào")
+
+        # 2. CHẤM ĐIỂM + SO NGƯỠNG P5/P95 CHO CẢ DANH MỤC
+        results = anomaly_system.check_batch(features)
+
+        # 3. XÁC ĐỊNH MỨC RỦI RO
+        summary = {}
+        for i, result in enumerate(results):
+            risk = classify_anomaly_risk(result['anomaly_score'])
+            result.update({"row": i, **risk})
+            summary[risk['risk_level']] = summary.get(risk['risk_level'], 0) + 1
+
+        response_data = {
+            "status": "success",
+            "num_companies": len(results),
+            "summary": summary,
+            "risk_cutoffs": anomaly_risk_cutoffs(),
+            "results": results,
+            "processing_time_seconds": round(time.time() - start_time, 2)
+        }
+
+        return negotiated_response(response_data, accept, table_key='results')
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi sàng lọc bất thường: {str(e)}")
+
+
+@app.post("/observe-anomaly")
+async def observe_anomaly(
+    indicators_json: str = Form(...),
+    label: Optional[int] = Form(None)
+):
+    """
+    Endpoint chế độ online: chấm điểm 1 báo cáo mới và cập nhật ngưỡng P5-P95 tăng dần
+    Isolation Forest được fit lại nền trên cửa sổ trượt, không cần upload lại file training
+
+    Args:
+        indicators_json: JSON string chứa 14 chỉ số của DN
+        label: 0 = đã xác nhận khỏe mạnh, 1 = đã biết vỡ nợ (chỉ chấm điểm, không cập nhật ngưỡng) - Optional
+            Không gán nhãn: chỉ cập nhật ngưỡng nếu DN dưới mức Bất thường Cao
+
+    Returns:
+        Dict chứa anomaly_score, mức rủi ro, các chỉ số bất thường và trạng thái online
+    """
+    try:
+        import json
+
+        if anomaly_system.model is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Anomaly Detection System chưa được train. Vui lòng upload file training data trước."
+            )
+
+        features = FeatureVector.from_dict(json.loads(indicators_json))
+        result = anomaly_system.observe(features, label=label)
+
+        response_data = {
+            "status": "success",
+            **result,
+            **classify_anomaly_risk(result['anomaly_score']),
+            "risk_cutoffs": anomaly_risk_cutoffs(),
+            "online_status": anomaly_system.online_status()
+        }
+
+        return FastJSONResponse(response_data)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi cập nhật bất thường online: {str(e)}")
+
+
+@app.get("/anomaly-online-status")
+async def get_anomaly_online_status():
+    """
+    Endpoint xem trạng thái chế độ online của Anomaly Detection System
+
+    Returns:
+        Dict chứa kích thước cửa sổ trượt, số quan sát, số lần fit lại và ngưỡng hiện tại
+    """
+    return FastJSONResponse({
+        "status": "success",
+        **anomaly_system.online_status()
+    })
+
+
 # ================================================================================================
 # SURVIVAL ANALYSIS ENDPOINTS
 # ================================================================================================
 
 @app.post("/train-survival")
-async def train_survival_models(file: UploadFile = File(...)):
+async def train_survival_models(file: UploadFile = File(...), accept: Optional[str] = Header(None)):
     """
     Huấn luyện Survival Analysis Models (Cox PH + Random Survival Forest)
-    Chạy tuần tự 2 mô hình để đảm bảo ổn định
+    Chạy song song 2 mô hình trong 2 process riêng, ghép kết quả rồi lưu một lần
 
     Input: CSV/Excel file với cột:
     - X_1 đến X_14: 14 chỉ số tài chính
@@ -1847,197 +2264,161 @@ async def train_survival_models(file: UploadFile = File(...)):
     - Training metrics (C-index, log-likelihood)
     - Kaplan-Meier baseline survival function (downsampled để giảm kích thước)
     - Hazard ratios
+
+    Định dạng theo header Accept: JSON (mặc định), application/x-ndjson, Arrow IPC hoặc MessagePack
+    (bảng dữ liệu = Kaplan-Meier baseline)
     """
     print("\n" + "="*80)
     print("🚀 [SURVIVAL TRAINING] Bắt đầu huấn luyện Cox PH & RSF models...")
     print("="*80)
 
-    tmp_file_path = None
-
     try:
-        # 1. LƯU FILE TẠM THỜI
-        print("📁 [SURVIVAL TRAINING] Đang lưu file tạm thời...")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp_file:
-            tmp_file.write(await file.read())
-            tmp_file_path = tmp_file.name
-        print(f"✅ [SURVIVAL TRAINING] Đã lưu file: {tmp_file_path}")
-
-        try:
-            # 2. ĐỌC DỮ LIỆU
-            print("📊 [SURVIVAL TRAINING] Đang đọc dữ liệu...")
-            if file.filename.endswith('.csv'):
-                df = pd.read_csv(tmp_file_path)
-            elif file.filename.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(tmp_file_path)
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail="File phải là định dạng CSV hoặc Excel (.xlsx, .xls)"
-                )
-
-            print(f"✅ [SURVIVAL TRAINING] Đã đọc {len(df)} dòng dữ liệu")
-
-            # 3. KIỂM TRA CỘT CẦN THIẾT
-            print("🔍 [SURVIVAL TRAINING] Đang kiểm tra các cột dữ liệu...")
-            required_features = [f'X_{i}' for i in range(1, 15)]
-            required_cols = required_features + ['months_to_default']
-
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            if missing_cols:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Thiếu các cột: {', '.join(missing_cols)}"
-                )
+        # 1. KIỂM TRA FILE UPLOAD (đọc thẳng từ stream, không ghi file tạm)
+        stream = upload_stream(file)
+
+        # 2. ĐỌC DỮ LIỆU
+        print("📊 [SURVIVAL TRAINING] Đang đọc dữ liệu...")
+        if file.filename.endswith('.csv'):
+            df = pd.read_csv(stream)
+        elif file.filename.endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(stream)
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail="File phải là định dạng CSV hoặc Excel (.xlsx, .xls)"
+            )
 
-            # Nếu không có cột 'event', tự động tạo (giả định tất cả đều vỡ nợ)
-            if 'event' not in df.columns:
-                df['event'] = 1
-                print("⚠️  [SURVIVAL TRAINING] Không tìm thấy cột 'event', tạo tự động (all events = 1)")
+        print(f"✅ [SURVIVAL TRAINING] Đã đọc {len(df)} dòng dữ liệu")
 
-            print(f"✅ [SURVIVAL TRAINING] Validation hoàn tất. Events: {int(df['event'].sum())}, Censored: {int((1-df['event']).sum())}")
+        # 3. KIỂM TRA CỘT CẦN THIẾT
+        print("🔍 [SURVIVAL TRAINING] Đang kiểm tra các cột dữ liệu...")
+        required_features = [f'X_{i}' for i in range(1, 15)]
+        required_cols = required_features + ['months_to_default']
 
-            # 4. HUẤN LUYỆN TUẦN TỰ (SEQUENTIAL) - ĐƠN GIẢN VÀ ỔN ĐỊNH HƠN
-            print("\n⚡ [SURVIVAL TRAINING] Đang huấn luyện lần lượt Cox PH và RSF models...")
-            cox_result = None
-            rsf_result = None
-            training_errors = []
+        missing_cols = [col for col in required_cols if col not in df.columns]
+        if missing_cols:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Thiếu các cột: {', '.join(missing_cols)}"
+            )
 
-            # 4.1. TRAIN COX PH MODEL TRƯỚC
+        # Nếu không có cột 'event', tự động tạo (giả định tất cả đều vỡ nợ)
+        if 'event' not in df.columns:
+            df['event'] = 1
+            print("⚠️  [SURVIVAL TRAINING] Không tìm thấy cột 'event', tạo tự động (all events = 1)")
+
+        print(f"✅ [SURVIVAL TRAINING] Validation hoàn tất. Events: {int(df['event'].sum())}, Censored: {int((1-df['event']).sum())}")
+
+        # 4. HUẤN LUYỆN SONG SONG COX PH VÀ RSF (2 process riêng biệt)
+        print("\n⚡ [SURVIVAL TRAINING] Đang huấn luyện song song Cox PH và RSF models...")
+        parallel_result = survival_system.train_models_parallel(
+            df,
+            duration_col='months_to_default',
+            event_col='event',
+            n_estimators=100,
+            low_memory=SURVIVAL_LOW_MEMORY
+        )
+        cox_result = parallel_result['cox_result']
+        rsf_result = parallel_result['rsf_result']
+        training_errors = parallel_result['training_errors']
+
+        for err in training_errors:
+            print(f"❌ [{err['model']}] Lỗi: {err['error']}")
+
+        print("\n" + "="*80)
+        print(f"📊 [SURVIVAL TRAINING] Kết quả huấn luyện song song ({parallel_result['wall_time_seconds']:.2f}s):")
+        print(f"   - Cox PH: {'✅ Thành công' if cox_result else '❌ Thất bại'}")
+        print(f"   - RSF: {'✅ Thành công' if rsf_result else '❌ Thất bại'}")
+        print("="*80)
+
+        # 6. TÍNH KAPLAN-MEIER BASELINE (chỉ khi có ít nhất 1 model thành công)
+        km_result = None
+        if cox_result or rsf_result:
             try:
-                print("🔄 [COX MODEL - 1/2] Bắt đầu huấn luyện Cox Proportional Hazards Model...")
-                cox_result = survival_system.train_cox_model(
+                print("📈 [SURVIVAL TRAINING] Đang tính Kaplan-Meier baseline...")
+                km_result = survival_system.calculate_kaplan_meier(
                     df,
                     duration_col='months_to_default',
                     event_col='event'
                 )
-                print(f"✅ [COX MODEL - 1/2] Hoàn thành! C-index: {cox_result['c_index']:.4f}")
+
+                # Downsample KM data để giảm kích thước response
+                if km_result and 'timeline' in km_result:
+                    original_points = len(km_result.get('timeline', []))
+                    km_result = downsample_kaplan_meier(km_result, max_points=100)
+                    print(f"✅ [SURVIVAL TRAINING] Kaplan-Meier baseline đã tính xong ({original_points} → {len(km_result.get('timeline', []))} điểm)")
+                else:
+                    print("✅ [SURVIVAL TRAINING] Kaplan-Meier baseline đã tính xong")
             except Exception as e:
-                print(f"❌ [COX MODEL - 1/2] Lỗi: {str(e)}")
-                training_errors.append({
-                    "model": "Cox PH",
-                    "error": str(e)
-                })
+                print(f"⚠️  [SURVIVAL TRAINING] Không thể tính Kaplan-Meier: {str(e)}")
+                km_result = {"error": str(e)}
 
-            # 4.2. TRAIN RSF MODEL SAU
+        # 7. LẤY HAZARD RATIOS (chỉ khi Cox model thành công)
+        hazard_ratios = None
+        if cox_result:
             try:
-                print("🔄 [RSF MODEL - 2/2] Bắt đầu huấn luyện Random Survival Forest Model...")
-                rsf_result = survival_system.train_random_survival_forest(
-                    df,
-                    duration_col='months_to_default',
-                    event_col='event',
-                    n_estimators=100
-                )
-                print(f"✅ [RSF MODEL - 2/2] Hoàn thành! C-index: {rsf_result['c_index']:.4f}")
+                print("📊 [SURVIVAL TRAINING] Đang tính hazard ratios...")
+                hazard_ratios = survival_system.get_hazard_ratios(top_k=14)
+                print(f"✅ [SURVIVAL TRAINING] Đã tính {len(hazard_ratios)} hazard ratios")
             except Exception as e:
-                print(f"❌ [RSF MODEL - 2/2] Lỗi: {str(e)}")
-                training_errors.append({
-                    "model": "RSF",
-                    "error": str(e)
-                })
+                print(f"⚠️  [SURVIVAL TRAINING] Không thể tính hazard ratios: {str(e)}")
+                hazard_ratios = []
 
-            print("\n" + "="*80)
-            print("📊 [SURVIVAL TRAINING] Kết quả huấn luyện tuần tự:")
-            print(f"   - Cox PH: {'✅ Thành công' if cox_result else '❌ Thất bại'}")
-            print(f"   - RSF: {'✅ Thành công' if rsf_result else '❌ Thất bại'}")
-            print("="*80)
-
-            # 6. TÍNH KAPLAN-MEIER BASELINE (chỉ khi có ít nhất 1 model thành công)
-            km_result = None
-            if cox_result or rsf_result:
-                try:
-                    print("📈 [SURVIVAL TRAINING] Đang tính Kaplan-Meier baseline...")
-                    km_result = survival_system.calculate_kaplan_meier(
-                        df,
-                        duration_col='months_to_default',
-                        event_col='event'
-                    )
-
-                    # Downsample KM data để giảm kích thước response
-                    if km_result and 'timeline' in km_result:
-                        original_points = len(km_result.get('timeline', []))
-                        km_result = downsample_kaplan_meier(km_result, max_points=100)
-                        print(f"✅ [SURVIVAL TRAINING] Kaplan-Meier baseline đã tính xong ({original_points} → {len(km_result.get('timeline', []))} điểm)")
-                    else:
-                        print("✅ [SURVIVAL TRAINING] Kaplan-Meier baseline đã tính xong")
-                except Exception as e:
-                    print(f"⚠️  [SURVIVAL TRAINING] Không thể tính Kaplan-Meier: {str(e)}")
-                    km_result = {"error": str(e)}
-
-            # 7. LẤY HAZARD RATIOS (chỉ khi Cox model thành công)
-            hazard_ratios = None
-            if cox_result:
-                try:
-                    print("📊 [SURVIVAL TRAINING] Đang tính hazard ratios...")
-                    hazard_ratios = survival_system.get_hazard_ratios(top_k=14)
-                    print(f"✅ [SURVIVAL TRAINING] Đã tính {len(hazard_ratios)} hazard ratios")
-                except Exception as e:
-                    print(f"⚠️  [SURVIVAL TRAINING] Không thể tính hazard ratios: {str(e)}")
-                    hazard_ratios = []
-
-            # 8. LƯU MODELS (chỉ khi có ít nhất 1 model thành công)
-            if cox_result or rsf_result:
-                try:
-                    print("💾 [SURVIVAL TRAINING] Đang lưu models...")
-                    survival_system.save_models('survival_models.pkl')
-                    print("✅ [SURVIVAL TRAINING] Models đã được lưu vào survival_models.pkl")
-                except Exception as e:
-                    print(f"⚠️  [SURVIVAL TRAINING] Không thể lưu models: {str(e)}")
-
-            # 9. TRẢ VỀ KẾT QUẢ (JSON SERIALIZABLE)
-            print("\n" + "="*80)
-            print("🎉 [SURVIVAL TRAINING] Hoàn thành quá trình training!")
-            print("="*80 + "\n")
-
-            # Kiểm tra xem có ít nhất 1 model thành công không
-            if not cox_result and not rsf_result:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Cả 2 models đều thất bại. Errors: {training_errors}"
-                )
+        # 8. LƯU MODELS (chỉ khi có ít nhất 1 model thành công)
+        if cox_result or rsf_result:
+            try:
+                print("💾 [SURVIVAL TRAINING] Đang lưu models...")
+                save_result = survival_system.save_models('survival_models.pkl', low_memory=SURVIVAL_LOW_MEMORY)
+                print("✅ [SURVIVAL TRAINING] Models đã được lưu vào survival_models.pkl")
+                if 'memory_report' in save_result:
+                    print(f"💾 [SURVIVAL TRAINING] Artifact gọn: {save_result['memory_report']}")
+            except Exception as e:
+                print(f"⚠️  [SURVIVAL TRAINING] Không thể lưu models: {str(e)}")
 
-            # Tạo response data và convert sang JSON serializable types
-            response_data = {
-                "status": "success",
-                "message": "Đã huấn luyện thành công các mô hình Survival Analysis",
-                "cox_model": cox_result if cox_result else {"status": "failed", "error": "Training failed"},
-                "rsf_model": rsf_result if rsf_result else {"status": "failed", "error": "Training failed"},
-                "kaplan_meier": km_result if km_result else {"status": "not_computed"},
-                "hazard_ratios": hazard_ratios if hazard_ratios else [],
-                "training_errors": training_errors,
-                "n_samples": len(df),
-                "n_events": int(df['event'].sum()),
-                "n_censored": int((1 - df['event']).sum())
-            }
+        # 9. TRẢ VỀ KẾT QUẢ (JSON SERIALIZABLE)
+        print("\n" + "="*80)
+        print("🎉 [SURVIVAL TRAINING] Hoàn thành quá trình training!")
+        print("="*80 + "\n")
 
-            # Convert tất cả numpy/pandas types sang Python native types
-            print("🔄 [SURVIVAL TRAINING] Đang serialize response data...")
-            json_response = convert_to_json_serializable(response_data)
+        # Kiểm tra xem có ít nhất 1 model thành công không
+        if not cox_result and not rsf_result:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Cả 2 models đều thất bại. Errors: {training_errors}"
+            )
 
-            # Log kích thước response (ước tính)
-            import json
-            try:
-                response_size = len(json.dumps(json_response))
-                print(f"📦 [SURVIVAL TRAINING] Response size: {response_size:,} bytes ({response_size/1024:.2f} KB)")
-            except Exception as e:
-                print(f"⚠️  [SURVIVAL TRAINING] Không thể tính kích thước response: {str(e)}")
+        # Tạo response data và convert sang JSON serializable types
+        response_data = {
+            "status": "success",
+            "message": "Đã huấn luyện thành công các mô hình Survival Analysis",
+            "cox_model": cox_result if cox_result else {"status": "failed", "error": "Training failed"},
+            "rsf_model": rsf_result if rsf_result else {"status": "failed", "error": "Training failed"},
+            "kaplan_meier": km_result if km_result else {"status": "not_computed"},
+            "hazard_ratios": hazard_ratios if hazard_ratios else [],
+            "training_errors": training_errors,
+            "training_time_seconds": parallel_result['wall_time_seconds'],
+            "n_samples": len(df),
+            "n_events": int(df['event'].sum()),
+            "n_censored": int((1 - df['event']).sum())
+        }
 
-            print("✅ [SURVIVAL TRAINING] Response đã sẵn sàng để gửi về frontend\n")
+        # Serialize response (định dạng theo header Accept) và log kích thước
+        print("🔄 [SURVIVAL TRAINING] Đang serialize response data...")
+        response = negotiated_response(response_data, accept, table_key='kaplan_meier')
+        response_size = len(response.body)
+        print(f"📦 [SURVIVAL TRAINING] Response size: {response_size:,} bytes ({response_size/1024:.2f} KB)")
 
-            # Sử dụng JSONResponse explicitly để đảm bảo serialize chính xác
-            return JSONResponse(content=json_response)
+        print("✅ [SURVIVAL TRAINING] Response đã sẵn sàng để gửi về frontend\n")
 
-        finally:
-            # Xóa file tạm
-            if tmp_file_path and os.path.exists(tmp_file_path):
-                try:
-                    os.unlink(tmp_file_path)
-                    print(f"🗑️  [SURVIVAL TRAINING] Đã xóa file tạm: {tmp_file_path}")
-                except Exception as e:
-                    print(f"⚠️  [SURVIVAL TRAINING] Không thể xóa file tạm: {str(e)}")
+        return response
 
     except HTTPException as e:
         print(f"❌ [SURVIVAL TRAINING] HTTPException: {str(e)}")
         raise
+    except ValueError as e:
+        # File upload vượt giới hạn kích thước / dữ liệu không hợp lệ
+        print(f"❌ [SURVIVAL TRAINING] Dữ liệu không hợp lệ: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ [SURVIVAL TRAINING] Lỗi không mong muốn: {str(e)}")
         import traceback
@@ -2068,140 +2449,122 @@ async def train_cox_model(file: UploadFile = File(...)):
     print("🚀 [COX TRAINING] Bắt đầu huấn luyện Cox PH model...")
     print("="*80)
 
-    tmp_file_path = None
-
     try:
-        # 1. LƯU FILE TẠM THỜI
-        print("📁 [COX TRAINING] Đang lưu file tạm thời...")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp_file:
-            tmp_file.write(await file.read())
-            tmp_file_path = tmp_file.name
-        print(f"✅ [COX TRAINING] Đã lưu file: {tmp_file_path}")
+        # 1. KIỂM TRA FILE UPLOAD (đọc thẳng từ stream, không ghi file tạm)
+        stream = upload_stream(file)
+
+        # 2. ĐỌC DỮ LIỆU
+        print("📊 [COX TRAINING] Đang đọc dữ liệu...")
+        if file.filename.endswith('.csv'):
+            df = pd.read_csv(stream)
+        elif file.filename.endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(stream)
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail="File phải là định dạng CSV hoặc Excel (.xlsx, .xls)"
+            )
 
-        try:
-            # 2. ĐỌC DỮ LIỆU
-            print("📊 [COX TRAINING] Đang đọc dữ liệu...")
-            if file.filename.endswith('.csv'):
-                df = pd.read_csv(tmp_file_path)
-            elif file.filename.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(tmp_file_path)
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail="File phải là định dạng CSV hoặc Excel (.xlsx, .xls)"
-                )
+        print(f"✅ [COX TRAINING] Đã đọc {len(df)} dòng dữ liệu")
 
-            print(f"✅ [COX TRAINING] Đã đọc {len(df)} dòng dữ liệu")
+        # 3. KIỂM TRA CỘT CẦN THIẾT
+        print("🔍 [COX TRAINING] Đang kiểm tra các cột dữ liệu...")
+        required_features = [f'X_{i}' for i in range(1, 15)]
+        required_cols = required_features + ['months_to_default']
 
-            # 3. KIỂM TRA CỘT CẦN THIẾT
-            print("🔍 [COX TRAINING] Đang kiểm tra các cột dữ liệu...")
-            required_features = [f'X_{i}' for i in range(1, 15)]
-            required_cols = required_features + ['months_to_default']
+        missing_cols = [col for col in required_cols if col not in df.columns]
+        if missing_cols:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Thiếu các cột: {', '.join(missing_cols)}"
+            )
 
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            if missing_cols:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Thiếu các cột: {', '.join(missing_cols)}"
-                )
+        # Nếu không có cột 'event', tự động tạo
+        if 'event' not in df.columns:
+            df['event'] = 1
+            print("⚠️  [COX TRAINING] Không tìm thấy cột 'event', tạo tự động (all events = 1)")
 
-            # Nếu không có cột 'event', tự động tạo
-            if 'event' not in df.columns:
-                df['event'] = 1
-                print("⚠️  [COX TRAINING] Không tìm thấy cột 'event', tạo tự động (all events = 1)")
+        print(f"✅ [COX TRAINING] Validation hoàn tất. Events: {int(df['event'].sum())}, Censored: {int((1-df['event']).sum())}")
 
-            print(f"✅ [COX TRAINING] Validation hoàn tất. Events: {int(df['event'].sum())}, Censored: {int((1-df['event']).sum())}")
+        # 4. HUẤN LUYỆN COX MODEL
+        print("🔄 [COX TRAINING] Đang huấn luyện Cox Proportional Hazards Model...")
+        cox_result = survival_system.train_cox_model(
+            df,
+            duration_col='months_to_default',
+            event_col='event'
+        )
+        print(f"✅ [COX TRAINING] Hoàn thành! C-index: {cox_result['c_index']:.4f}")
 
-            # 4. HUẤN LUYỆN COX MODEL
-            print("🔄 [COX TRAINING] Đang huấn luyện Cox Proportional Hazards Model...")
-            cox_result = survival_system.train_cox_model(
+        # 5. TÍNH KAPLAN-MEIER BASELINE
+        km_result = None
+        try:
+            print("📈 [COX TRAINING] Đang tính Kaplan-Meier baseline...")
+            km_result = survival_system.calculate_kaplan_meier(
                 df,
                 duration_col='months_to_default',
                 event_col='event'
             )
-            print(f"✅ [COX TRAINING] Hoàn thành! C-index: {cox_result['c_index']:.4f}")
-
-            # 5. TÍNH KAPLAN-MEIER BASELINE
-            km_result = None
-            try:
-                print("📈 [COX TRAINING] Đang tính Kaplan-Meier baseline...")
-                km_result = survival_system.calculate_kaplan_meier(
-                    df,
-                    duration_col='months_to_default',
-                    event_col='event'
-                )
 
-                # Downsample KM data
-                if km_result and 'timeline' in km_result:
-                    original_points = len(km_result.get('timeline', []))
-                    km_result = downsample_kaplan_meier(km_result, max_points=100)
-                    print(f"✅ [COX TRAINING] Kaplan-Meier baseline đã tính xong ({original_points} → {len(km_result.get('timeline', []))} điểm)")
-            except Exception as e:
-                print(f"⚠️  [COX TRAINING] Không thể tính Kaplan-Meier: {str(e)}")
-                km_result = {"error": str(e)}
-
-            # 6. LẤY HAZARD RATIOS
-            hazard_ratios = None
-            try:
-                print("📊 [COX TRAINING] Đang tính hazard ratios...")
-                hazard_ratios = survival_system.get_hazard_ratios(top_k=14)
-                print(f"✅ [COX TRAINING] Đã tính {len(hazard_ratios)} hazard ratios")
-            except Exception as e:
-                print(f"⚠️  [COX TRAINING] Không thể tính hazard ratios: {str(e)}")
-                hazard_ratios = []
-
-            # 7. LƯU MODEL
-            try:
-                print("💾 [COX TRAINING] Đang lưu model...")
-                survival_system.save_models('survival_models.pkl')
-                print("✅ [COX TRAINING] Model đã được lưu vào survival_models.pkl")
-            except Exception as e:
-                print(f"⚠️  [COX TRAINING] Không thể lưu model: {str(e)}")
-
-            # 8. TẠO RESPONSE
-            print("\n" + "="*80)
-            print("🎉 [COX TRAINING] Hoàn thành quá trình training!")
-            print("="*80 + "\n")
-
-            response_data = {
-                "status": "success",
-                "message": "Đã huấn luyện thành công Cox Proportional Hazards Model",
-                "cox_model": cox_result,
-                "kaplan_meier": km_result if km_result else {"status": "not_computed"},
-                "hazard_ratios": hazard_ratios if hazard_ratios else [],
-                "n_samples": len(df),
-                "n_events": int(df['event'].sum()),
-                "n_censored": int((1 - df['event']).sum())
-            }
+            # Downsample KM data
+            if km_result and 'timeline' in km_result:
+                original_points = len(km_result.get('timeline', []))
+                km_result = downsample_kaplan_meier(km_result, max_points=100)
+                print(f"✅ [COX TRAINING] Kaplan-Meier baseline đã tính xong ({original_points} → {len(km_result.get('timeline', []))} điểm)")
+        except Exception as e:
+            print(f"⚠️  [COX TRAINING] Không thể tính Kaplan-Meier: {str(e)}")
+            km_result = {"error": str(e)}
+
+        # 6. LẤY HAZARD RATIOS
+        hazard_ratios = None
+        try:
+            print("📊 [COX TRAINING] Đang tính hazard ratios...")
+            hazard_ratios = survival_system.get_hazard_ratios(top_k=14)
+            print(f"✅ [COX TRAINING] Đã tính {len(hazard_ratios)} hazard ratios")
+        except Exception as e:
+            print(f"⚠️  [COX TRAINING] Không thể tính hazard ratios: {str(e)}")
+            hazard_ratios = []
+
+        # 7. LƯU MODEL
+        try:
+            print("💾 [COX TRAINING] Đang lưu model...")
+            survival_system.save_models('survival_models.pkl', low_memory=SURVIVAL_LOW_MEMORY)
+            print("✅ [COX TRAINING] Model đã được lưu vào survival_models.pkl")
+        except Exception as e:
+            print(f"⚠️  [COX TRAINING] Không thể lưu model: {str(e)}")
 
-            # Convert sang JSON serializable
-            print("🔄 [COX TRAINING] Đang serialize response data...")
-            json_response = convert_to_json_serializable(response_data)
+        # 8. TẠO RESPONSE
+        print("\n" + "="*80)
+        print("🎉 [COX TRAINING] Hoàn thành quá trình training!")
+        print("="*80 + "\n")
 
-            # Log kích thước
-            import json
-            try:
-                response_size = len(json.dumps(json_response))
-                print(f"📦 [COX TRAINING] Response size: {response_size:,} bytes ({response_size/1024:.2f} KB)")
-            except Exception as e:
-                print(f"⚠️  [COX TRAINING] Không thể tính kích thước response: {str(e)}")
+        response_data = {
+            "status": "success",
+            "message": "Đã huấn luyện thành công Cox Proportional Hazards Model",
+            "cox_model": cox_result,
+            "kaplan_meier": km_result if km_result else {"status": "not_computed"},
+            "hazard_ratios": hazard_ratios if hazard_ratios else [],
+            "n_samples": len(df),
+            "n_events": int(df['event'].sum()),
+            "n_censored": int((1 - df['event']).sum())
+        }
 
-            print("✅ [COX TRAINING] Response đã sẵn sàng để gửi về frontend\n")
+        # Serialize response (orjson) và log kích thước
+        print("🔄 [COX TRAINING] Đang serialize response data...")
+        response = FastJSONResponse(response_data)
+        response_size = len(response.body)
+        print(f"📦 [COX TRAINING] Response size: {response_size:,} bytes ({response_size/1024:.2f} KB)")
 
-            return JSONResponse(content=json_response)
+        print("✅ [COX TRAINING] Response đã sẵn sàng để gửi về frontend\n")
 
-        finally:
-            # Xóa file tạm
-            if tmp_file_path and os.path.exists(tmp_file_path):
-                try:
-                    os.unlink(tmp_file_path)
-                    print(f"🗑️  [COX TRAINING] Đã xóa file tạm: {tmp_file_path}")
-                except Exception as e:
-                    print(f"⚠️  [COX TRAINING] Không thể xóa file tạm: {str(e)}")
+        return response
 
     except HTTPException as e:
         print(f"❌ [COX TRAINING] HTTPException: {str(e)}")
         raise
+    except ValueError as e:
+        # File upload vượt giới hạn kích thước / dữ liệu không hợp lệ
+        print(f"❌ [COX TRAINING] Dữ liệu không hợp lệ: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ [COX TRAINING] Lỗi không mong muốn: {str(e)}")
         import traceback
@@ -2230,110 +2593,93 @@ async def train_rsf_model(file: UploadFile = File(...)):
     print("🚀 [RSF TRAINING] Bắt đầu huấn luyện Random Survival Forest model...")
     print("="*80)
 
-    tmp_file_path = None
-
     try:
-        # 1. LƯU FILE TẠM THỜI
-        print("📁 [RSF TRAINING] Đang lưu file tạm thời...")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp_file:
-            tmp_file.write(await file.read())
-            tmp_file_path = tmp_file.name
-        print(f"✅ [RSF TRAINING] Đã lưu file: {tmp_file_path}")
-
-        try:
-            # 2. ĐỌC DỮ LIỆU
-            print("📊 [RSF TRAINING] Đang đọc dữ liệu...")
-            if file.filename.endswith('.csv'):
-                df = pd.read_csv(tmp_file_path)
-            elif file.filename.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(tmp_file_path)
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail="File phải là định dạng CSV hoặc Excel (.xlsx, .xls)"
-                )
-
-            print(f"✅ [RSF TRAINING] Đã đọc {len(df)} dòng dữ liệu")
-
-            # 3. KIỂM TRA CỘT CẦN THIẾT
-            print("🔍 [RSF TRAINING] Đang kiểm tra các cột dữ liệu...")
-            required_features = [f'X_{i}' for i in range(1, 15)]
-            required_cols = required_features + ['months_to_default']
-
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            if missing_cols:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Thiếu các cột: {', '.join(missing_cols)}"
-                )
+        # 1. KIỂM TRA FILE UPLOAD (đọc thẳng từ stream, không ghi file tạm)
+        stream = upload_stream(file)
+
+        # 2. ĐỌC DỮ LIỆU
+        print("📊 [RSF TRAINING] Đang đọc dữ liệu...")
+        if file.filename.endswith('.csv'):
+            df = pd.read_csv(stream)
+        elif file.filename.endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(stream)
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail="File phải là định dạng CSV hoặc Excel (.xlsx, .xls)"
+            )
 
-            # Nếu không có cột 'event', tự động tạo
-            if 'event' not in df.columns:
-                df['event'] = 1
-                print("⚠️  [RSF TRAINING] Không tìm thấy cột 'event', tạo tự động (all events = 1)")
+        print(f"✅ [RSF TRAINING] Đã đọc {len(df)} dòng dữ liệu")
 
-            print(f"✅ [RSF TRAINING] Validation hoàn tất. Events: {int(df['event'].sum())}, Censored: {int((1-df['event']).sum())}")
+        # 3. KIỂM TRA CỘT CẦN THIẾT
+        print("🔍 [RSF TRAINING] Đang kiểm tra các cột dữ liệu...")
+        required_features = [f'X_{i}' for i in range(1, 15)]
+        required_cols = required_features + ['months_to_default']
 
-            # 4. HUẤN LUYỆN RSF MODEL
-            print("🔄 [RSF TRAINING] Đang huấn luyện Random Survival Forest Model...")
-            rsf_result = survival_system.train_random_survival_forest(
-                df,
-                duration_col='months_to_default',
-                event_col='event',
-                n_estimators=100
+        missing_cols = [col for col in required_cols if col not in df.columns]
+        if missing_cols:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Thiếu các cột: {', '.join(missing_cols)}"
             )
-            print(f"✅ [RSF TRAINING] Hoàn thành! C-index: {rsf_result['c_index']:.4f}")
 
-            # 5. LƯU MODEL
-            try:
-                print("💾 [RSF TRAINING] Đang lưu model...")
-                survival_system.save_models('survival_models.pkl')
-                print("✅ [RSF TRAINING] Model đã được lưu vào survival_models.pkl")
-            except Exception as e:
-                print(f"⚠️  [RSF TRAINING] Không thể lưu model: {str(e)}")
-
-            # 6. TẠO RESPONSE
-            print("\n" + "="*80)
-            print("🎉 [RSF TRAINING] Hoàn thành quá trình training!")
-            print("="*80 + "\n")
-
-            response_data = {
-                "status": "success",
-                "message": "Đã huấn luyện thành công Random Survival Forest Model",
-                "rsf_model": rsf_result,
-                "n_samples": len(df),
-                "n_events": int(df['event'].sum()),
-                "n_censored": int((1 - df['event']).sum())
-            }
+        # Nếu không có cột 'event', tự động tạo
+        if 'event' not in df.columns:
+            df['event'] = 1
+            print("⚠️  [RSF TRAINING] Không tìm thấy cột 'event', tạo tự động (all events = 1)")
+
+        print(f"✅ [RSF TRAINING] Validation hoàn tất. Events: {int(df['event'].sum())}, Censored: {int((1-df['event']).sum())}")
+
+        # 4. HUẤN LUYỆN RSF MODEL
+        print("🔄 [RSF TRAINING] Đang huấn luyện Random Survival Forest Model...")
+        rsf_result = survival_system.train_random_survival_forest(
+            df,
+            duration_col='months_to_default',
+            event_col='event',
+            n_estimators=100,
+            low_memory=SURVIVAL_LOW_MEMORY
+        )
+        print(f"✅ [RSF TRAINING] Hoàn thành! C-index: {rsf_result['c_index']:.4f}")
 
-            # Convert sang JSON serializable
-            print("🔄 [RSF TRAINING] Đang serialize response data...")
-            json_response = convert_to_json_serializable(response_data)
+        # 5. LƯU MODEL
+        try:
+            print("💾 [RSF TRAINING] Đang lưu model...")
+            survival_system.save_models('survival_models.pkl', low_memory=SURVIVAL_LOW_MEMORY)
+            print("✅ [RSF TRAINING] Model đã được lưu vào survival_models.pkl")
+        except Exception as e:
+            print(f"⚠️  [RSF TRAINING] Không thể lưu model: {str(e)}")
 
-            # Log kích thước
-            import json
-            try:
-                response_size = len(json.dumps(json_response))
-                print(f"📦 [RSF TRAINING] Response size: {response_size:,} bytes ({response_size/1024:.2f} KB)")
-            except Exception as e:
-                print(f"⚠️  [RSF TRAINING] Không thể tính kích thước response: {str(e)}")
+        # 6. TẠO RESPONSE
+        print("\n" + "="*80)
+        print("🎉 [RSF TRAINING] Hoàn thành quá trình training!")
+        print("="*80 + "\n")
 
-            print("✅ [RSF TRAINING] Response đã sẵn sàng để gửi về frontend\n")
+        response_data = {
+            "status": "success",
+            "message": "Đã huấn luyện thành công Random Survival Forest Model",
+            "rsf_model": rsf_result,
+            "n_samples": len(df),
+            "n_events": int(df['event'].sum()),
+            "n_censored": int((1 - df['event']).sum())
+        }
 
-            return JSONResponse(content=json_response)
+        # Serialize response (orjson) và log kích thước
+        print("🔄 [RSF TRAINING] Đang serialize response data...")
+        response = FastJSONResponse(response_data)
+        response_size = len(response.body)
+        print(f"📦 [RSF TRAINING] Response size: {response_size:,} bytes ({response_size/1024:.2f} KB)")
 
-        finally:
-            # Xóa file tạm
-            if tmp_file_path and os.path.exists(tmp_file_path):
-                try:
-                    os.unlink(tmp_file_path)
-                    print(f"🗑️  [RSF TRAINING] Đã xóa file tạm: {tmp_file_path}")
-                except Exception as e:
-                    print(f"⚠️  [RSF TRAINING] Không thể xóa file tạm: {str(e)}")
+        print("✅ [RSF TRAINING] Response đã sẵn sàng để gửi về frontend\n")
+
+        return response
 
     except HTTPException as e:
         print(f"❌ [RSF TRAINING] HTTPException: {str(e)}")
         raise
+    except ValueError as e:
+        # File upload vượt giới hạn kích thước / dữ liệu không hợp lệ
+        print(f"❌ [RSF TRAINING] Dữ liệu không hợp lệ: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ [RSF TRAINING] Lỗi không mong muốn: {str(e)}")
         import traceback
@@ -2347,7 +2693,8 @@ async def train_rsf_model(file: UploadFile = File(...)):
 @app.post("/predict-survival")
 async def predict_survival(
     file: Optional[UploadFile] = File(None),
-    indicators_json: Optional[str] = Form(None)
+    indicators_json: Optional[str] = Form(None),
+    accept: Optional[str] = Header(None)
 ):
     """
     Dự báo Survival Curve cho một doanh nghiệp mới
@@ -2363,6 +2710,9 @@ async def predict_survival(
     - Risk classification
     - Hazard ratios (top 5 quan trọng nhất) - Model-level metrics
     - Risk contributions (top 5) - Individual-level metrics cho doanh nghiệp này
+
+    Định dạng theo header Accept: JSON (mặc định), application/x-ndjson, Arrow IPC hoặc MessagePack
+    (bảng dữ liệu = survival curve)
     """
     try:
         import json
@@ -2370,18 +2720,7 @@ async def predict_survival(
         # 1. LẤY 14 CHỈ SỐ TÀI CHÍNH
         if file:
             # Từ file XLSX
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp_file:
-                tmp_file.write(await file.read())
-                tmp_file_path = tmp_file.name
-
-            try:
-                excel_processor.read_excel(tmp_file_path)
-                indicators = excel_processor.calculate_14_indicators()
-            finally:
-                try:
-                    os.unlink(tmp_file_path)
-                except Exception:
-                    pass
+            indicators = await asyncio.to_thread(read_xlsx_indicators, upload_stream(file))
 
         elif indicators_json:
             # Từ JSON
@@ -2399,21 +2738,27 @@ async def predict_survival(
                 detail="Mô hình chưa được huấn luyện. Vui lòng gọi /train-survival trước."
             )
 
+        # Vector 14 chỉ số dùng chung cho mọi bước bên dưới (missing → 0)
+        features = FeatureVector.from_dict(indicators, fill_missing=0.0)
+
         # 3. DỰ BÁO SURVIVAL CURVE (sử dụng Cox model)
         survival_curve = survival_system.predict_survival_curve(
-            indicators=indicators,
+            indicators=features,
             model_type='cox'
         )
 
+        # Rút gọn curve trả về frontend (median/xác suất bên dưới vẫn tính trên curve đầy đủ)
+        survival_curve = downsample_kaplan_meier(survival_curve, max_points=200)
+
         # 4. TÍNH MEDIAN TIME-TO-DEFAULT
         median_time = survival_system.calculate_median_time_to_default(
-            indicators=indicators,
+            indicators=features,
             model_type='cox'
         )
 
         # 5. TÍNH SURVIVAL PROBABILITIES TẠI CÁC THỜI ĐIỂM CỤ THỂ
         survival_probs = survival_system.get_survival_probabilities_at_times(
-            indicators=indicators,
+            indicators=features,
             times=[6, 12, 24],
             model_type='cox'
         )
@@ -2427,7 +2772,7 @@ async def predict_survival(
         # 8. LẤY INDIVIDUAL RISK CONTRIBUTIONS (TOP 5) - CỤ THỂ CHO DOANH NGHIỆP NÀY
         # KHÁC với hazard ratios (model-level, giống nhau cho mọi DN)
         risk_contributions = survival_system.get_individual_risk_contributions(
-            indicators=indicators,
+            indicators=features,
             top_k=5
         )
 
@@ -2458,10 +2803,12 @@ async def predict_survival(
             "warning": warning
         }
 
-        return convert_to_json_serializable(response_data)
+        return negotiated_response(response_data, accept, table_key='survival_curve')
 
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -2470,7 +2817,7 @@ async def predict_survival(
 
 
 @app.get("/survival-metrics")
-async def get_survival_metrics():
+async def get_survival_metrics(accept: Optional[str] = Header(None)):
     """
     Lấy các metrics và hazard ratios từ trained models
 
@@ -2479,6 +2826,9 @@ async def get_survival_metrics():
     - RSF model metrics
     - Hazard ratios cho tất cả 14 chỉ số
     - Kaplan-Meier baseline survival
+
+    Định dạng theo header Accept: JSON (mặc định), application/x-ndjson, Arrow IPC hoặc MessagePack
+    (bảng dữ liệu = kaplan_meier_baseline)
     """
     try:
         # Kiểm tra model đã được huấn luyện
@@ -2492,7 +2842,7 @@ async def get_survival_metrics():
         hazard_ratios = survival_system.get_hazard_ratios(top_k=14)
 
         # Lấy Kaplan-Meier baseline
-        km_baseline = survival_system.calculate_kaplan_meier()
+        km_baseline = downsample_kaplan_meier(survival_system.calculate_kaplan_meier(), max_points=100)
 
         response_data = {
             "status": "success",
@@ -2501,7 +2851,7 @@ async def get_survival_metrics():
             "kaplan_meier_baseline": km_baseline
         }
 
-        return convert_to_json_serializable(response_data)
+        return negotiated_response(response_data, accept, table_key='kaplan_meier_baseline')
 
     except HTTPException:
         raise
@@ -2538,7 +2888,7 @@ async def analyze_survival_gemini(
             "analysis": analysis
         }
 
-        return convert_to_json_serializable(response_data)
+        return FastJSONResponse(response_data)
 
     except Exception as e:
         raise HTTPException(
@@ -2548,6 +2898,7 @@ async def analyze_survival_gemini(
 
 
 @app.post("/export-survival-report")
+@no_compression  # File Word (docx) đã là ZIP
 async def export_survival_report(
     data: Dict[str, Any]
 ):
@@ -2564,16 +2915,15 @@ async def export_survival_report(
         # Tạo tên file unique
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"Bao_cao_Survival_Analysis_{timestamp}.docx"
-        filepath = os.path.join(tempfile.gettempdir(), filename)
 
-        # Tạo báo cáo
-        report_path = report_generator.generate_survival_report(data, filepath)
+        # Tạo báo cáo trong bộ nhớ (thread riêng, không chặn event loop)
+        content = await asyncio.to_thread(build_survival_report, data)
 
         # Trả về file
-        return FileResponse(
-            path=report_path,
-            filename=filename,
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        return Response(
+            content=content,
+            media_type=DOCX_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
 
     except Exception as e:
@@ -2583,6 +2933,173 @@ async def export_survival_report(
         )
 
 
+# ================================================================================================
+# COMPOSITE ASSESSMENT ENDPOINT
+# ================================================================================================
+
+def _assess_credit(features: FeatureVector) -> Dict[str, Any]:
+    """Phần Dự báo PD của /assess"""
+    if credit_model.model is None:
+        if not os.path.exists("model_stacking.pkl"):
+            return {"status": "not_trained", "message": "Mô hình PD chưa được huấn luyện"}
+        credit_model.load_model("model_stacking.pkl")
+
+    return {"status": "success", **credit_model.predict(features)}
+
+
+def _assess_early_warning(features: FeatureVector, indicators: Dict[str, float],
+                          industry_code: str) -> Dict[str, Any]:
+    """Phần Cảnh báo sớm của /assess (không gọi Gemini)"""
+    if early_warning_system.stacking_model is None:
+        return {"status": "not_trained", "message": "Early Warning System chưa được train"}
+
+    health_score = early_warning_system.calculate_health_score(features)
+    current_pd = early_warning_system.stacking_model.predict_proba(features.values)[0, 1] * 100
+
+    return {
+        "status": "success",
+        "health_score": health_score,
+        **early_warning_system.classify_risk_level(health_score),
+        "current_pd": current_pd,
+        "top_weaknesses": early_warning_system.detect_weaknesses(features),
+        "cluster_info": early_warning_system.get_cluster_position(features),
+        "pd_projection": project_pd_scenarios(indicators, current_pd, industry_code)
+    }
+
+
+def _assess_anomaly(features: FeatureVector) -> Dict[str, Any]:
+    """Phần Phát hiện bất thường của /assess (không gọi Gemini)"""
+    if anomaly_system.model is None:
+        return {"status": "not_trained", "message": "Anomaly Detection System chưa được train"}
+
+    anomaly_score = anomaly_system.calculate_anomaly_score(features)
+    abnormal_features = anomaly_system.detect_abnormal_features(features)
+
+    return {
+        "status": "success",
+        "anomaly_score": anomaly_score,
+        **classify_anomaly_risk(anomaly_score),
+        "risk_cutoffs": anomaly_risk_cutoffs(),
+        "abnormal_features": abnormal_features,
+        "anomaly_type": anomaly_system.classify_anomaly_type(features, abnormal_features)
+    }
+
+
+def _assess_survival(features: FeatureVector) -> Dict[str, Any]:
+    """Phần Survival Analysis (Cox) của /assess"""
+    if survival_system.cox_model is None:
+        if not os.path.exists("survival_models.pkl"):
+            return {"status": "not_trained", "message": "Mô hình survival chưa được huấn luyện"}
+        survival_system.load_models("survival_models.pkl")
+
+    median_time = survival_system.calculate_median_time_to_default(features, model_type='cox')
+    survival_curve = survival_system.predict_survival_curve(features, model_type='cox')
+
+    return {
+        "status": "success",
+        "survival_curve": downsample_kaplan_meier(survival_curve, max_points=200),
+        "median_time_to_default": float(median_time),
+        "survival_probabilities": survival_system.get_survival_probabilities_at_times(
+            features, times=[6, 12, 24], model_type='cox'
+        ),
+        "risk_classification": survival_system.get_risk_classification(median_time),
+        "risk_contributions": survival_system.get_individual_risk_contributions(features, top_k=5)
+    }
+
+
+async def _run_assessment_section(func, *args) -> Dict[str, Any]:
+    """Chạy một phần của /assess trong thread riêng; lỗi chỉ ảnh hưởng phần đó"""
+    try:
+        return await asyncio.to_thread(func, *args)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@app.post("/assess")
+async def assess_company(
+    file: Optional[UploadFile] = File(None),
+    indicators_json: Optional[str] = Form(None),
+    include_credit: bool = Form(True),
+    include_early_warning: bool = Form(True),
+    include_anomaly: bool = Form(True),
+    include_survival: bool = Form(True),
+    industry_code: str = Form("manufacturing")
+):
+    """
+    Endpoint đánh giá tổng hợp một doanh nghiệp trong một lần gọi
+
+    Đọc XLSX (hoặc indicators_json) MỘT LẦN, dựng vector 14 chỉ số rồi chạy song song
+    Dự báo PD, Cảnh báo sớm, Phát hiện bất thường và Survival Analysis.
+
+    Args:
+        file: File XLSX báo cáo tài chính - Optional
+        indicators_json: JSON string chứa 14 chỉ số - Optional (dùng khi không có file)
+        include_credit / include_early_warning / include_anomaly / include_survival: Bật/tắt từng phần
+        industry_code: Mã ngành cho dự báo PD tương lai
+
+    Returns:
+        Dict chứa indicators và kết quả từng phần (mỗi phần có status riêng:
+        success / not_trained / error)
+    """
+    try:
+        import json
+
+        # 1. LẤY 14 CHỈ SỐ (parse một lần)
+        indicators_with_names = None
+
+        if file:
+            if not file.filename.endswith(('.xlsx', '.xls')):
+                raise HTTPException(status_code=400, detail="File phải có định dạng XLSX hoặc XLS")
+
+            indicators = await asyncio.to_thread(read_xlsx_indicators, upload_stream(file))
+            indicators_with_names = excel_processor.get_indicators_with_names(indicators)
+
+        elif indicators_json:
+            indicators = json.loads(indicators_json)
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail="Vui lòng cung cấp file XLSX hoặc dữ liệu 14 chỉ số"
+            )
+
+        # 2. VECTOR 14 CHỈ SỐ DÙNG CHUNG CHO 4 HỆ THỐNG
+        features = FeatureVector.from_dict(indicators)
+
+        # 3. CHẠY SONG SONG CÁC PHẦN ĐƯỢC CHỌN
+        sections = {}
+        if include_credit:
+            sections["credit"] = _run_assessment_section(_assess_credit, features)
+        if include_early_warning:
+            sections["early_warning"] = _run_assessment_section(
+                _assess_early_warning, features, indicators, industry_code
+            )
+        if include_anomaly:
+            sections["anomaly"] = _run_assessment_section(_assess_anomaly, features)
+        if include_survival:
+            sections["survival"] = _run_assessment_section(_assess_survival, features)
+
+        if not sections:
+            raise HTTPException(status_code=400, detail="Vui lòng chọn ít nhất một phần đánh giá")
+
+        results = await asyncio.gather(*sections.values())
+
+        response_data = {
+            "status": "success",
+            "indicators": indicators,
+            "indicators_with_names": indicators_with_names,
+            **dict(zip(sections.keys(), results))
+        }
+
+        return FastJSONResponse(response_data)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi đánh giá tổng hợp: {str(e)}")
+
+
 # ================================================================================================
 # MAIN
 # ================================================================================================
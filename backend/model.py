@@ -7,16 +7,49 @@ Meta-model: Logistic Regression
 import numpy as np
 import pandas as pd
 from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier, StackingClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier, StackingClassifier, GradientBoostingRegressor
+from sklearn.model_selection import train_test_split, cross_val_predict, StratifiedKFold
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, brier_score_loss
 from xgboost import XGBClassifier
 import pickle
 import os
-from typing import Dict, Tuple, Any
+import tempfile
+import time
+import hashlib
+import warnings
+from typing import Dict, Tuple, Any, Optional, Union, List
+from model_registry import get_promoted_params
+from feature_vector import FeatureVector, FEATURE_COLS
+from score_cache import memoize_score, bump_model_version
 
 # Danh sách 14 chỉ số tài chính
-MODEL_COLS = [f'X_{i}' for i in range(1, 15)]
+MODEL_COLS = FEATURE_COLS
+
+# Số fold cross-validation để sinh out-of-fold predictions cho meta-model
+STACKING_CV_FOLDS = 5
+
+# Thư mục cache OOF predictions (theo hash dữ liệu + cấu hình base models)
+OOF_CACHE_DIR = os.getenv("OOF_CACHE_DIR", "oof_cache")
+
+# Siêu tham số mặc định của base models (có thể bị ghi đè bởi model registry)
+CREDIT_MODEL_PARAMS = {
+    'rf_n_estimators': 100,
+    'rf_max_depth': 10,
+    'xgb_n_estimators': 100,
+    'xgb_max_depth': 6,
+    'xgb_learning_rate': 0.1,
+}
+
+# Siêu tham số mặc định của mô hình student (chưng cất từ Stacking)
+STUDENT_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 3,
+    'learning_rate': 0.1,
+}
+
+# Ngưỡng phân loại mặc định: PD >= 15% = Default
+DEFAULT_THRESHOLD = 0.15
 
 
 class CreditRiskModel:
@@ -27,6 +60,15 @@ class CreditRiskModel:
         self.model_logistic = None
         self.model_rf = None
         self.model_xgb = None
+        self.meta_model = None
+        self.model_params = dict(CREDIT_MODEL_PARAMS)
+        self.oof_train = None
+        self.oof_cache_key = None
+        self.threshold = DEFAULT_THRESHOLD
+        self.student_model = None
+        self.distillation_report = {}
+        # Phiên bản mô hình (đổi mỗi lần train/load → vô hiệu cache kết quả dự báo)
+        self.model_version = None
         self.X_train = None
         self.X_test = None
         self.y_train = None
@@ -34,8 +76,18 @@ class CreditRiskModel:
         self.metrics_in = {}
         self.metrics_out = {}
 
-    def build_model(self):
-        """Xây dựng mô hình Stacking Classifier"""
+    def build_model(self, params: Optional[Dict[str, Any]] = None):
+        """
+        Xây dựng mô hình Stacking Classifier
+
+        Args:
+            params: Siêu tham số base models (None = mặc định + cấu hình đã promote trong registry)
+        """
+        if params is None:
+            params = get_promoted_params('credit_risk')
+        self.model_params = {**CREDIT_MODEL_PARAMS, **params}
+        p = self.model_params
+
         # Định nghĩa 3 Base Models
         self.model_logistic = LogisticRegression(
             random_state=42,
@@ -45,47 +97,176 @@ class CreditRiskModel:
         )
 
         self.model_rf = RandomForestClassifier(
-            n_estimators=100,
+            n_estimators=p['rf_n_estimators'],
             random_state=42,
-            max_depth=10,
+            max_depth=p['rf_max_depth'],
             class_weight="balanced"
         )
 
         self.model_xgb = XGBClassifier(
-            n_estimators=100,
+            n_estimators=p['xgb_n_estimators'],
             random_state=42,
-            max_depth=6,
-            learning_rate=0.1,
+            max_depth=p['xgb_max_depth'],
+            learning_rate=p['xgb_learning_rate'],
             use_label_encoder=False,
             eval_metric='logloss'
         )
 
-        # Tạo StackingClassifier với LogisticRegression làm meta-model
-        estimators = [
+        # Meta-model: LogisticRegression học trên out-of-fold predictions
+        self.meta_model = LogisticRegression(random_state=42, max_iter=1000)
+
+    def _base_estimators(self):
+        """Danh sách (tên, model) của 3 base models theo đúng thứ tự stacking"""
+        return [
             ('logistic', self.model_logistic),
             ('random_forest', self.model_rf),
             ('xgboost', self.model_xgb)
         ]
 
-        self.model = StackingClassifier(
-            estimators=estimators,
-            final_estimator=LogisticRegression(random_state=42, max_iter=1000),
-            cv=5,  # Cross-validation 5-fold
-            stack_method='predict_proba',  # Dùng probability để stack
-            n_jobs=-1  # Sử dụng tất cả CPU cores
-        )
+    def _model_input(self, X: Union[FeatureVector, pd.DataFrame, Dict[str, float]]) -> Union[np.ndarray, pd.DataFrame]:
+        """
+        Ma trận đầu vào cho các mô hình: float64 C-contiguous lấy từ FeatureVector
 
-    def train(self, csv_file_path: str) -> Dict[str, Any]:
+        Mô hình cũ (được train bằng DataFrame) vẫn nhận DataFrame có tên cột.
         """
-        Huấn luyện mô hình từ file CSV
+        fv = FeatureVector.coerce(X)
+        if hasattr(self.model_logistic, 'feature_names_in_'):
+            return fv.to_frame()
+        return fv.values
+
+    def predict_pd(self, X: Union[FeatureVector, pd.DataFrame, Dict[str, float]]) -> np.ndarray:
+        """
+        PD từ mô hình Stacking cho một hoặc nhiều DN
 
         Args:
-            csv_file_path: Đường dẫn đến file CSV chứa dữ liệu huấn luyện
+            X: FeatureVector, DataFrame hoặc dict 14 chỉ số
 
         Returns:
-            Dict chứa metrics và thông tin huấn luyện
+            Mảng PD (n_samples,)
         """
-        # Đọc dữ liệu
+        if self.model is None:
+            raise ValueError("Mô hình chưa được huấn luyện. Vui lòng huấn luyện trước khi dự báo.")
+        return self.model.predict_proba(self._model_input(X))[:, 1]
+
+    def _compute_oof_predictions(self, X: pd.DataFrame, y: pd.Series) -> np.ndarray:
+        """
+        Sinh out-of-fold predictions của 3 base models (giống cv=5 của StackingClassifier)
+
+        Args:
+            X: DataFrame 14 chỉ số
+            y: Nhãn default
+
+        Returns:
+            Ma trận (n_samples, 3) chứa PD out-of-fold của từng base model
+        """
+        cv = StratifiedKFold(n_splits=STACKING_CV_FOLDS)
+        X = self._model_input(X)
+        columns = [
+            cross_val_predict(clone(model), X, y, cv=cv, method='predict_proba', n_jobs=-1)[:, 1]
+            for _, model in self._base_estimators()
+        ]
+        return np.column_stack(columns)
+
+    def _oof_cache_key(self, X: pd.DataFrame, y: pd.Series) -> str:
+        """Khóa cache OOF = hash(dữ liệu train) + hash(cấu hình 3 base models và số fold)"""
+        data_hash = hashlib.sha256()
+        data_hash.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+        data_hash.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+
+        config = [(name, sorted(model.get_params().items())) for name, model in self._base_estimators()]
+        config_hash = hashlib.sha256(repr((config, STACKING_CV_FOLDS)).encode('utf-8'))
+
+        return f"{data_hash.hexdigest()[:16]}_{config_hash.hexdigest()[:16]}"
+
+    def _load_or_compute_oof(self, X: pd.DataFrame, y: pd.Series) -> Tuple[np.ndarray, bool]:
+        """
+        Lấy OOF predictions từ cache nếu đã có, ngược lại tính và lưu vào cache
+
+        Returns:
+            Tuple (ma trận OOF, True nếu lấy từ cache)
+        """
+        self.oof_cache_key = self._oof_cache_key(X, y)
+        cache_path = os.path.join(OOF_CACHE_DIR, f"oof_{self.oof_cache_key}.pkl")
+
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    oof = pickle.load(f)
+                if oof.shape == (len(X), len(self._base_estimators())):
+                    return oof, True
+            except Exception as e:
+                print(f"⚠️ Không đọc được cache OOF ({cache_path}): {e}")
+
+        oof = self._compute_oof_predictions(X, y)
+
+        try:
+            os.makedirs(OOF_CACHE_DIR, exist_ok=True)
+            # File tạm riêng của lượt ghi → 2 lượt train đồng thời không ghi đè file tạm của nhau
+            with tempfile.NamedTemporaryFile(dir=OOF_CACHE_DIR, suffix=".tmp", delete=False) as f:
+                pickle.dump(oof, f)
+            os.replace(f.name, cache_path)
+        except OSError as e:
+            print(f"⚠️ Không ghi được cache OOF: {e}")
+
+        return oof, False
+
+    def _base_predictions(self, X: pd.DataFrame) -> np.ndarray:
+        """Ma trận (n_samples, 3) chứa PD của 3 base models đã huấn luyện"""
+        X = self._model_input(X)
+        return np.column_stack([
+            model.predict_proba(X)[:, 1] for _, model in self._base_estimators()
+        ])
+
+    def _assemble_stacking(self, X: pd.DataFrame, y: pd.Series):
+        """
+        Ghép 3 base models (đã fit) và meta-model (đã fit trên OOF) thành StackingClassifier
+
+        Base models được dùng chung với self.model_* (cv='prefit') nên không phải
+        huấn luyện 2 lần; meta-model được thay bằng bản đã học trên out-of-fold predictions.
+        """
+        self.model = StackingClassifier(
+            estimators=self._base_estimators(),
+            final_estimator=LogisticRegression(random_state=42, max_iter=1000),
+            cv='prefit',
+            stack_method='predict_proba'
+        )
+        self.model.fit(self._model_input(X), y)
+        self.model.final_estimator_ = self.meta_model
+
+        # Student chưng cất từ Stacking cũ không còn khớp → cần chưng cất lại
+        self.student_model = None
+        self.distillation_report = {}
+        self.model_version = bump_model_version('credit_risk')
+
+    @staticmethod
+    def _compute_metrics(y_true, y_pred, y_proba) -> Dict[str, float]:
+        """Tính accuracy, precision, recall, f1 và AUC"""
+        return {
+            "accuracy": accuracy_score(y_true, y_pred),
+            "precision": precision_score(y_true, y_pred, zero_division=0),
+            "recall": recall_score(y_true, y_pred, zero_division=0),
+            "f1": f1_score(y_true, y_pred, zero_division=0),
+            "auc": roc_auc_score(y_true, y_proba),
+        }
+
+    def _evaluate(self):
+        """Cập nhật metrics_in / metrics_out trên tập train và test hiện tại"""
+        X_train = self._model_input(self.X_train)
+        X_test = self._model_input(self.X_test)
+        self.metrics_in = self._compute_metrics(
+            self.y_train,
+            self.model.predict(X_train),
+            self.model.predict_proba(X_train)[:, 1]
+        )
+        self.metrics_out = self._compute_metrics(
+            self.y_test,
+            self.model.predict(X_test),
+            self.model.predict_proba(X_test)[:, 1]
+        )
+
+    @staticmethod
+    def _read_training_csv(csv_file_path: str) -> Tuple[pd.DataFrame, pd.Series]:
+        """Đọc file CSV huấn luyện và trả về (X, y)"""
         df = pd.read_csv(csv_file_path)
 
         # Kiểm tra cột cần thiết
@@ -94,9 +275,55 @@ class CreditRiskModel:
         if missing:
             raise ValueError(f"Thiếu cột: {missing}. Vui lòng kiểm tra lại file CSV.")
 
-        # Chuẩn bị dữ liệu
-        X = df[MODEL_COLS]
-        y = df['default'].astype(int)
+        return df[MODEL_COLS], df['default'].astype(int)
+
+    def fit_stacking(self, X: pd.DataFrame, y: pd.Series, use_oof_cache: bool = True) -> bool:
+        """
+        Fit Stacking (OOF → base models → meta-model) trên (X, y) với các model đã build
+
+        Args:
+            X: DataFrame 14 chỉ số
+            y: Nhãn default
+            use_oof_cache: Đọc/ghi cache OOF predictions
+
+        Returns:
+            True nếu OOF predictions lấy từ cache
+        """
+        # 1. Out-of-fold predictions cho meta-model (5-fold CV trên 3 base models, có cache)
+        print("🚀 Đang sinh out-of-fold predictions cho mô hình Stacking...")
+        if use_oof_cache:
+            self.oof_train, oof_cached = self._load_or_compute_oof(X, y)
+        else:
+            self.oof_train, oof_cached = self._compute_oof_predictions(X, y), False
+        if oof_cached:
+            print(f"♻️ Dùng lại OOF predictions từ cache: {self.oof_cache_key}")
+
+        # 2. Train 3 base models trên toàn bộ tập train (dùng chung cho Stacking)
+        print("🔧 Đang huấn luyện 3 base models...")
+        X_matrix = self._model_input(X)
+        for _, model in self._base_estimators():
+            model.fit(X_matrix, y)
+
+        # 3. Train meta-model trên OOF predictions và ghép Stacking
+        self.meta_model.fit(self.oof_train, y)
+        self._assemble_stacking(X, y)
+
+        return oof_cached
+
+    def train(self, csv_file_path: str) -> Dict[str, Any]:
+        """
+        Huấn luyện mô hình từ file CSV
+
+        Args:
+            csv_file_path: Đường dẫn (hoặc file-like object) file CSV chứa dữ liệu huấn luyện
+
+        Returns:
+            Dict chứa metrics và thông tin huấn luyện
+        """
+        start_time = time.time()
+
+        # Đọc dữ liệu
+        X, y = self._read_training_csv(csv_file_path)
 
         # Chia train/test
         self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(
@@ -106,65 +333,333 @@ class CreditRiskModel:
         # Xây dựng mô hình
         self.build_model()
 
-        # Train mô hình Stacking
-        print("🚀 Đang huấn luyện mô hình Stacking Classifier...")
-        self.model.fit(self.X_train, self.y_train)
-
-        # Train riêng 3 base models để lấy PD riêng biệt
-        print("🔧 Đang huấn luyện 3 base models riêng biệt...")
-        self.model_logistic.fit(self.X_train, self.y_train)
-        self.model_rf.fit(self.X_train, self.y_train)
-        self.model_xgb.fit(self.X_train, self.y_train)
+        oof_cached = self.fit_stacking(self.X_train, self.y_train)
 
         # Đánh giá mô hình
-        y_pred_in = self.model.predict(self.X_train)
-        y_proba_in = self.model.predict_proba(self.X_train)[:, 1]
-        y_pred_out = self.model.predict(self.X_test)
-        y_proba_out = self.model.predict_proba(self.X_test)[:, 1]
-
-        # Tính metrics
-        self.metrics_in = {
-            "accuracy": accuracy_score(self.y_train, y_pred_in),
-            "precision": precision_score(self.y_train, y_pred_in, zero_division=0),
-            "recall": recall_score(self.y_train, y_pred_in, zero_division=0),
-            "f1": f1_score(self.y_train, y_pred_in, zero_division=0),
-            "auc": roc_auc_score(self.y_train, y_proba_in),
+        self._evaluate()
+
+        print("✅ Huấn luyện hoàn tất!")
+
+        return {
+            "status": "success",
+            "message": "Mô hình đã được huấn luyện thành công!",
+            "mode": "full",
+            "oof_cache_hit": oof_cached,
+            "oof_cache_key": self.oof_cache_key,
+            "model_params": self.model_params,
+            "train_samples": len(self.X_train),
+            "test_samples": len(self.X_test),
+            "metrics_train": self.metrics_in,
+            "metrics_test": self.metrics_out,
+            "training_time_seconds": round(time.time() - start_time, 2)
         }
 
-        self.metrics_out = {
-            "accuracy": accuracy_score(self.y_test, y_pred_out),
-            "precision": precision_score(self.y_test, y_pred_out, zero_division=0),
-            "recall": recall_score(self.y_test, y_pred_out, zero_division=0),
-            "f1": f1_score(self.y_test, y_pred_out, zero_division=0),
-            "auc": roc_auc_score(self.y_test, y_proba_out),
+    def train_incremental(self, csv_file_path: str, n_new_trees: int = 50) -> Dict[str, Any]:
+        """
+        Huấn luyện tăng dần (warm-start) với cửa sổ dữ liệu mới
+
+        Dữ liệu mới được nối vào tập train/test đã lưu. XGBoost boosting tiếp từ booster
+        hiện có, Random Forest thêm cây qua warm_start, còn meta-model chỉ được fit lại
+        trên out-of-fold predictions đã lưu cộng với PD của base models cũ trên dữ liệu mới
+        (các dòng này chưa được base models nhìn thấy nên vẫn là dự báo out-of-sample).
+
+        Args:
+            csv_file_path: Đường dẫn (hoặc file-like object) file CSV chứa cửa sổ quan sát mới
+            n_new_trees: Số cây thêm vào Random Forest và số vòng boosting thêm cho XGBoost
+
+        Returns:
+            Dict chứa metrics và thông tin huấn luyện
+        """
+        if self.model is None or self.oof_train is None or self.X_train is None:
+            raise ValueError(
+                "Chưa có mô hình/dữ liệu huấn luyện đã lưu để huấn luyện tăng dần. "
+                "Vui lòng huấn luyện đầy đủ (mode=full) trước."
+            )
+        if n_new_trees < 1:
+            raise ValueError("n_new_trees phải >= 1")
+
+        start_time = time.time()
+
+        # Đọc cửa sổ dữ liệu mới
+        X_new, y_new = self._read_training_csv(csv_file_path)
+
+        # Chia train/test cho dữ liệu mới (giữ tỷ lệ 80/20 như lần huấn luyện đầy đủ)
+        if len(X_new) >= 10 and y_new.nunique() == 2 and y_new.value_counts().min() >= 2:
+            X_new_train, X_new_test, y_new_train, y_new_test = train_test_split(
+                X_new, y_new, test_size=0.2, random_state=42, stratify=y_new
+            )
+        else:
+            X_new_train, y_new_train = X_new, y_new
+            X_new_test, y_new_test = X_new.iloc[:0], y_new.iloc[:0]
+
+        # 1. PD của base models cũ trên dữ liệu mới (trước khi cập nhật)
+        oof_new = self._base_predictions(X_new_train)
+
+        # 2. Nối dữ liệu mới vào tập train/test
+        self.X_train = pd.concat([self.X_train, X_new_train])
+        self.y_train = pd.concat([self.y_train, y_new_train])
+        self.X_test = pd.concat([self.X_test, X_new_test])
+        self.y_test = pd.concat([self.y_test, y_new_test])
+        self.oof_train = np.vstack([self.oof_train, oof_new])
+        self.oof_cache_key = None
+
+        # 3. Cập nhật base models
+        print(f"🔁 Huấn luyện tăng dần với {len(X_new)} quan sát mới...")
+        X_train = self._model_input(self.X_train)
+        self.model_logistic.set_params(warm_start=True)
+        self.model_logistic.fit(X_train, self.y_train)
+
+        rf_trees = self.model_rf.n_estimators + n_new_trees
+        self.model_rf.set_params(warm_start=True, n_estimators=rf_trees)
+        with warnings.catch_warnings():
+            # class_weight="balanced" được tính lại trên toàn bộ dữ liệu đã nối
+            warnings.filterwarnings("ignore", message=".*warm_start.*", category=UserWarning)
+            self.model_rf.fit(X_train, self.y_train)
+
+        xgb_rounds = self.model_xgb.get_booster().num_boosted_rounds() + n_new_trees
+        self.model_xgb.set_params(n_estimators=n_new_trees)
+        self.model_xgb.fit(X_train, self.y_train, xgb_model=self.model_xgb.get_booster())
+        self.model_xgb.set_params(n_estimators=xgb_rounds)
+
+        # 4. Chỉ fit lại meta-model trên OOF predictions đã cập nhật
+        self.meta_model.fit(self.oof_train, self.y_train)
+        self._assemble_stacking(self.X_train, self.y_train)
+
+        # Đánh giá mô hình
+        self._evaluate()
+
+        print("✅ Huấn luyện tăng dần hoàn tất!")
+
+        return {
+            "status": "success",
+            "message": "Mô hình đã được huấn luyện tăng dần thành công!",
+            "mode": "incremental",
+            "new_samples": len(X_new),
+            "train_samples": len(self.X_train),
+            "test_samples": len(self.X_test),
+            "rf_n_estimators": rf_trees,
+            "xgb_boosting_rounds": xgb_rounds,
+            "metrics_train": self.metrics_in,
+            "metrics_test": self.metrics_out,
+            "training_time_seconds": round(time.time() - start_time, 2)
         }
 
-        print("✅ Huấn luyện hoàn tất!")
+    def retrain_meta_model(
+        self,
+        C: float = 1.0,
+        class_weight: Optional[str] = None,
+        threshold: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Chỉ huấn luyện lại meta-model trên OOF predictions đã lưu (không fit lại base models)
+
+        Args:
+            C: Hệ số regularization nghịch đảo của meta LogisticRegression
+            class_weight: None hoặc "balanced"
+            threshold: Ngưỡng phân loại mới (None = giữ nguyên)
+
+        Returns:
+            Dict chứa metrics và thông tin huấn luyện
+        """
+        if self.model is None or self.oof_train is None or self.X_train is None:
+            raise ValueError(
+                "Chưa có OOF predictions đã lưu. Vui lòng huấn luyện đầy đủ mô hình trước."
+            )
+        if C <= 0:
+            raise ValueError("C phải > 0")
+        if class_weight not in (None, "balanced"):
+            raise ValueError("class_weight phải là null hoặc 'balanced'")
+        if threshold is not None and not 0 < threshold < 1:
+            raise ValueError("threshold phải nằm trong khoảng (0, 1)")
+
+        start_time = time.time()
+
+        self.meta_model = LogisticRegression(
+            random_state=42, max_iter=1000, C=C, class_weight=class_weight
+        )
+        self.meta_model.fit(self.oof_train, self.y_train)
+        self._assemble_stacking(self.X_train, self.y_train)
+
+        if threshold is not None:
+            self.threshold = threshold
+            self.model_version = bump_model_version('credit_risk')
+
+        self._evaluate()
+
+        # Metrics trên tập test theo ngưỡng phân loại đang dùng cho dự báo
+        proba_test = self.predict_pd(self.X_test)
+        metrics_at_threshold = self._compute_metrics(
+            self.y_test, (proba_test >= self.threshold).astype(int), proba_test
+        )
 
         return {
             "status": "success",
-            "message": "Mô hình đã được huấn luyện thành công!",
+            "message": "Meta-model đã được huấn luyện lại trên OOF predictions!",
+            "mode": "meta_only",
+            "meta_params": {"C": C, "class_weight": class_weight},
+            "threshold": self.threshold,
             "train_samples": len(self.X_train),
             "test_samples": len(self.X_test),
             "metrics_train": self.metrics_in,
-            "metrics_test": self.metrics_out
+            "metrics_test": self.metrics_out,
+            "metrics_test_at_threshold": metrics_at_threshold,
+            "training_time_seconds": round(time.time() - start_time, 3)
         }
 
-    def predict(self, X_new: pd.DataFrame) -> Dict[str, Any]:
+    @staticmethod
+    def _expected_calibration_error(y_true, y_proba, n_bins: int = 10) -> float:
+        """Expected Calibration Error (ECE) với n_bins khoảng PD đều nhau"""
+        y_true = np.asarray(y_true, dtype=float)
+        y_proba = np.asarray(y_proba, dtype=float)
+        bins = np.minimum((y_proba * n_bins).astype(int), n_bins - 1)
+
+        ece = 0.0
+        for b in np.unique(bins):
+            mask = bins == b
+            ece += mask.mean() * abs(y_true[mask].mean() - y_proba[mask].mean())
+        return float(ece)
+
+    def _predict_student_proba(self, X: Union[FeatureVector, pd.DataFrame]) -> np.ndarray:
+        """PD từ mô hình student (student học logit PD của Stacking)"""
+        logits = self.student_model.predict(self._model_input(X))
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def _measure_latency_ms(self, X_row: FeatureVector, fast: bool, repeats: int = 30) -> float:
+        """Độ trễ trung vị (ms) của predict() cho 1 DN"""
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            # Gọi bản không cache để đo đúng thời gian suy luận
+            self.predict.__wrapped__(self, X_row, fast=fast)
+            timings.append((time.perf_counter() - start) * 1000)
+        return float(np.median(timings))
+
+    def distill_student(
+        self,
+        n_estimators: int = STUDENT_PARAMS['n_estimators'],
+        max_depth: int = STUDENT_PARAMS['max_depth'],
+        learning_rate: float = STUDENT_PARAMS['learning_rate']
+    ) -> Dict[str, Any]:
+        """
+        Chưng cất (distill) Stacking thành một mô hình student gọn nhẹ
+
+        Student là GradientBoostingRegressor nông học logit của PD mềm (soft PD) do
+        Stacking dự báo trên tập train; PD student = sigmoid(dự báo).
+
+        Args:
+            n_estimators: Số cây của student
+            max_depth: Độ sâu tối đa mỗi cây
+            learning_rate: Learning rate
+
+        Returns:
+            Dict báo cáo chênh lệch AUC/calibration và độ trễ giữa Stacking và student
+        """
+        if self.model is None or self.X_train is None:
+            raise ValueError("Mô hình chưa được huấn luyện. Vui lòng huấn luyện trước khi chưng cất.")
+
+        start_time = time.time()
+
+        # 1. Soft PD của Stacking (teacher) → logit
+        soft_pd = np.clip(self.predict_pd(self.X_train), 1e-6, 1 - 1e-6)
+        target = np.log(soft_pd / (1 - soft_pd))
+
+        # 2. Train student
+        print("🎓 Đang chưng cất Stacking thành mô hình student...")
+        student = GradientBoostingRegressor(
+            n_estimators=n_estimators,
+            max_depth=max_depth,
+            learning_rate=learning_rate,
+            random_state=42
+        )
+        student.fit(self._model_input(self.X_train), target)
+        self.student_model = student
+        self.model_version = bump_model_version('credit_risk')
+
+        # 3. So sánh teacher và student trên tập test
+        teacher_test = self.predict_pd(self.X_test)
+        student_test = self._predict_student_proba(self.X_test)
+
+        teacher_auc = roc_auc_score(self.y_test, teacher_test)
+        student_auc = roc_auc_score(self.y_test, student_test)
+        teacher_ece = self._expected_calibration_error(self.y_test, teacher_test)
+        student_ece = self._expected_calibration_error(self.y_test, student_test)
+
+        # 4. Độ trễ dự báo 1 DN
+        X_row = FeatureVector.from_frame(self.X_test.iloc[:1])
+        teacher_latency = self._measure_latency_ms(X_row, fast=False)
+        student_latency = self._measure_latency_ms(X_row, fast=True)
+
+        self.distillation_report = {
+            "student_params": {
+                "n_estimators": n_estimators,
+                "max_depth": max_depth,
+                "learning_rate": learning_rate
+            },
+            "teacher_auc": teacher_auc,
+            "student_auc": student_auc,
+            "auc_gap": teacher_auc - student_auc,
+            "teacher_brier": brier_score_loss(self.y_test, teacher_test),
+            "student_brier": brier_score_loss(self.y_test, student_test),
+            "teacher_ece": teacher_ece,
+            "student_ece": student_ece,
+            "calibration_gap": student_ece - teacher_ece,
+            "mean_abs_pd_diff": float(np.mean(np.abs(teacher_test - student_test))),
+            "max_abs_pd_diff": float(np.max(np.abs(teacher_test - student_test))),
+            "label_agreement": float(np.mean(
+                (teacher_test >= self.threshold) == (student_test >= self.threshold)
+            )),
+            "teacher_latency_ms": teacher_latency,
+            "student_latency_ms": student_latency,
+            "speedup": teacher_latency / student_latency if student_latency > 0 else None
+        }
+
+        print(f"✅ Chưng cất hoàn tất! AUC teacher={teacher_auc:.4f}, student={student_auc:.4f}, "
+              f"tăng tốc {self.distillation_report['speedup']:.1f}x")
+
+        return {
+            "status": "success",
+            "message": "Đã chưng cất mô hình student thành công!",
+            **self.distillation_report,
+            "training_time_seconds": round(time.time() - start_time, 2)
+        }
+
+    @memoize_score('credit_risk')
+    def predict(
+        self,
+        X_new: Union[FeatureVector, pd.DataFrame, Dict[str, float]],
+        fast: bool = False
+    ) -> Dict[str, Any]:
         """
         Dự báo PD cho dữ liệu mới
 
         Args:
-            X_new: DataFrame chứa 14 chỉ số X_1 đến X_14
+            X_new: FeatureVector (hoặc DataFrame/dict) chứa 14 chỉ số X_1 đến X_14
+            fast: Dùng mô hình student (chưng cất) thay cho Stacking + 3 base models
 
         Returns:
             Dict chứa PD từ 4 models và kết quả dự đoán
+            (fast=True: pd_stacking là PD xấp xỉ từ student, không có PD của base models)
         """
         if self.model is None:
             raise ValueError("Mô hình chưa được huấn luyện. Vui lòng huấn luyện trước khi dự báo.")
 
-        # Đảm bảo thứ tự cột đúng
-        X_new = X_new[MODEL_COLS]
+        # Vector 14 chỉ số đã kiểm tra (dựng một lần, dùng cho mọi mô hình)
+        features = FeatureVector.coerce(X_new)
+        X_new = self._model_input(features)
+
+        if fast:
+            if self.student_model is None:
+                raise ValueError("Chưa có mô hình student. Vui lòng chưng cất (distill) trước.")
+
+            probs_student = self._predict_student_proba(features)
+            preds = (probs_student >= self.threshold).astype(int)
+
+            return {
+                "pd_stacking": float(probs_student[0]),
+                "prediction": int(preds[0]),
+                "prediction_label": "Default (Vỡ nợ)" if preds[0] == 1 else "Non-Default (Không vỡ nợ)",
+                "model_used": "student"
+            }
 
         # 1. PD từ Stacking Model (kết quả chính)
         probs_stacking = self.model.predict_proba(X_new)[:, 1]
@@ -174,8 +669,8 @@ class CreditRiskModel:
         probs_rf = self.model_rf.predict_proba(X_new)[:, 1]
         probs_xgb = self.model_xgb.predict_proba(X_new)[:, 1]
 
-        # Ngưỡng phân loại: PD >= 15% = Default
-        preds = (probs_stacking >= 0.15).astype(int)
+        # Ngưỡng phân loại (mặc định PD >= 15% = Default)
+        preds = (probs_stacking >= self.threshold).astype(int)
 
         return {
             "pd_stacking": float(probs_stacking[0]),
@@ -183,9 +678,45 @@ class CreditRiskModel:
             "pd_random_forest": float(probs_rf[0]),
             "pd_xgboost": float(probs_xgb[0]),
             "prediction": int(preds[0]),
-            "prediction_label": "Default (Vỡ nợ)" if preds[0] == 1 else "Non-Default (Không vỡ nợ)"
+            "prediction_label": "Default (Vỡ nợ)" if preds[0] == 1 else "Non-Default (Không vỡ nợ)",
+            "model_used": "stacking"
         }
 
+    def predict_batch(self, X_new: Union[FeatureVector, pd.DataFrame]) -> List[Dict[str, Any]]:
+        """
+        Dự báo PD cho nhiều DN cùng lúc (mỗi mô hình chỉ gọi predict_proba một lần)
+
+        Args:
+            X_new: FeatureVector (hoặc DataFrame) nhiều dòng chứa 14 chỉ số
+
+        Returns:
+            List dict kết quả theo từng dòng (cùng cấu trúc với predict())
+        """
+        if self.model is None:
+            raise ValueError("Mô hình chưa được huấn luyện. Vui lòng huấn luyện trước khi dự báo.")
+
+        features = FeatureVector.coerce(X_new)
+        X_input = self._model_input(features)
+
+        probs_stacking = self.model.predict_proba(X_input)[:, 1]
+        probs_logistic = self.model_logistic.predict_proba(X_input)[:, 1]
+        probs_rf = self.model_rf.predict_proba(X_input)[:, 1]
+        probs_xgb = self.model_xgb.predict_proba(X_input)[:, 1]
+        preds = (probs_stacking >= self.threshold).astype(int)
+
+        return [
+            {
+                "pd_stacking": float(probs_stacking[i]),
+                "pd_logistic": float(probs_logistic[i]),
+                "pd_random_forest": float(probs_rf[i]),
+                "pd_xgboost": float(probs_xgb[i]),
+                "prediction": int(preds[i]),
+                "prediction_label": "Default (Vỡ nợ)" if preds[i] == 1 else "Non-Default (Không vỡ nợ)",
+                "model_used": "stacking"
+            }
+            for i in range(len(features))
+        ]
+
     def save_model(self, filepath: str = "model_stacking.pkl"):
         """Lưu mô hình ra file"""
         if self.model is None:
@@ -196,6 +727,18 @@ class CreditRiskModel:
             "model_logistic": self.model_logistic,
             "model_rf": self.model_rf,
             "model_xgb": self.model_xgb,
+            "meta_model": self.meta_model,
+            "model_params": self.model_params,
+            # Dữ liệu huấn luyện + OOF predictions phục vụ huấn luyện tăng dần
+            "X_train": self.X_train,
+            "X_test": self.X_test,
+            "y_train": self.y_train,
+            "y_test": self.y_test,
+            "oof_train": self.oof_train,
+            "oof_cache_key": self.oof_cache_key,
+            "threshold": self.threshold,
+            "student_model": self.student_model,
+            "distillation_report": self.distillation_report,
             "metrics_in": self.metrics_in,
             "metrics_out": self.metrics_out
         }
@@ -217,8 +760,21 @@ class CreditRiskModel:
         self.model_logistic = model_data["model_logistic"]
         self.model_rf = model_data["model_rf"]
         self.model_xgb = model_data["model_xgb"]
+        # File mô hình cũ không có dữ liệu huấn luyện -> chỉ hỗ trợ huấn luyện đầy đủ
+        self.meta_model = model_data.get("meta_model")
+        self.model_params = model_data.get("model_params", dict(CREDIT_MODEL_PARAMS))
+        self.X_train = model_data.get("X_train")
+        self.X_test = model_data.get("X_test")
+        self.y_train = model_data.get("y_train")
+        self.y_test = model_data.get("y_test")
+        self.oof_train = model_data.get("oof_train")
+        self.oof_cache_key = model_data.get("oof_cache_key")
+        self.threshold = model_data.get("threshold", DEFAULT_THRESHOLD)
+        self.student_model = model_data.get("student_model")
+        self.distillation_report = model_data.get("distillation_report", {})
         self.metrics_in = model_data["metrics_in"]
         self.metrics_out = model_data["metrics_out"]
+        self.model_version = bump_model_version('credit_risk')
 
         print(f"✅ Mô hình đã được load từ: {filepath}")
 
@@ -0,0 +1,101 @@
+"""
+Module Model Registry - Lưu cấu hình siêu tham số đã được promote cho từng nhóm mô hình
+Các module model.py, early_warning.py, anomaly_detection.py đọc cấu hình từ đây khi huấn luyện
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, Any
+
+# File registry (JSON) lưu cấu hình tốt nhất của từng nhóm mô hình
+MODEL_REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH", "model_registry.json")
+
+# Các nhóm mô hình được quản lý
+MODEL_FAMILIES = ('credit_risk', 'early_warning', 'anomaly')
+
+
+def load_registry(path: str = None) -> Dict[str, Any]:
+    """
+    Đọc toàn bộ registry
+
+    Args:
+        path: Đường dẫn file registry (mặc định MODEL_REGISTRY_PATH)
+
+    Returns:
+        Dict {family: record}, rỗng nếu chưa có file
+    """
+    path = path or MODEL_REGISTRY_PATH
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Không đọc được model registry ({path}): {e}")
+        return {}
+
+
+def get_promoted_params(family: str, path: str = None) -> Dict[str, Any]:
+    """
+    Lấy siêu tham số đã promote của một nhóm mô hình
+
+    Args:
+        family: 'credit_risk', 'early_warning' hoặc 'anomaly'
+        path: Đường dẫn file registry
+
+    Returns:
+        Dict siêu tham số (rỗng nếu chưa promote → dùng cấu hình mặc định)
+    """
+    record = load_registry(path).get(family)
+    if not record:
+        return {}
+    return dict(record.get('params', {}))
+
+
+def promote_config(
+    family: str,
+    params: Dict[str, Any],
+    score: float,
+    baseline_score: float,
+    search_id: str,
+    path: str = None
+) -> Dict[str, Any]:
+    """
+    Promote cấu hình tốt nhất vào registry (ghi atomic)
+
+    Args:
+        family: Nhóm mô hình
+        params: Siêu tham số được promote
+        score: AUC validation của cấu hình
+        baseline_score: AUC validation của cấu hình mặc định
+        search_id: ID của lần tìm kiếm
+
+    Returns:
+        Record đã ghi vào registry
+    """
+    if family not in MODEL_FAMILIES:
+        raise ValueError(f"family phải là một trong {MODEL_FAMILIES}")
+
+    path = path or MODEL_REGISTRY_PATH
+    registry = load_registry(path)
+
+    record = {
+        'params': params,
+        'validation_auc': score,
+        'baseline_validation_auc': baseline_score,
+        'search_id': search_id,
+        'promoted_at': datetime.now().isoformat()
+    }
+    registry[family] = record
+
+    # File tạm riêng của lượt ghi → 2 lượt promote đồng thời không ghi đè file tạm của nhau
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(path) or ".",
+                                     suffix=".tmp", delete=False) as f:
+        json.dump(registry, f, ensure_ascii=False, indent=2)
+    os.replace(f.name, path)
+
+    print(f"🏷️ Đã promote cấu hình mới cho {family}: {params}")
+    return record
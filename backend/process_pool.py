@@ -0,0 +1,34 @@
+"""
+Module Process Pool - Tạo ProcessPoolExecutor an toàn trong process server
+
+Process uvicorn đã có sẵn nhiều thread (event loop, anyio worker thread...). Start method mặc
+định trên Linux là fork: process con chỉ sao chép thread đang gọi, các lock do thread khác giữ
+tại thời điểm fork (font cache của matplotlib, logging...) bị khóa vĩnh viễn → process con treo.
+Vì vậy mọi process pool dùng forkserver (hoặc spawn nếu hệ điều hành không hỗ trợ).
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Start method của process con: forkserver (Linux/macOS) hoặc spawn (Windows)
+PROCESS_START_METHOD = os.getenv(
+    "PROCESS_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def new_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Tạo process pool với start method an toàn (không fork process đa luồng)
+
+    Args:
+        max_workers: Số process
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(PROCESS_START_METHOD)
+    )
@@ -0,0 +1,89 @@
+"""
+Module Quantile Sketch - Ước lượng phân vị tăng dần bằng thuật toán P² (Jain & Chlamtac, 1985)
+
+Mỗi sketch giữ 5 marker cho một phân vị p trên nhiều cột cùng lúc (vector hóa theo cột),
+cập nhật O(1) bộ nhớ và thời gian cho mỗi quan sát mới, không cần giữ lại dữ liệu gốc.
+"""
+
+import numpy as np
+
+
+class P2QuantileSketch:
+    """Ước lượng phân vị p cho từng cột của luồng quan sát (n, n_columns)"""
+
+    def __init__(self, p: float, sample: np.ndarray):
+        """
+        Khởi tạo sketch từ mẫu ban đầu (ví dụ: tập train)
+
+        Args:
+            p: Phân vị cần ước lượng (0 < p < 1), ví dụ 0.05 cho P5
+            sample: Mảng shape (m, n_columns), m >= 5
+        """
+        if not 0 < p < 1:
+            raise ValueError("p phải nằm trong khoảng (0, 1)")
+        sample = np.asarray(sample, dtype=np.float64)
+        if sample.ndim != 2 or sample.shape[0] < 5:
+            raise ValueError("Cần ít nhất 5 quan sát để khởi tạo P² sketch")
+
+        m = sample.shape[0]
+        self.p = p
+        self.count = m
+        # Bước tăng của vị trí mong muốn cho 5 marker: min, p/2, p, (1+p)/2, max
+        self.increments = np.array([0.0, p / 2, p, (1 + p) / 2, 1.0])
+        self.desired = 1 + self.increments * (m - 1)
+
+        # Vị trí thực (1-based, nguyên, tăng ngặt) gần vị trí mong muốn nhất
+        positions = np.empty(5)
+        for i in range(5):
+            lower = positions[i - 1] + 1 if i > 0 else 1
+            upper = m - (4 - i)
+            positions[i] = min(max(round(self.desired[i]), lower), upper)
+
+        ordered = np.sort(sample, axis=0)
+        self.heights = ordered[positions.astype(int) - 1].copy()  # (5, n_columns)
+        self.positions = np.repeat(positions[:, None], sample.shape[1], axis=1)
+
+    @property
+    def value(self) -> np.ndarray:
+        """Ước lượng phân vị hiện tại, shape (n_columns,)"""
+        return self.heights[2].copy()
+
+    def update(self, x: np.ndarray):
+        """
+        Cập nhật sketch với 1 quan sát mới
+
+        Args:
+            x: Mảng shape (n_columns,)
+        """
+        x = np.asarray(x, dtype=np.float64)
+        q, n = self.heights, self.positions
+
+        # 1. TÌM Ô CHỨA x VÀ CẬP NHẬT MIN/MAX
+        k = (x[None, :] >= q[1:4]).sum(axis=0)
+        q[0] = np.minimum(q[0], x)
+        q[4] = np.maximum(q[4], x)
+
+        # 2. DỊCH VỊ TRÍ CÁC MARKER PHÍA SAU x
+        n += np.arange(5)[:, None] > k[None, :]
+        self.desired += self.increments
+        self.count += 1
+
+        # 3. ĐIỀU CHỈNH 3 MARKER GIỮA (PARABOLIC, FALLBACK TUYẾN TÍNH)
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            move = ((d >= 1) & (n[i + 1] - n[i] > 1)) | ((d <= -1) & (n[i - 1] - n[i] < -1))
+            if not move.any():
+                continue
+            s = np.sign(d)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                parabolic = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                neighbour = np.where(s > 0, i + 1, i - 1)
+                cols = np.arange(q.shape[1])
+                linear = q[i] + s * (q[neighbour, cols] - q[i]) / (n[neighbour, cols] - n[i])
+
+            valid = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(valid, parabolic, linear), q[i])
+            n[i] = np.where(move, n[i] + s, n[i])
@@ -6,12 +6,99 @@ Xuất 14 chỉ số, PD, biểu đồ và phân tích của Gemini ra file Word
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from typing import Dict, Any, List
-import matplotlib.pyplot as plt
+from typing import Dict, Any, List, Optional, Tuple
+from matplotlib.figure import Figure
 import io
 import os
 from datetime import datetime
 
+# Độ phân giải ảnh biểu đồ nhúng trong báo cáo Word
+REPORT_CHART_DPI = int(os.getenv("REPORT_CHART_DPI", "300"))
+
+
+def _figure_to_png(fig: Figure, dpi: int) -> bytes:
+    """Render figure ra PNG trong bộ nhớ (không ghi file, không dùng state toàn cục của pyplot)"""
+    buffer = io.BytesIO()
+    fig.tight_layout()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def render_pd_comparison_chart(prediction: Dict[str, Any], dpi: int = REPORT_CHART_DPI) -> bytes:
+    """
+    Biểu đồ 1: So sánh PD từ 4 models
+
+    Dùng Figure trực tiếp (không qua pyplot) nên an toàn khi chạy song song ở nhiều thread/process.
+
+    Args:
+        prediction: Dict chứa pd_stacking, pd_logistic, pd_random_forest, pd_xgboost
+        dpi: Độ phân giải ảnh
+
+    Returns:
+        Ảnh PNG (bytes)
+    """
+    fig = Figure(figsize=(10, 6))
+    ax1 = fig.subplots()
+    models = ['Stacking', 'Logistic', 'Random Forest', 'XGBoost']
+    pd_values = [
+        prediction.get('pd_stacking', 0) * 100,
+        prediction.get('pd_logistic', 0) * 100,
+        prediction.get('pd_random_forest', 0) * 100,
+        prediction.get('pd_xgboost', 0) * 100
+    ]
+
+    colors = ['#00a651', '#4CAF50', '#8BC34A', '#CDDC39']
+    bars = ax1.bar(models, pd_values, color=colors)
+    ax1.set_ylabel('Xác suất Vỡ nợ (%)', fontsize=12)
+    ax1.set_title('So sánh PD từ 4 Models', fontsize=14, fontweight='bold')
+    ax1.set_ylim(0, 100)
+
+    # Thêm giá trị trên các cột
+    for bar, value in zip(bars, pd_values):
+        height = bar.get_height()
+        ax1.text(bar.get_x() + bar.get_width()/2., height,
+                f'{value:.2f}%',
+                ha='center', va='bottom', fontsize=10)
+
+    return _figure_to_png(fig, dpi)
+
+
+def render_indicators_chart(indicators_dict: Dict[str, float], dpi: int = REPORT_CHART_DPI) -> bytes:
+    """
+    Biểu đồ 2: 14 chỉ số tài chính (2 nhóm, bar ngang)
+
+    Args:
+        indicators_dict: Dict X_1 → X_14
+        dpi: Độ phân giải ảnh
+
+    Returns:
+        Ảnh PNG (bytes)
+    """
+    fig = Figure(figsize=(14, 6))
+    ax2_1, ax2_2 = fig.subplots(1, 2)
+
+    # Biểu đồ 2a: Nhóm chỉ số sinh lời và đòn bẩy (X1-X6)
+    indicators_group1 = ['X_1', 'X_2', 'X_3', 'X_4', 'X_5', 'X_6']
+    values_group1 = [indicators_dict.get(key, 0) for key in indicators_group1]
+    labels_group1 = [f'{key}' for key in indicators_group1]
+
+    ax2_1.barh(labels_group1, values_group1, color='#FFB6C1')
+    ax2_1.set_xlabel('Giá trị', fontsize=10)
+    ax2_1.set_title('Nhóm 1: Sinh lời & Đòn bẩy (X1-X6)', fontsize=11, fontweight='bold')
+    ax2_1.grid(axis='x', alpha=0.3)
+
+    # Biểu đồ 2b: Nhóm thanh toán và hiệu quả (X7-X14)
+    indicators_group2 = ['X_7', 'X_8', 'X_9', 'X_10', 'X_11', 'X_12', 'X_13', 'X_14']
+    values_group2 = [indicators_dict.get(key, 0) for key in indicators_group2]
+    labels_group2 = [f'{key}' for key in indicators_group2]
+
+    ax2_2.barh(labels_group2, values_group2, color='#ADD8E6')
+    ax2_2.set_xlabel('Giá trị', fontsize=10)
+    ax2_2.set_title('Nhóm 2: Thanh toán & Hiệu quả (X7-X14)', fontsize=11, fontweight='bold')
+    ax2_2.grid(axis='x', alpha=0.3)
+
+    return _figure_to_png(fig, dpi)
+
 
 class ReportGenerator:
     """Class để tạo báo cáo Word"""
@@ -115,81 +202,31 @@ class ReportGenerator:
 
         self.doc.add_paragraph()
 
-    def add_chart(self, prediction: Dict[str, Any], indicators_dict: Dict[str, float]):
-        """Thêm biểu đồ vào báo cáo"""
+    def add_chart(self, prediction: Dict[str, Any], indicators_dict: Dict[str, float],
+                  chart_images: Optional[Tuple[bytes, bytes]] = None):
+        """
+        Thêm biểu đồ vào báo cáo
+
+        Args:
+            prediction: Kết quả dự báo PD
+            indicators_dict: Dict X_1 → X_14
+            chart_images: (PNG so sánh PD, PNG 14 chỉ số) đã render sẵn (None = render tại chỗ)
+        """
+        if chart_images is None:
+            chart_images = (render_pd_comparison_chart(prediction), render_indicators_chart(indicators_dict))
+        pd_chart, indicators_chart = chart_images
+
         self.add_section_title('III. BIỂU ĐỒ PHÂN TÍCH')
 
         # Biểu đồ 1: So sánh PD từ 4 models
         self.doc.add_heading('3.1. So sánh Xác suất Vỡ nợ (PD) từ 4 Models', level=2)
-
-        fig1, ax1 = plt.subplots(figsize=(10, 6))
-        models = ['Stacking', 'Logistic', 'Random Forest', 'XGBoost']
-        pd_values = [
-            prediction.get('pd_stacking', 0) * 100,
-            prediction.get('pd_logistic', 0) * 100,
-            prediction.get('pd_random_forest', 0) * 100,
-            prediction.get('pd_xgboost', 0) * 100
-        ]
-
-        colors = ['#00a651', '#4CAF50', '#8BC34A', '#CDDC39']
-        bars = ax1.bar(models, pd_values, color=colors)
-        ax1.set_ylabel('Xác suất Vỡ nợ (%)', fontsize=12)
-        ax1.set_title('So sánh PD từ 4 Models', fontsize=14, fontweight='bold')
-        ax1.set_ylim(0, 100)
-
-        # Thêm giá trị trên các cột
-        for bar, value in zip(bars, pd_values):
-            height = bar.get_height()
-            ax1.text(bar.get_x() + bar.get_width()/2., height,
-                    f'{value:.2f}%',
-                    ha='center', va='bottom', fontsize=10)
-
-        # Lưu biểu đồ
-        chart1_path = 'chart_pd_comparison.png'
-        plt.tight_layout()
-        plt.savefig(chart1_path, dpi=300, bbox_inches='tight')
-        plt.close()
-
-        # Thêm vào document
-        self.doc.add_picture(chart1_path, width=Inches(6))
-        os.remove(chart1_path)
+        self.doc.add_picture(io.BytesIO(pd_chart), width=Inches(6))
 
         self.doc.add_paragraph()
 
         # Biểu đồ 2: 14 chỉ số tài chính
         self.doc.add_heading('3.2. Phân tích 14 Chỉ số Tài chính', level=2)
-
-        fig2, (ax2_1, ax2_2) = plt.subplots(1, 2, figsize=(14, 6))
-
-        # Biểu đồ 2a: Nhóm chỉ số sinh lời và đòn bẩy (X1-X6)
-        indicators_group1 = ['X_1', 'X_2', 'X_3', 'X_4', 'X_5', 'X_6']
-        values_group1 = [indicators_dict.get(key, 0) for key in indicators_group1]
-        labels_group1 = [f'{key}' for key in indicators_group1]
-
-        ax2_1.barh(labels_group1, values_group1, color='#FFB6C1')
-        ax2_1.set_xlabel('Giá trị', fontsize=10)
-        ax2_1.set_title('Nhóm 1: Sinh lời & Đòn bẩy (X1-X6)', fontsize=11, fontweight='bold')
-        ax2_1.grid(axis='x', alpha=0.3)
-
-        # Biểu đồ 2b: Nhóm thanh toán và hiệu quả (X7-X14)
-        indicators_group2 = ['X_7', 'X_8', 'X_9', 'X_10', 'X_11', 'X_12', 'X_13', 'X_14']
-        values_group2 = [indicators_dict.get(key, 0) for key in indicators_group2]
-        labels_group2 = [f'{key}' for key in indicators_group2]
-
-        ax2_2.barh(labels_group2, values_group2, color='#ADD8E6')
-        ax2_2.set_xlabel('Giá trị', fontsize=10)
-        ax2_2.set_title('Nhóm 2: Thanh toán & Hiệu quả (X7-X14)', fontsize=11, fontweight='bold')
-        ax2_2.grid(axis='x', alpha=0.3)
-
-        # Lưu biểu đồ
-        chart2_path = 'chart_indicators.png'
-        plt.tight_layout()
-        plt.savefig(chart2_path, dpi=300, bbox_inches='tight')
-        plt.close()
-
-        # Thêm vào document
-        self.doc.add_picture(chart2_path, width=Inches(6.5))
-        os.remove(chart2_path)
+        self.doc.add_picture(io.BytesIO(indicators_chart), width=Inches(6.5))
 
         self.doc.add_paragraph()
 
@@ -226,16 +263,18 @@ class ReportGenerator:
         disclaimer_run.font.italic = True
         disclaimer_run.font.color.rgb = RGBColor(150, 150, 150)
 
-    def generate_report(self, data: Dict[str, Any], output_path: str = 'bao_cao_tin_dung.docx') -> str:
+    def generate_report(self, data: Dict[str, Any], output_path: Any = 'bao_cao_tin_dung.docx',
+                        chart_images: Optional[Tuple[bytes, bytes]] = None) -> Any:
         """
         Tạo báo cáo hoàn chỉnh
 
         Args:
             data: Dữ liệu bao gồm prediction, indicators, và analysis
-            output_path: Đường dẫn file output
+            output_path: Đường dẫn file output hoặc file-like (io.BytesIO)
+            chart_images: Ảnh biểu đồ đã render sẵn (xem add_chart)
 
         Returns:
-            Đường dẫn file báo cáo
+            Đường dẫn file báo cáo (hoặc chính file-like đã truyền vào)
         """
         try:
             # Lấy dữ liệu
@@ -248,7 +287,7 @@ class ReportGenerator:
             self.add_header()
             self.add_prediction_results(prediction)
             self.add_14_indicators(indicators)
-            self.add_chart(prediction, indicators_dict)
+            self.add_chart(prediction, indicators_dict, chart_images)
             self.add_gemini_analysis(analysis)
             self.add_footer()
 
@@ -259,7 +298,7 @@ class ReportGenerator:
         except Exception as e:
             raise ValueError(f"Lỗi khi tạo báo cáo: {str(e)}")
 
-    def generate_survival_report(self, data: Dict[str, Any], output_path: str = 'bao_cao_survival_analysis.docx') -> str:
+    def generate_survival_report(self, data: Dict[str, Any], output_path: Any = 'bao_cao_survival_analysis.docx') -> Any:
         """
         Tạo báo cáo Survival Analysis
 
@@ -273,7 +312,7 @@ class ReportGenerator:
                 - survival_curve: Timeline và probabilities
                 - gemini_analysis: Phân tích từ Gemini
                 - warning: Cảnh báo (nếu có)
-            output_path: Đường dẫn file output
+            output_path: Đường dẫn file output hoặc file-like (io.BytesIO)
 
         Returns:
             Đường dẫn file báo cáo
@@ -0,0 +1,276 @@
+"""
+Module Report Service - Tạo báo cáo Word bất đồng bộ bằng worker pool
+
+- Biểu đồ render vào bộ nhớ (PNG bytes), không ghi file tạm trong thư mục làm việc,
+  nên nhiều lượt xuất báo cáo đồng thời không ghi đè lên nhau
+- /export-report: 2 biểu đồ được render song song trên worker pool, docx ghép trong thread
+- Xuất hàng loạt: job chạy nền, mỗi doanh nghiệp 1 file .docx (song song trên worker pool),
+  kết quả là file ZIP tải về khi job hoàn tất
+"""
+
+import asyncio
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from process_pool import new_process_pool
+from report_generator import ReportGenerator, render_indicators_chart, render_pd_comparison_chart
+
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# Số process render báo cáo (0 = tự động min(4, số CPU); 1 = dùng thread thay vì process)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "0"))
+# Số báo cáo tối đa trong 1 job xuất hàng loạt
+REPORT_BATCH_MAX_REPORTS = int(os.getenv("REPORT_BATCH_MAX_REPORTS", "200"))
+# Thời gian giữ job (giây) kể từ khi xong hoặc lần tải gần nhất, trước khi xóa file ZIP
+REPORT_JOB_TTL_SECONDS = int(os.getenv("REPORT_JOB_TTL_SECONDS", "3600"))
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+# job_id → trạng thái job (chỉ sửa trên event loop)
+_jobs: Dict[str, Dict[str, Any]] = {}
+
+
+def get_report_executor() -> Executor:
+    """
+    Worker pool dùng chung (tạo lần đầu khi cần)
+
+    Process pool để render matplotlib song song thật sự (không bị GIL), tạo bằng forkserver/spawn
+    vì lúc này process uvicorn đã có nhiều thread (xem process_pool);
+    1 CPU hoặc không tạo được process → thread pool.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = REPORT_WORKERS or min(4, os.cpu_count() or 1)
+            if max_workers > 1:
+                try:
+                    _executor = new_process_pool(max_workers)
+                except OSError as e:
+                    print(f"⚠️ Không tạo được process pool cho báo cáo ({e}), dùng thread pool...")
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(max_workers, 2), thread_name_prefix="report")
+        return _executor
+
+
+def shutdown_report_executor():
+    """Dừng worker pool (gọi khi tắt ứng dụng)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def build_report(report_data: Dict[str, Any], chart_images: Optional[tuple] = None) -> bytes:
+    """
+    Tạo báo cáo tín dụng hoàn chỉnh trong bộ nhớ (chạy được trong process con)
+
+    Args:
+        report_data: Dict chứa prediction, indicators, indicators_dict và analysis
+        chart_images: Ảnh biểu đồ đã render sẵn (None = render tuần tự tại chỗ)
+
+    Returns:
+        Nội dung file .docx
+    """
+    buffer = io.BytesIO()
+    ReportGenerator().generate_report(report_data, buffer, chart_images)
+    return buffer.getvalue()
+
+
+def build_survival_report(data: Dict[str, Any]) -> bytes:
+    """
+    Tạo báo cáo Survival Analysis trong bộ nhớ
+
+    Args:
+        data: Dict kết quả survival analysis (xem ReportGenerator.generate_survival_report)
+
+    Returns:
+        Nội dung file .docx
+    """
+    buffer = io.BytesIO()
+    ReportGenerator().generate_survival_report(data, buffer)
+    return buffer.getvalue()
+
+
+async def render_report(report_data: Dict[str, Any]) -> bytes:
+    """
+    Tạo 1 báo cáo: 2 biểu đồ render song song trên worker pool, docx ghép trong thread
+
+    Args:
+        report_data: Dict chứa prediction, indicators, indicators_dict và analysis
+
+    Returns:
+        Nội dung file .docx
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_report_executor()
+
+    chart_images = await asyncio.gather(
+        loop.run_in_executor(executor, render_pd_comparison_chart, report_data.get('prediction', {})),
+        loop.run_in_executor(executor, render_indicators_chart, report_data.get('indicators_dict', {}))
+    )
+    return await asyncio.to_thread(build_report, report_data, tuple(chart_images))
+
+
+def _report_filename(report_data: Dict[str, Any], index: int, used: set) -> str:
+    """Tên file .docx cho 1 doanh nghiệp trong ZIP (an toàn, không trùng)"""
+    name = str(report_data.get('company_name') or report_data.get('filename') or f"bao_cao_{index + 1:03d}")
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', '_', name).strip(' .') or f"bao_cao_{index + 1:03d}"
+    if name.lower().endswith('.docx'):
+        name = name[:-5]
+
+    filename = f"{name}.docx"
+    suffix = 2
+    while filename.lower() in used:
+        filename = f"{name}_{suffix}.docx"
+        suffix += 1
+    used.add(filename.lower())
+    return filename
+
+
+def _prune_jobs():
+    """Xóa job đã xong quá REPORT_JOB_TTL_SECONDS, tính từ lúc xong hoặc lần tải gần nhất (kèm file ZIP)"""
+    now = time.time()
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job['finished_at']
+        and now - max(job['finished_at'], job['last_download_at'] or 0) > REPORT_JOB_TTL_SECONDS
+    ]
+    for job_id in expired:
+        job = _jobs.pop(job_id)
+        if job['zip_path'] and os.path.exists(job['zip_path']):
+            os.remove(job['zip_path'])
+
+
+def submit_batch_job(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Tạo job xuất báo cáo hàng loạt (chạy nền trên event loop hiện tại)
+
+    Args:
+        reports: List report_data (mỗi phần tử như body của /export-report, thêm company_name)
+
+    Returns:
+        Trạng thái job (xem job_status)
+    """
+    if not reports:
+        raise ValueError("Danh sách reports rỗng")
+    if len(reports) > REPORT_BATCH_MAX_REPORTS:
+        raise ValueError(f"Tối đa {REPORT_BATCH_MAX_REPORTS} báo cáo mỗi job (nhận {len(reports)})")
+    if not all(isinstance(report, dict) for report in reports):
+        raise ValueError("Mỗi phần tử của reports phải là object")
+
+    _prune_jobs()
+
+    job_id = uuid.uuid4().hex
+    used = set()
+    job = {
+        'job_id': job_id,
+        'status': 'pending',
+        'total': len(reports),
+        'completed': 0,
+        'failed': [],
+        'filenames': [_report_filename(report, i, used) for i, report in enumerate(reports)],
+        'created_at': time.time(),
+        'finished_at': None,
+        'last_download_at': None,
+        'zip_path': None,
+        'error': None,
+    }
+    _jobs[job_id] = job
+    # Giữ tham chiếu tới task để không bị garbage collect khi đang chạy
+    job['task'] = asyncio.get_running_loop().create_task(_run_batch_job(job, reports))
+    return job_status(job_id)
+
+
+async def _run_batch_job(job: Dict[str, Any], reports: List[Dict[str, Any]]):
+    """Render song song từng báo cáo trên worker pool, ghi vào ZIP theo thứ tự hoàn thành"""
+    loop = asyncio.get_running_loop()
+    executor = get_report_executor()
+    job['status'] = 'running'
+    print(f"📄 [REPORT JOB {job['job_id'][:8]}] Bắt đầu xuất {job['total']} báo cáo...")
+
+    fd, zip_path = tempfile.mkstemp(prefix="bao_cao_", suffix=".zip")
+    os.close(fd)
+    job['zip_path'] = zip_path
+
+    async def render_one(index: int):
+        try:
+            return index, await loop.run_in_executor(executor, build_report, reports[index]), None
+        except Exception as e:
+            return index, None, str(e)
+
+    try:
+        # docx đã là ZIP (deflate) → lưu nguyên (ZIP_STORED), không nén lại
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for next_done in asyncio.as_completed([render_one(i) for i in range(len(reports))]):
+                index, content, error = await next_done
+                if error is None:
+                    archive.writestr(job['filenames'][index], content)
+                else:
+                    job['failed'].append({'index': index, 'filename': job['filenames'][index], 'error': error})
+                job['completed'] += 1
+
+        job['status'] = 'done' if len(job['failed']) < job['total'] else 'error'
+        if job['status'] == 'error':
+            job['error'] = "Không tạo được báo cáo nào"
+        print(f"✅ [REPORT JOB {job['job_id'][:8]}] Xong: {job['total'] - len(job['failed'])}/{job['total']} báo cáo")
+    except Exception as e:
+        job['status'] = 'error'
+        job['error'] = str(e)
+        print(f"❌ [REPORT JOB {job['job_id'][:8]}] Lỗi: {e}")
+    finally:
+        job['finished_at'] = time.time()
+        job['task'] = None
+
+
+def job_status(job_id: str) -> Dict[str, Any]:
+    """
+    Trạng thái job xuất báo cáo hàng loạt
+
+    Args:
+        job_id: ID job
+
+    Returns:
+        Dict job_id, status (pending/running/done/error), total, completed, failed, error
+
+    Raises:
+        KeyError: Không có job (hoặc job đã hết hạn)
+    """
+    job = _jobs[job_id]
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'total': job['total'],
+        'completed': job['completed'],
+        'failed': list(job['failed']),
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+    }
+
+
+def job_zip_path(job_id: str) -> str:
+    """
+    Đường dẫn file ZIP của job đã xong
+
+    Mỗi lượt tải gia hạn job thêm REPORT_JOB_TTL_SECONDS, để _prune_jobs không xóa file ZIP
+    trong lúc response còn đang stream.
+
+    Raises:
+        KeyError: Không có job
+        RuntimeError: Job chưa xong hoặc lỗi
+    """
+    job = _jobs[job_id]
+    if job['status'] != 'done':
+        raise RuntimeError(f"Job chưa sẵn sàng để tải (trạng thái: {job['status']})")
+    job['last_download_at'] = time.time()
+    return job['zip_path']
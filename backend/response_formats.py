@@ -0,0 +1,221 @@
+"""
+Module Response Formats - Content negotiation cho các endpoint trả về đường cong / kết quả hàng loạt
+
+Định dạng được chọn theo header Accept của request:
+- application/json (mặc định)
+- application/x-ndjson: dòng đầu là metadata, mỗi dòng sau là 1 bản ghi của bảng dữ liệu
+- application/vnd.apache.arrow.stream: Arrow IPC stream của bảng (số thực float32),
+  phần còn lại của response nằm trong schema metadata (key "meta", JSON)
+- application/msgpack: toàn bộ response, số thực float32; các cột đường cong được gửi
+  dạng buffer float32 little-endian (ExtType code MSGPACK_FLOAT32_EXT)
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi.responses import Response
+
+from json_response import FastJSONResponse, dumps_json
+
+# msgpack, pyarrow là dependency tùy chọn (chưa cài → định dạng tương ứng không được chọn)
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    PYARROW_AVAILABLE = False
+
+JSON_MEDIA_TYPE = "application/json"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Tên khác của các media type client hay gửi
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.msgpack": MSGPACK_MEDIA_TYPE,
+    "application/jsonl": NDJSON_MEDIA_TYPE,
+    "application/json-lines": NDJSON_MEDIA_TYPE,
+}
+
+# ExtType code của MessagePack cho mảng float32 little-endian
+MSGPACK_FLOAT32_EXT = 1
+
+
+def available_formats() -> List[str]:
+    """Các media type đang phục vụ được (phụ thuộc thư viện đã cài)"""
+    formats = [JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE]
+    if PYARROW_AVAILABLE:
+        formats.append(ARROW_MEDIA_TYPE)
+    if MSGPACK_AVAILABLE:
+        formats.append(MSGPACK_MEDIA_TYPE)
+    return formats
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Chọn định dạng response theo header Accept (ưu tiên q-value cao, cùng q thì theo thứ tự)
+
+    Args:
+        accept: Giá trị header Accept (None = JSON)
+
+    Returns:
+        Media type được chọn (mặc định application/json)
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+
+    candidates = []
+    for order, part in enumerate(accept.split(",")):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            candidates.append((-q, order, MEDIA_TYPE_ALIASES.get(media.lower(), media.lower())))
+
+    supported = available_formats()
+    for _, _, media in sorted(candidates):
+        if media in supported:
+            return media
+        if media in ("*/*", "application/*"):
+            return JSON_MEDIA_TYPE
+
+    return JSON_MEDIA_TYPE
+
+
+def _split_table(content: Dict[str, Any], table_key: str) -> Tuple[Dict[str, Any], Dict[str, Any], Optional[List[Dict]]]:
+    """
+    Tách bảng dữ liệu khỏi response
+
+    Bảng là list bản ghi (kết quả hàng loạt) hoặc dict các mảng cùng độ dài (đường cong).
+
+    Returns:
+        (meta, columns, records): meta = phần còn lại của response + mô tả bảng;
+        columns = các cột của đường cong (rỗng nếu bảng là list bản ghi);
+        records = list bản ghi (None nếu bảng là đường cong)
+    """
+    table = content.get(table_key)
+    meta = {key: value for key, value in content.items() if key != table_key}
+
+    if isinstance(table, list):
+        meta[table_key] = {"num_rows": len(table)}
+        return meta, {}, table
+
+    table = table if isinstance(table, dict) else {}
+    lengths = {key: len(value) for key, value in table.items() if isinstance(value, (list, np.ndarray))}
+    num_rows = max(lengths.values()) if lengths else 0
+    columns = {key: table[key] for key, length in lengths.items() if length == num_rows and num_rows > 0}
+
+    meta[table_key] = {key: value for key, value in table.items() if key not in columns}
+    meta[table_key].update({"num_rows": num_rows, "columns": list(columns)})
+    return meta, columns, None
+
+
+def _float32_type(data_type):
+    """Đổi mọi float64 (kể cả trong struct/list) sang float32"""
+    if pa.types.is_float64(data_type):
+        return pa.float32()
+    if pa.types.is_struct(data_type):
+        return pa.struct([field.with_type(_float32_type(field.type)) for field in data_type])
+    if pa.types.is_list(data_type):
+        return pa.list_(_float32_type(data_type.value_type))
+    return data_type
+
+
+def _render_ndjson(content: Dict[str, Any], table_key: str) -> bytes:
+    """Dòng đầu: metadata; mỗi dòng sau: 1 bản ghi (hoặc 1 điểm của đường cong)"""
+    meta, columns, records = _split_table(content, table_key)
+    if records is None:
+        names = list(columns)
+        records = [dict(zip(names, values)) for values in zip(*columns.values())]
+    lines = [dumps_json(meta)] + [dumps_json(record) for record in records]
+    return b"\n".join(lines) + b"\n"
+
+
+def _render_arrow(content: Dict[str, Any], table_key: str) -> bytes:
+    """Arrow IPC stream của bảng (float32), metadata JSON trong schema"""
+    meta, columns, records = _split_table(content, table_key)
+
+    if records is None:
+        table = pa.table({
+            name: pa.array(np.asarray(values, dtype=np.float32)) if np.issubdtype(np.asarray(values).dtype, np.number)
+            else pa.array(list(values))
+            for name, values in columns.items()
+        })
+    else:
+        # Lấy hợp các key của mọi bản ghi (bản ghi lỗi/thành công có thể khác key)
+        names = list(dict.fromkeys(key for record in records for key in record))
+        table = pa.table({name: pa.array([record.get(name) for record in records]) for name in names})
+        table = table.cast(pa.schema([field.with_type(_float32_type(field.type)) for field in table.schema]))
+
+    table = table.replace_schema_metadata({"meta": dumps_json(meta)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """Hook MessagePack: mảng số → buffer float32, numpy scalar → kiểu Python"""
+    if isinstance(obj, np.ndarray):
+        if np.issubdtype(obj.dtype, np.number):
+            return msgpack.ExtType(MSGPACK_FLOAT32_EXT, np.ascontiguousarray(obj, dtype="<f4").tobytes())
+        return obj.tolist()
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    raise TypeError(f"Kiểu dữ liệu không serialize được sang MessagePack: {type(obj).__name__}")
+
+
+def _render_msgpack(content: Dict[str, Any], table_key: str) -> bytes:
+    """Toàn bộ response dạng MessagePack; cột đường cong → buffer float32"""
+    table = content.get(table_key)
+    if isinstance(table, dict):
+        _, columns, _ = _split_table(content, table_key)
+        content = {**content, table_key: {
+            key: np.asarray(value, dtype=np.float32)
+            if key in columns and np.issubdtype(np.asarray(value).dtype, np.number) else value
+            for key, value in table.items()
+        }}
+    return msgpack.packb(content, default=_msgpack_default, use_single_float=True)
+
+
+def negotiated_response(content: Dict[str, Any], accept: Optional[str], table_key: str) -> Response:
+    """
+    Trả response theo định dạng client yêu cầu trong header Accept
+
+    Args:
+        content: Dict response (như bản JSON)
+        accept: Header Accept của request
+        table_key: Key của bảng dữ liệu lớn trong response ('results', 'survival_curve', 'kaplan_meier'...)
+
+    Returns:
+        Response (JSON/NDJSON/Arrow IPC/MessagePack), luôn kèm header Vary: Accept
+    """
+    media_type = negotiate_format(accept)
+    headers = {"Vary": "Accept"}
+
+    if media_type == NDJSON_MEDIA_TYPE:
+        return Response(_render_ndjson(content, table_key), media_type=media_type, headers=headers)
+    if media_type == ARROW_MEDIA_TYPE:
+        return Response(_render_arrow(content, table_key), media_type=media_type, headers=headers)
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return Response(_render_msgpack(content, table_key), media_type=media_type, headers=headers)
+    return FastJSONResponse(content, headers=headers)
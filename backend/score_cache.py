@@ -0,0 +1,141 @@
+"""
+Module Score Cache - Bộ nhớ đệm LRU cho kết quả chấm điểm của cùng một doanh nghiệp
+
+Khóa cache = (nhóm mô hình, phiên bản mô hình, vector 14 chỉ số đã làm tròn, tham số khác).
+Mỗi lần train/load mô hình sinh phiên bản mới và xóa các kết quả cũ của nhóm đó.
+"""
+
+import copy
+import functools
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from feature_vector import FeatureVector
+
+# Số kết quả tối đa được giữ (LRU)
+SCORE_CACHE_SIZE = int(os.getenv("SCORE_CACHE_SIZE", "2048"))
+
+# Số chữ số thập phân khi làm tròn 14 chỉ số để tạo khóa
+SCORE_CACHE_DECIMALS = int(os.getenv("SCORE_CACHE_DECIMALS", "8"))
+
+
+class ScoreCache:
+    """LRU cache thread-safe cho kết quả chấm điểm"""
+
+    def __init__(self, maxsize: int = SCORE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Any:
+        """Trả về (True, value) nếu có trong cache, ngược lại (False, None)"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value: Any):
+        """Lưu kết quả, loại bỏ phần tử ít dùng nhất khi đầy"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, namespace: Optional[str] = None):
+        """Xóa kết quả của một nhóm mô hình (None = xóa toàn bộ)"""
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if k[0] == namespace]:
+                del self._data[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+# Khởi tạo instance global
+score_cache = ScoreCache()
+
+
+def bump_model_version(namespace: str) -> str:
+    """
+    Sinh phiên bản mô hình mới và xóa kết quả cache cũ của nhóm mô hình
+
+    Args:
+        namespace: Nhóm mô hình ('credit_risk', 'early_warning', 'anomaly', 'survival')
+
+    Returns:
+        Chuỗi phiên bản mới
+    """
+    score_cache.invalidate(namespace)
+    return uuid.uuid4().hex
+
+
+def _freeze(value: Any) -> Any:
+    """Chuyển tham số thành dạng hashable (list → tuple)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def memoize_score(namespace: str, fill_missing: Optional[float] = None):
+    """
+    Decorator cache kết quả chấm điểm 1 DN của method nhận (indicators, ...)
+
+    Chỉ cache khi mô hình đã có model_version và đầu vào là đúng 1 DN.
+    Kết quả dạng dict/list được copy khi trả về để caller sửa không ảnh hưởng cache.
+
+    Args:
+        namespace: Nhóm mô hình
+        fill_missing: Giá trị thay cho chỉ số thiếu khi dựng FeatureVector (giống method gốc)
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, indicators, *args, **kwargs):
+            version = getattr(self, 'model_version', None)
+            if version is None:
+                return method(self, indicators, *args, **kwargs)
+
+            features = FeatureVector.coerce(indicators, fill_missing=fill_missing)
+            if len(features) != 1:
+                return method(self, features, *args, **kwargs)
+
+            rounded = np.round(features.values, SCORE_CACHE_DECIMALS) + 0.0  # -0.0 → 0.0
+            key = (namespace, version, method.__name__, rounded.tobytes(),
+                   _freeze(args), _freeze(kwargs))
+
+            found, result = score_cache.get(key)
+            if not found:
+                result = method(self, features, *args, **kwargs)
+                score_cache.put(key, result)
+
+            return copy.deepcopy(result) if isinstance(result, (dict, list)) else result
+
+        return wrapper
+
+    return decorator
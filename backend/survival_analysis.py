@@ -5,10 +5,17 @@ Implements Cox Proportional Hazards, Random Survival Forest, and Kaplan-Meier Es
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Union
 import joblib
+import os
+import pickle
+import tempfile
+import time
 from datetime import datetime
 import warnings
+from feature_vector import FeatureVector, FEATURE_COLS, FEATURE_INDEX
+from process_pool import new_process_pool
+from score_cache import memoize_score, bump_model_version
 warnings.filterwarnings('ignore')
 
 try:
@@ -28,6 +35,191 @@ except ImportError:
     print("Warning: scikit-survival not installed. Install with: pip install scikit-survival")
 
 
+def _largest_triangle_three_buckets(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: chọn n_out điểm giữ hình dạng đường cong
+
+    Returns:
+        Mảng index (tăng dần) các điểm được giữ lại, luôn gồm điểm đầu và cuối
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Chia các điểm giữa thành (n_out - 2) bucket
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = [0]
+    prev = 0
+
+    for b in range(n_out - 2):
+        start, end = edges[b], max(edges[b + 1], edges[b] + 1)
+
+        # Điểm đại diện của bucket kế tiếp = trung bình bucket đó
+        next_start = end
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Diện tích tam giác (prev, điểm ứng viên, avg) - chọn điểm có diện tích lớn nhất
+        areas = np.abs(
+            (x[prev] - avg_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(areas))
+        selected.append(prev)
+
+    selected.append(n - 1)
+    return np.array(selected)
+
+
+def simplify_survival_curve(timeline: List[float], survival_probs: List[float],
+                            tolerance: float = 0.002,
+                            max_points: Optional[int] = None) -> Tuple[List[float], List[float]]:
+    """
+    Rút gọn survival curve (dạng bậc thang) nhưng vẫn giữ hình dạng
+
+    1. Step simplification có chặn sai số: chỉ giữ điểm khi xác suất lệch khỏi điểm
+       giữ gần nhất quá `tolerance` → mọi bước giảm lớn (steep drop) đều được giữ,
+       sai số theo chiều dọc tại các điểm bị bỏ không vượt quá `tolerance`.
+       Giữ cả điểm "góc" ngay trước mỗi bước giảm, nên vẽ dạng bậc thang hay nối thẳng
+       các điểm đều không biến bước giảm thành đoạn dốc kéo dài từ điểm giữ trước đó
+    2. Nếu vẫn còn nhiều hơn max_points → LTTB trên các điểm đã giữ
+
+    Args:
+        timeline: Các thời điểm (tăng dần)
+        survival_probs: Xác suất sống sót tương ứng
+        tolerance: Sai số tối đa cho phép (theo xác suất, VD: 0.002 = 0.2 điểm %)
+        max_points: Giới hạn số điểm (None = không giới hạn)
+
+    Returns:
+        (timeline, survival_probs) đã rút gọn
+    """
+    t = np.asarray(timeline, dtype=float)
+    p = np.asarray(survival_probs, dtype=float)
+    n = len(t)
+    if n <= 2:
+        return t.tolist(), p.tolist()
+
+    keep = [0]
+    ref = p[0]
+    for i in range(1, n - 1):
+        if abs(p[i] - ref) > tolerance:
+            if keep[-1] != i - 1:
+                keep.append(i - 1)
+            keep.append(i)
+            ref = p[i]
+    keep.append(n - 1)
+    keep = np.array(keep)
+
+    if max_points is not None and len(keep) > max_points:
+        keep = keep[_largest_triangle_three_buckets(t[keep], p[keep], max_points)]
+
+    return t[keep].tolist(), p[keep].tolist()
+
+
+# Cấu hình RSF tiết kiệm bộ nhớ: giới hạn số lá, lá lớn hơn, lưới thời gian thô hơn
+RSF_LOW_MEMORY_CONFIG = {
+    'min_samples_leaf': 15,
+    'max_leaf_nodes': 64,
+    'time_resolution': 1.0  # tháng - durations được làm tròn lên bội số của giá trị này
+}
+
+
+class CompactSurvivalForest:
+    """
+    Bản rút gọn của RandomSurvivalForest chỉ để dự báo (low-memory prediction mode)
+
+    Mỗi cây chỉ giữ cấu trúc split (int32/float64) và survival curve của các lá
+    dưới dạng float32; bỏ CHF và các node trong. Cung cấp cùng interface
+    `predict_survival_function(X, return_array=True)` và `unique_times_`
+    mà SurvivalAnalysisSystem sử dụng.
+    """
+
+    def __init__(self, rsf_model):
+        self.unique_times_ = np.asarray(rsf_model.unique_times_, dtype=np.float32)
+        self.n_features_in_ = rsf_model.n_features_in_
+        self.trees = []
+
+        for estimator in rsf_model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+
+            # node id → hàng trong leaf_survival (-1 cho node trong)
+            leaf_index = np.full(tree.node_count, -1, dtype=np.int32)
+            leaf_index[is_leaf] = np.arange(int(is_leaf.sum()), dtype=np.int32)
+
+            self.trees.append({
+                'children_left': tree.children_left.astype(np.int32),
+                'children_right': tree.children_right.astype(np.int32),
+                'feature': tree.feature.astype(np.int32),
+                'threshold': tree.threshold,
+                'leaf_index': leaf_index,
+                # value[..., 1] = survival function tại unique_times_
+                'leaf_survival': np.ascontiguousarray(tree.value[is_leaf, :, 1], dtype=np.float32)
+            })
+
+    def _apply(self, tree: Dict[str, np.ndarray], X: np.ndarray) -> np.ndarray:
+        """Duyệt cây cho toàn bộ X cùng lúc, trả về node lá của từng mẫu"""
+        nodes = np.zeros(X.shape[0], dtype=np.int32)
+        active = tree['children_left'][nodes] != -1
+        rows = np.arange(X.shape[0])
+
+        while active.any():
+            idx = rows[active]
+            current = nodes[idx]
+            go_left = X[idx, tree['feature'][current]] <= tree['threshold'][current]
+            nodes[idx] = np.where(go_left, tree['children_left'][current], tree['children_right'][current])
+            active = tree['children_left'][nodes] != -1
+
+        return nodes
+
+    def predict_survival_function(self, X, return_array: bool = True) -> np.ndarray:
+        """Survival function trung bình qua các cây, tại unique_times_"""
+        # sklearn so sánh split trên float32
+        X = np.asarray(X, dtype=np.float32)
+        surv = np.zeros((X.shape[0], len(self.unique_times_)), dtype=np.float64)
+
+        for tree in self.trees:
+            leaves = self._apply(tree, X)
+            surv += tree['leaf_survival'][tree['leaf_index'][leaves]]
+
+        return surv / len(self.trees)
+
+
+def _pickled_size(obj: Any) -> int:
+    """Kích thước (bytes) của object sau khi pickle"""
+    return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _train_cox_worker(df: pd.DataFrame, duration_col: str, event_col: str) -> Dict[str, Any]:
+    """Worker (chạy trong process riêng): train Cox PH và trả về model đã fit"""
+    system = SurvivalAnalysisSystem()
+    result = system.train_cox_model(df, duration_col=duration_col, event_col=event_col)
+    return {
+        'result': result,
+        'cox_model': system.cox_model,
+        'training_data': system.training_data,
+        'training_summary': system.training_summary,
+        'metrics': system.metrics
+    }
+
+
+def _train_rsf_worker(df: pd.DataFrame, duration_col: str, event_col: str,
+                      n_estimators: int, low_memory: bool = False) -> Dict[str, Any]:
+    """Worker (chạy trong process riêng): train RSF và trả về model đã fit"""
+    system = SurvivalAnalysisSystem()
+    result = system.train_random_survival_forest(
+        df, duration_col=duration_col, event_col=event_col,
+        n_estimators=n_estimators, low_memory=low_memory
+    )
+    return {
+        'result': result,
+        'rsf_model': system.rsf_model,
+        'metrics': system.metrics
+    }
+
+
 class SurvivalAnalysisSystem:
     """
     Hệ thống phân tích sống sót cho đánh giá rủi ro tín dụng
@@ -38,10 +230,7 @@ class SurvivalAnalysisSystem:
         self.cox_model = None
         self.rsf_model = None
         self.km_fitter = None
-        self.feature_names = [
-            'X_1', 'X_2', 'X_3', 'X_4', 'X_5', 'X_6', 'X_7',
-            'X_8', 'X_9', 'X_10', 'X_11', 'X_12', 'X_13', 'X_14'
-        ]
+        self.feature_names = list(FEATURE_COLS)
         self.feature_name_mapping = {
             'X_1': 'Biên lợi nhuận gộp',
             'X_2': 'Biên lợi nhuận trước thuế',
@@ -59,7 +248,12 @@ class SurvivalAnalysisSystem:
             'X_14': 'Hiệu suất sử dụng tài sản'
         }
         self.training_data = None
+        # Thống kê gọn của training data (mean/std 14 chỉ số, durations/events) -
+        # đủ cho KM baseline và risk contributions mà không cần giữ cả DataFrame
+        self.training_summary = None
         self.metrics = {}
+        # Phiên bản mô hình (đổi mỗi lần train/load → vô hiệu cache survival curve)
+        self.model_version = None
 
     def prepare_data(self, df: pd.DataFrame, duration_col: str = 'months_to_default',
                     event_col: str = 'event') -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
@@ -116,12 +310,14 @@ class SurvivalAnalysisSystem:
         # Huấn luyện Cox model
         self.cox_model = CoxPHFitter(penalizer=0.01)
         self.cox_model.fit(cox_data, duration_col='duration', event_col='event')
+        self.model_version = bump_model_version('survival')
 
         # Tính C-index (concordance index)
         c_index = self.cox_model.concordance_index_
 
         # Lưu training data để dùng cho Kaplan-Meier baseline
         self.training_data = cox_data
+        self.training_summary = self._build_training_summary(cox_data)
 
         # Lưu metrics
         self.metrics['cox_c_index'] = float(c_index)
@@ -139,16 +335,20 @@ class SurvivalAnalysisSystem:
     def train_random_survival_forest(self, df: pd.DataFrame,
                                      duration_col: str = 'months_to_default',
                                      event_col: str = 'event',
-                                     n_estimators: int = 100) -> Dict[str, Any]:
+                                     n_estimators: int = 100,
+                                     low_memory: bool = False,
+                                     time_resolution: Optional[float] = None) -> Dict[str, Any]:
         """
         Huấn luyện Random Survival Forest
 
         Args:
             df: Training data
             n_estimators: Số lượng trees
+            low_memory: Dùng RSF_LOW_MEMORY_CONFIG và chuyển model sang CompactSurvivalForest
+            time_resolution: Độ phân giải lưới thời gian (tháng), mặc định lấy từ config khi low_memory
 
         Returns:
-            Dict chứa metrics
+            Dict chứa metrics (kèm memory_report khi low_memory)
         """
         if not SKSURV_AVAILABLE:
             raise ImportError("scikit-survival required. Install with: pip install scikit-survival")
@@ -156,18 +356,37 @@ class SurvivalAnalysisSystem:
         # Chuẩn bị dữ liệu
         X, durations, events = self.prepare_data(df, duration_col, event_col)
 
+        # Làm thô lưới thời gian: ít unique_times_ hơn → survival array của mỗi lá ngắn hơn
+        if time_resolution is None and low_memory:
+            time_resolution = RSF_LOW_MEMORY_CONFIG['time_resolution']
+        if time_resolution:
+            durations = np.ceil(durations / time_resolution) * time_resolution
+
         # Tạo structured array cho scikit-survival
         y = Surv.from_arrays(event=events.astype(bool), time=durations)
 
         # Huấn luyện RSF
-        self.rsf_model = RandomSurvivalForest(
-            n_estimators=n_estimators,
-            min_samples_split=10,
-            min_samples_leaf=5,
-            max_features="sqrt",
-            n_jobs=-1,
-            random_state=42
-        )
+        if low_memory:
+            self.rsf_model = RandomSurvivalForest(
+                n_estimators=n_estimators,
+                min_samples_split=2 * RSF_LOW_MEMORY_CONFIG['min_samples_leaf'],
+                min_samples_leaf=RSF_LOW_MEMORY_CONFIG['min_samples_leaf'],
+                max_leaf_nodes=RSF_LOW_MEMORY_CONFIG['max_leaf_nodes'],
+                max_features="sqrt",
+                n_jobs=-1,
+                random_state=42
+            )
+        else:
+            self.rsf_model = RandomSurvivalForest(
+                n_estimators=n_estimators,
+                min_samples_split=10,
+                min_samples_leaf=5,
+                max_features="sqrt",
+                n_jobs=-1,
+                random_state=42
+            )
+        # Train bằng ma trận float64 (không tên cột) để dự báo nhận trực tiếp FeatureVector
+        X = FeatureVector.from_frame(X).values
         self.rsf_model.fit(X, y)
 
         # Tính C-index
@@ -176,16 +395,105 @@ class SurvivalAnalysisSystem:
         # Lưu metrics
         self.metrics['rsf_c_index'] = float(c_index)
         self.metrics['rsf_n_estimators'] = n_estimators
+        self.metrics['rsf_n_unique_times'] = int(len(self.rsf_model.unique_times_))
 
-        return {
+        result = {
             'model_type': 'Random Survival Forest',
             'c_index': float(c_index),
             'n_estimators': n_estimators,
+            'n_unique_times': int(len(self.rsf_model.unique_times_)),
             'trained_at': datetime.now().isoformat(),
             'n_samples': len(df),
             'n_features': len(self.feature_names)
         }
 
+        if low_memory:
+            bytes_before = _pickled_size(self.rsf_model)
+            self.rsf_model = CompactSurvivalForest(self.rsf_model)
+            bytes_after = _pickled_size(self.rsf_model)
+
+            self.metrics['rsf_low_memory'] = True
+            result['memory_report'] = {
+                'rsf_bytes_before': bytes_before,
+                'rsf_bytes_after': bytes_after,
+                'reduction_pct': round((1 - bytes_after / bytes_before) * 100, 2) if bytes_before else 0.0
+            }
+            print(f"💾 RSF low-memory: {bytes_before / 1024:.1f} KB → {bytes_after / 1024:.1f} KB")
+
+        self.model_version = bump_model_version('survival')
+        return result
+
+    def train_models_parallel(self, df: pd.DataFrame,
+                              duration_col: str = 'months_to_default',
+                              event_col: str = 'event',
+                              n_estimators: int = 100,
+                              low_memory: bool = False) -> Dict[str, Any]:
+        """
+        Huấn luyện đồng thời Cox PH và RSF trong 2 process riêng biệt
+        Thời gian ≈ max(Cox, RSF) thay vì tổng của 2 model
+        (process tạo bằng forkserver/spawn, không fork process server đa luồng - xem process_pool)
+
+        Chỉ gán models vào instance sau khi cả 2 process đã kết thúc, nên trạng thái
+        không bao giờ là nửa cũ nửa mới. Model nào lỗi thì giữ nguyên model cũ và
+        ghi lỗi vào training_errors.
+
+        Args:
+            df: Training data
+            n_estimators: Số lượng trees của RSF
+            low_memory: Train RSF ở chế độ tiết kiệm bộ nhớ (xem RSF_LOW_MEMORY_CONFIG)
+
+        Returns:
+            Dict với cox_result, rsf_result, training_errors và wall_time_seconds
+        """
+        start = time.perf_counter()
+        outcomes = {}
+        training_errors = []
+
+        try:
+            with new_process_pool(2) as executor:
+                futures = {
+                    'Cox PH': executor.submit(_train_cox_worker, df, duration_col, event_col),
+                    'RSF': executor.submit(_train_rsf_worker, df, duration_col, event_col, n_estimators, low_memory)
+                }
+                for name, future in futures.items():
+                    try:
+                        outcomes[name] = future.result()
+                    except Exception as e:
+                        training_errors.append({'model': name, 'error': str(e)})
+        except OSError as e:
+            # Môi trường không cho phép tạo process → train tuần tự trong process hiện tại
+            print(f"⚠️ Không thể tạo process pool ({str(e)}), chuyển sang train tuần tự")
+            training_errors = []
+            for name, worker, args in [
+                ('Cox PH', _train_cox_worker, (df, duration_col, event_col)),
+                ('RSF', _train_rsf_worker, (df, duration_col, event_col, n_estimators, low_memory))
+            ]:
+                try:
+                    outcomes[name] = worker(*args)
+                except Exception as e:
+                    training_errors.append({'model': name, 'error': str(e)})
+
+        # Ghép kết quả vào instance
+        cox_outcome = outcomes.get('Cox PH')
+        rsf_outcome = outcomes.get('RSF')
+        if cox_outcome:
+            self.cox_model = cox_outcome['cox_model']
+            self.training_data = cox_outcome['training_data']
+            self.training_summary = cox_outcome['training_summary']
+            self.metrics.update(cox_outcome['metrics'])
+        if rsf_outcome:
+            self.rsf_model = rsf_outcome['rsf_model']
+            self.metrics.update(rsf_outcome['metrics'])
+        if cox_outcome or rsf_outcome:
+            self.model_version = bump_model_version('survival')
+
+        return {
+            'cox_result': cox_outcome['result'] if cox_outcome else None,
+            'rsf_result': rsf_outcome['result'] if rsf_outcome else None,
+            'training_errors': training_errors,
+            'wall_time_seconds': round(time.perf_counter() - start, 3)
+        }
+
     def calculate_kaplan_meier(self, df: pd.DataFrame = None,
                               duration_col: str = 'months_to_default',
                               event_col: str = 'event') -> Dict[str, Any]:
@@ -203,10 +511,10 @@ class SurvivalAnalysisSystem:
 
         # Sử dụng training data nếu không có df
         if df is None:
-            if self.training_data is None:
+            if self.training_summary is None:
                 raise ValueError("No training data available. Train Cox model first.")
-            durations = self.training_data['duration'].values
-            events = self.training_data['event'].values
+            durations = self.training_summary['durations']
+            events = self.training_summary['events']
         else:
             _, durations, events = self.prepare_data(df, duration_col, event_col)
 
@@ -229,32 +537,36 @@ class SurvivalAnalysisSystem:
             'censored_count': int((1 - events).sum())
         }
 
-    def predict_survival_curve(self, indicators: Dict[str, float],
+    def _rsf_input(self, features: FeatureVector):
+        """Ma trận đầu vào RSF (RSF cũ được train bằng DataFrame cần tên cột)"""
+        if hasattr(self.rsf_model, 'feature_names_in_'):
+            return features.to_frame()
+        return features.values
+
+    @memoize_score('survival', fill_missing=0.0)
+    def predict_survival_curve(self, indicators: Union[FeatureVector, Dict[str, float]],
                                model_type: str = 'cox',
                                timeline: Optional[List[float]] = None) -> Dict[str, Any]:
         """
         Dự báo survival curve cho một doanh nghiệp mới
 
         Args:
-            indicators: Dict với 14 chỉ số tài chính (X_1 đến X_14)
+            indicators: FeatureVector (hoặc dict) với 14 chỉ số tài chính (X_1 đến X_14)
             model_type: 'cox' hoặc 'rsf'
             timeline: List các thời điểm (tháng) để dự báo
 
         Returns:
             Dict với survival probabilities tại các thời điểm
         """
-        # Tạo DataFrame từ indicators
-        X_new = pd.DataFrame([indicators])[self.feature_names]
-
-        # Xử lý missing values
-        X_new = X_new.fillna(0)
+        # Vector 14 chỉ số (missing values → 0)
+        features = FeatureVector.coerce(indicators, fill_missing=0.0)
 
         if model_type == 'cox':
             if self.cox_model is None:
                 raise ValueError("Cox model not trained. Call train_cox_model() first.")
 
             # Dự báo survival function
-            surv_func = self.cox_model.predict_survival_function(X_new)
+            surv_func = self.cox_model.predict_survival_function(features.values)
 
             # Lấy survival curve của sample đầu tiên (cột đầu tiên, không phải row đầu tiên)
             surv_curve = surv_func.iloc[:, 0]  # Series với index = timeline
@@ -288,7 +600,7 @@ class SurvivalAnalysisSystem:
                 raise ValueError("RSF model not trained. Call train_random_survival_forest() first.")
 
             # Dự báo survival function
-            surv_funcs = self.rsf_model.predict_survival_function(X_new, return_array=True)
+            surv_funcs = self.rsf_model.predict_survival_function(self._rsf_input(features), return_array=True)
 
             # Lấy survival probabilities của sample đầu tiên
             surv_probs_array = surv_funcs[0]  # Array survival probs của sample đầu tiên
@@ -324,7 +636,7 @@ class SurvivalAnalysisSystem:
             'model_type': model_type
         }
 
-    def calculate_median_time_to_default(self, indicators: Dict[str, float],
+    def calculate_median_time_to_default(self, indicators: Union[FeatureVector, Dict[str, float]],
                                          model_type: str = 'cox') -> float:
         """
         Tính median time-to-default cho một doanh nghiệp
@@ -405,7 +717,7 @@ class SurvivalAnalysisSystem:
 
         return results[:top_k]
 
-    def get_individual_risk_contributions(self, indicators: Dict[str, float],
+    def get_individual_risk_contributions(self, indicators: Union[FeatureVector, Dict[str, float]],
                                          top_k: int = 5) -> List[Dict[str, Any]]:
         """
         Tính risk contribution của TỪNG CHỈ SỐ cho DOANH NGHIỆP CỤ THỂ này
@@ -425,28 +737,17 @@ class SurvivalAnalysisSystem:
         if self.cox_model is None:
             raise ValueError("Cox model not trained. Call train_cox_model() first.")
 
-        # Tạo DataFrame cho doanh nghiệp này
-        company_data = pd.DataFrame([indicators])
-
-        # Đảm bảo có đủ 14 chỉ số
-        for feature in self.feature_names:
-            if feature not in company_data.columns:
-                company_data[feature] = 0
-
-        # Sắp xếp theo thứ tự features
-        company_data = company_data[self.feature_names]
-
-        # Xử lý missing values
-        company_data = company_data.fillna(0)
+        # Vector 14 chỉ số của doanh nghiệp này (thiếu/missing → 0)
+        company_values = FeatureVector.coerce(indicators, fill_missing=0.0).values[0]
 
         # Lấy coefficients từ Cox model
         coefficients = self.cox_model.params_
         p_values = self.cox_model.summary['p']
 
         # Tính training data statistics (mean) để so sánh
-        if self.training_data is not None:
-            training_means = self.training_data[self.feature_names].mean()
-            training_stds = self.training_data[self.feature_names].std()
+        if self.training_summary is not None:
+            training_means = self.training_summary['feature_means']
+            training_stds = self.training_summary['feature_stds']
         else:
             training_means = pd.Series(0, index=self.feature_names)
             training_stds = pd.Series(1, index=self.feature_names)
@@ -458,7 +759,7 @@ class SurvivalAnalysisSystem:
         for feature in self.feature_names:
             if feature in coefficients.index:
                 coef = float(coefficients[feature])
-                company_value = float(company_data[feature].iloc[0])
+                company_value = float(company_values[FEATURE_INDEX[feature]])
                 mean_value = float(training_means[feature])
                 std_value = float(training_stds[feature])
                 p_val = float(p_values[feature])
@@ -542,7 +843,7 @@ class SurvivalAnalysisSystem:
 
         return top_results
 
-    def get_survival_probabilities_at_times(self, indicators: Dict[str, float],
+    def get_survival_probabilities_at_times(self, indicators: Union[FeatureVector, Dict[str, float]],
                                            times: List[float] = [6, 12, 24],
                                            model_type: str = 'cox') -> Dict[float, float]:
         """
@@ -630,26 +931,73 @@ class SurvivalAnalysisSystem:
                 'description': 'Tình trạng tài chính rất tốt, rủi ro rất thấp'
             }
 
-    def save_models(self, filepath: str = 'survival_models.pkl'):
-        """Lưu models"""
+    @staticmethod
+    def _build_training_summary(cox_data: pd.DataFrame) -> Dict[str, Any]:
+        """Tóm tắt training data: mean/std 14 chỉ số + durations/events (float32/int8)"""
+        feature_cols = [c for c in cox_data.columns if c not in ('duration', 'event')]
+        return {
+            'feature_means': cox_data[feature_cols].mean(),
+            'feature_stds': cox_data[feature_cols].std(),
+            'durations': cox_data['duration'].to_numpy(dtype=np.float32),
+            'events': cox_data['event'].to_numpy(dtype=np.int8)
+        }
+
+    def save_models(self, filepath: str = 'survival_models.pkl', low_memory: bool = False):
+        """
+        Lưu models (ghi ra file tạm riêng của lượt lưu rồi đổi tên, để không bao giờ để lại file ghi dở
+        và 2 lượt train đồng thời không ghi đè file tạm của nhau)
+
+        Args:
+            filepath: Đường dẫn file
+            low_memory: Artifact gọn - không lưu training DataFrame (chỉ lưu training_summary)
+                        và chuyển RSF sang CompactSurvivalForest nếu chưa chuyển
+        """
+        rsf_model = self.rsf_model
+        if low_memory and rsf_model is not None and not isinstance(rsf_model, CompactSurvivalForest):
+            rsf_model = CompactSurvivalForest(rsf_model)
+
         models = {
+            'artifact_format': 'lean' if low_memory else 'full',
             'cox_model': self.cox_model,
-            'rsf_model': self.rsf_model,
+            'rsf_model': rsf_model,
             'km_fitter': self.km_fitter,
-            'training_data': self.training_data,
+            'training_data': None if low_memory else self.training_data,
+            'training_summary': self.training_summary,
             'metrics': self.metrics
         }
-        joblib.dump(models, filepath)
-        return {'status': 'success', 'filepath': filepath}
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(filepath) or ".",
+                                         prefix=os.path.basename(filepath) + ".", suffix=".tmp",
+                                         delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+        try:
+            joblib.dump(models, tmp_path)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        result = {'status': 'success', 'filepath': filepath, 'artifact_format': models['artifact_format']}
+        if low_memory:
+            result['memory_report'] = {
+                'artifact_bytes': os.path.getsize(filepath),
+                'training_frame_bytes_excluded': int(self.training_data.memory_usage(deep=True).sum())
+                if self.training_data is not None else 0
+            }
+        return result
 
     def load_models(self, filepath: str = 'survival_models.pkl'):
-        """Load models"""
+        """Load models (hỗ trợ cả artifact đầy đủ và artifact gọn)"""
         models = joblib.load(filepath)
         self.cox_model = models['cox_model']
         self.rsf_model = models['rsf_model']
         self.km_fitter = models['km_fitter']
-        self.training_data = models['training_data']
+        self.training_data = models.get('training_data')
+        self.training_summary = models.get('training_summary')
+        if self.training_summary is None and self.training_data is not None:
+            # Artifact cũ chưa có training_summary
+            self.training_summary = self._build_training_summary(self.training_data)
         self.metrics = models['metrics']
+        self.model_version = bump_model_version('survival')
         return {'status': 'success', 'metrics': self.metrics}
 
 